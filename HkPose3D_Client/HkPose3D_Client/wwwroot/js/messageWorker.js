@@ -1,23 +1,112 @@
 let socket;
 
+// Binary v1 (HkPose3D_Server/HkPose3D_Broadcast.py): header + ι (id, event, encoding,  ǥ)
+const MAGIC = "HKW3";
+const VERSION = 1;
+const HEADER_SIZE = 19;
+const PERSON_SIZE = 6;
+const FLAG_DELTA = 0x01;
+const ENCODING_FLOAT32 = 0;
+const ENCODING_QUANTIZED = 1;
+const ENCODING_DELTA = 2;
+const DELTA_QUANTUM = 0.001;  // delta  ȭ  (m)
+const EVENT_NAMES = ["None", "Fall-down", "Jump"];
+
+let lastSeq = null;           //  ؼ  ȣ
+let reference = new Map();    // ι id -> ȭ ǥ (Int32Array),  delta  
+
+function decodeBinary(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== MAGIC || view.getUint8(4) !== VERSION) {
+        throw new Error(`Unsupported binary message (${magic} v${view.getUint8(4)})`);
+    }
+    const flags = view.getUint8(5);
+    const seq = view.getUint32(6, true);
+    const numPersons = view.getUint16(10, true);
+    const numJoints = view.getUint16(12, true);
+    const rmse = view.getFloat32(14, true);
+    const timeLength = view.getUint8(18);
+    const captureTime = String.fromCharCode(...new Uint8Array(buffer, HEADER_SIZE, timeLength));
+    if ((flags & FLAG_DELTA) && (lastSeq === null || seq !== ((lastSeq + 1) >>> 0))) {
+        throw new Error(`Delta frame ${seq} without frame ${seq - 1}`);
+    }
+
+    const numValues = numJoints * 3;
+    const persons = [];
+    const next = new Map();
+    let offset = HEADER_SIZE + timeLength;
+    for (let i = 0; i < numPersons; i++) {
+        const id = view.getInt32(offset, true);
+        const event = view.getUint8(offset + 4);
+        const encoding = view.getUint8(offset + 5);
+        offset += PERSON_SIZE;
+
+        const values = new Float64Array(numValues);
+        if (encoding === ENCODING_FLOAT32) {
+            for (let k = 0; k < numValues; k++, offset += 4) {
+                values[k] = view.getFloat32(offset, true);
+            }
+        } else {
+            // ȭ ǥ: 밪(int32) Ǵ  id   ǥ + (int16)
+            const previous = reference.get(id);
+            if (encoding === ENCODING_DELTA && !previous) {
+                throw new Error(`Delta for unknown person ${id}`);
+            }
+            const quantized = new Int32Array(numValues);
+            for (let k = 0; k < numValues; k++) {
+                if (encoding === ENCODING_DELTA) {
+                    quantized[k] = previous[k] + view.getInt16(offset, true);
+                    offset += 2;
+                } else {
+                    quantized[k] = view.getInt32(offset, true);
+                    offset += 4;
+                }
+                values[k] = quantized[k] * DELTA_QUANTUM;
+            }
+            next.set(id, quantized);
+        }
+
+        const points = [];
+        for (let j = 0; j < numJoints; j++) {
+            points.push({ x: values[3 * j], y: values[3 * j + 1], z: values[3 * j + 2] });
+        }
+        persons.push({ id: id, "3D_points": points, event_name: EVENT_NAMES[event] || "None" });
+    }
+    lastSeq = seq;
+    reference = next;
+    return { rmse: rmse, capture_time: captureTime, persons: persons };
+}
+
+function postPoses(data) {
+    const persons = data["persons"] || [{ id: 0, "3D_points": data["3D_points"], event_name: data["event_name"] || "" }];  //   ȣȯ
+    if (persons.length === 0) {
+        return;
+    }
+    self.postMessage({
+        jointData: persons[0]["3D_points"],
+        rmse: data["rmse"],
+        captureTime: data["capture_time"],
+        eventName: persons[0]["event_name"] || "",  // event_name   ڿ
+        persons: persons
+    });
+}
+
 self.onmessage = (event) => {
     const { command, url } = event.data;
 
     if (command === "start") {
         socket = new WebSocket(url);
+        socket.binaryType = "arraybuffer";
+        lastSeq = null;
+        reference = new Map();
 
         socket.onmessage = (e) => {
             try {
-                console.log("Message received!");
-                const data = JSON.parse(e.data);
-                self.postMessage({
-                    jointData: data["3D_points"],
-                    rmse: data["rmse"],
-                    captureTime: data["capture_time"],
-                    eventName: data["event_name"] || ""  // event_name   ڿ
-                });
+                // ؽƮ ޽ JSON (?format=json),  ܴ binary
+                postPoses(typeof e.data === "string" ? JSON.parse(e.data) : decodeBinary(e.data));
             } catch (error) {
-                console.error("Worker: Invalid JSON received", error.message);
+                console.error("Worker: Invalid message received", error.message);
             }
         };
 
@@ -29,25 +29,31 @@ window.GetPose3D = (canvasId, ip, port) => {
         0xff0000, 0xff0000, 0xff0000  // Red: 12, 13, 14
     ];
 
-    const jointMeshes = jointColors.map((color) => {
-        const mesh = new THREE.Mesh(jointGeometry, createJointMaterial(color));
-        scene.add(mesh);
-        return mesh;
-    });
-
     const boneConnections = [
         [0, 1], [0, 2], [1, 3], [2, 4], [3, 4], [3, 5], [4, 6],
         [5, 7], [6, 8], [3, 9], [4, 10], [9, 10], [9, 11],
         [11, 13], [10, 12], [12, 14]
     ];
 
-    const lines = boneConnections.map(([startIdx, endIdx]) => {
-        const geometry = new THREE.BufferGeometry().setAttribute('position', new THREE.BufferAttribute(new Float32Array(6), 3));
-        const material = new THREE.LineBasicMaterial({ color: jointColors[startIdx] });
-        const line = new THREE.Line(geometry, material);
-        scene.add(line);
-        return line;
-    });
+    // ι ID ̷ ( ޽ +  )
+    const skeletons = {};
+    const createSkeleton = () => {
+        const jointMeshes = jointColors.map((color) => {
+            const mesh = new THREE.Mesh(jointGeometry, createJointMaterial(color));
+            scene.add(mesh);
+            return mesh;
+        });
+
+        const lines = boneConnections.map(([startIdx, endIdx]) => {
+            const geometry = new THREE.BufferGeometry().setAttribute('position', new THREE.BufferAttribute(new Float32Array(6), 3));
+            const material = new THREE.LineBasicMaterial({ color: jointColors[startIdx] });
+            const line = new THREE.Line(geometry, material);
+            scene.add(line);
+            return line;
+        });
+
+        return { jointMeshes, lines };
+    };
 
     // ٴ   
     const floor = new THREE.Mesh(new THREE.PlaneGeometry(10, 10), new THREE.MeshBasicMaterial({ color: 0xffffff, side: THREE.DoubleSide }));
@@ -104,7 +110,7 @@ window.GetPose3D = (canvasId, ip, port) => {
         fallMessage.style.left = `${canvas.offsetLeft}px`;
     });
 
-    const updateJoints = (jointData) => {
+    const updateJoints = ({ jointMeshes, lines }, jointData) => {
         jointData.forEach((joint, i) => {
             jointMeshes[i].position.set(-joint.x, joint.y, joint.z);
         });
@@ -116,17 +122,41 @@ window.GetPose3D = (canvasId, ip, port) => {
         });
     };
 
+    const setSkeletonVisible = ({ jointMeshes, lines }, visible) => {
+        jointMeshes.forEach((mesh) => { mesh.visible = visible; });
+        lines.forEach((line) => { line.visible = visible; });
+    };
+
+    //  ι鸸 ǥ ( ID ̷ ,  ID )
+    const updatePersons = (persons) => {
+        const currentIds = new Set(persons.map((person) => String(person.id)));
+        persons.forEach((person) => {
+            if (!skeletons[person.id]) {
+                skeletons[person.id] = createSkeleton();
+            }
+            setSkeletonVisible(skeletons[person.id], true);
+            updateJoints(skeletons[person.id], person["3D_points"]);
+        });
+        Object.keys(skeletons).forEach((id) => {
+            if (!currentIds.has(id)) {
+                setSkeletonVisible(skeletons[id], false);
+            }
+        });
+    };
+
     // Web Workerκ ޽ 
     socketWorker.onmessage = (event) => {
         latestMessage = event.data; // ֽ ޽ ü
     };
 
-    socketWorker.postMessage({ command: "start", url: `ws://${ip}:${port}` });
+    socketWorker.postMessage({ command: "start", url: `ws://${ip}:${port}/?delta=1` });  // binary + delta (JSON: ?format=json)
 
     const processLatestMessage = () => {
         if (latestMessage) {
-            const { jointData, rmse, captureTime, eventName } = latestMessage;
-            updateJoints(jointData);
+            const { rmse, captureTime, persons } = latestMessage;
+            updatePersons(persons);
+            const eventName = persons.filter((person) => person.event_name && person.event_name !== 'None')
+                .map((person) => `${person.event_name} (ID ${person.id})`).join(', ') || 'None';
 
             // Delay (captureTime  ð ) 
             const [datePart, timePart] = captureTime.split('_'); // ¥ ð 
@@ -0,0 +1,425 @@
+"""
+Pluggable pose inference backends for HkPose3D_Device (CPU edge nodes without a GPU).
+
+- "ultralytics": the PyTorch YOLO model (yolov8n-pose.pt) through ultralytics.
+- "onnx": an exported ONNX model on ONNX Runtime (CPUExecutionProvider).
+- "openvino": an exported OpenVINO IR (<model>_openvino_model/*.xml) or ONNX model on the OpenVINO CPU plugin.
+
+The exported backends do the pre/post-processing of ultralytics themselves: letterbox
+to a square input (centered, gray padding), decode of the YOLOv8-pose output
+(cx, cy, w, h, person score, 17 x (x, y, conf)), confidence filter, NMS, and boxes and
+keypoints scaled back to the image and clipped. Every backend returns PoseResults whose
+keypoints are (persons, 17, 3) in image pixels, like result.keypoints.data.
+
+Only the chosen backend's library is imported (torch is not needed for onnx/openvino).
+
+Usage (run from HkPose3D_Device):
+    python HkPose3D_Backend.py export --format onnx --imgsz 640 [--dynamic]      # yolov8n-pose.onnx
+    python HkPose3D_Backend.py export --format openvino --imgsz 640              # yolov8n-pose_openvino_model/
+    python HkPose3D_Backend.py quantize yolov8n-pose.onnx --calibration <dir of frames>   # yolov8n-pose-int8.onnx
+    python HkPose3D_Backend.py compare --images <dir of frames> --threads 4 \\
+        --backends ultralytics onnx onnx:yolov8n-pose-int8.onnx openvino openvino:yolov8n-pose-int8.onnx
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import cv2
+import numpy as np
+
+log = logging.getLogger("HkPose3D.Backend")
+
+MODEL_INPUT_SIZE = 640          # 기본 추론 입력 크기 (정사각형)
+MODEL_STRIDE = 32               # YOLOv8 최대 stride (입력 크기는 이 값의 배수로 올림)
+DEFAULT_MODELS = {              # backend별 기본 모델 경로 (export 명령으로 생성)
+    "ultralytics": "yolov8n-pose.pt",
+    "onnx": "yolov8n-pose.onnx",
+    "openvino": "yolov8n-pose_openvino_model",
+}
+CONFIDENCE_THRESHOLD = 0.25     # 인물 검출 confidence 하한 (ultralytics 기본값)
+IOU_THRESHOLD = 0.7             # NMS IoU 임계값 (ultralytics 기본값)
+MAX_DETECTIONS = 300            # 이미지당 최대 인물 수
+MAX_NMS = 30000                 # NMS에 넣는 최대 후보 수
+LETTERBOX_COLOR = (114, 114, 114)
+NUM_KEYPOINTS = 17
+PLOT_CONFIDENCE = 0.5           # plot()에 그리는 관절의 confidence 하한
+COMPARE_CONFIDENCE = 0.5        # compare에서 관절 오차에 포함하는 confidence 하한 (기준과 대상 모두)
+SKELETON = [(15, 13), (13, 11), (16, 14), (14, 12), (11, 12), (5, 11), (6, 12), (5, 6), (5, 7), (6, 8),
+            (7, 9), (8, 10), (1, 2), (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6)]     # COCO 관절 연결
+
+
+########################### 전처리 / 후처리 ##############################
+def round_input_size(size, stride=MODEL_STRIDE):
+    """입력 크기를 stride의 배수로 올림 (ultralytics check_imgsz와 동일)."""
+    return max(stride, int(np.ceil(size / stride)) * stride)
+
+def letterbox(image, size):
+    """
+    비율을 유지해 size x size에 맞추고 남는 곳을 가운데 정렬 padding.
+    반환: (letterbox 이미지, 배율, (왼쪽 pad, 위쪽 pad)).
+    """
+    height, width = image.shape[:2]
+    gain = min(size / height, size / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_width) / 2, (size - new_height) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return image, gain, (left, top)
+
+def to_blob(images):
+    """BGR letterbox 이미지 목록 -> (N, 3, H, W) RGB float32 [0, 1]."""
+    blob = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+def nms(boxes, scores, iou_threshold=IOU_THRESHOLD):
+    """score 내림차순으로 IoU가 iou_threshold를 넘는 box를 제거 (torchvision.ops.nms와 동일). 반환: 남은 index."""
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        width = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        height = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        intersection = width * height
+        order = rest[intersection / (areas[i] + areas[rest] - intersection) <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def decode_pose(output, gain, pad, image_shape, confidence=CONFIDENCE_THRESHOLD, iou=IOU_THRESHOLD,
+                max_detections=MAX_DETECTIONS):
+    """
+    Exported YOLOv8-pose output of one image, (4 + classes + 17 * 3, anchors) with the
+    sigmoids already applied in the graph -> boxes (N, 4) xyxy, scores (N,), keypoints
+    (N, 17, 3), in the original image's pixels and sorted by score.
+    """
+    predictions = output.T
+    num_classes = predictions.shape[1] - 4 - NUM_KEYPOINTS * 3
+    scores = predictions[:, 4:4 + num_classes].max(axis=1)
+    candidates = np.flatnonzero(scores > confidence)
+    if len(candidates) > MAX_NMS:
+        candidates = candidates[np.argsort(-scores[candidates])[:MAX_NMS]]
+    predictions, scores = predictions[candidates], scores[candidates]
+
+    center, size = predictions[:, 0:2], predictions[:, 2:4]
+    boxes = np.concatenate([center - size / 2, center + size / 2], axis=1)
+    keep = nms(boxes, scores, iou)[:max_detections]     # 클래스는 인물 하나 (class-agnostic)
+    boxes, scores = boxes[keep], scores[keep]
+    keypoints = predictions[keep, 4 + num_classes:].reshape(-1, NUM_KEYPOINTS, 3)
+
+    # letterbox 좌표 -> 원본 이미지 좌표 (이미지 밖은 경계로 자름)
+    height, width = image_shape[:2]
+    limits = np.array([width, height], dtype=np.float32)
+    boxes = np.clip((boxes.reshape(-1, 2, 2) - pad) / gain, 0, limits).reshape(-1, 4)
+    keypoints = np.concatenate([np.clip((keypoints[..., :2] - pad) / gain, 0, limits), keypoints[..., 2:]], axis=-1)
+    return boxes.astype(np.float32), scores.astype(np.float32), keypoints.astype(np.float32)
+
+
+class PoseResult:
+    """
+    Pose estimation of one image, the part of ultralytics Results the device uses:
+    keypoints (persons, 17, 3) = (x, y, conf) in image pixels, has_visible and plot().
+    """
+    def __init__(self, image, boxes, scores, keypoints, has_visible=True, result=None):
+        self.image = image
+        self.boxes = boxes
+        self.scores = scores
+        self.keypoints = keypoints
+        self.has_visible = has_visible  # 관절별 confidence가 있는지 (ultralytics Keypoints.has_visible)
+        self.result = result            # ultralytics Results (ultralytics backend일 때만)
+
+    def plot(self):
+        """검출 box와 skeleton을 그린 BGR 이미지."""
+        if self.result is not None:
+            return self.result.plot()
+        canvas = self.image.copy()
+        for box, score, person in zip(self.boxes, self.scores, self.keypoints):
+            x1, y1, x2, y2 = box.astype(int)
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), (255, 128, 0), 2)
+            cv2.putText(canvas, f"person {score:.2f}", (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 128, 0), 1)
+            visible = person[:, 2] > PLOT_CONFIDENCE
+            for a, b in SKELETON:
+                if visible[a] and visible[b]:
+                    cv2.line(canvas, tuple(person[a, :2].astype(int)), tuple(person[b, :2].astype(int)), (0, 255, 255), 2)
+            for x, y, _ in person[visible]:
+                cv2.circle(canvas, (int(x), int(y)), 4, (0, 0, 255), -1)
+        return canvas
+
+
+############################# Backends ##################################
+class UltralyticsBackend:
+    """The PyTorch model through ultralytics (letterbox and NMS inside ultralytics)."""
+    name = "ultralytics"
+
+    def __init__(self, model_path, threads=None):
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+
+    def input_size(self, requested):
+        return round_input_size(requested)
+
+    def infer(self, images, input_size=MODEL_INPUT_SIZE):
+        # ultralytics의 추론별 출력은 DEBUG에서만
+        results = self.model(images, imgsz=input_size, verbose=log.isEnabledFor(logging.DEBUG))
+        poses = []
+        for image, result in zip(images, results):
+            keypoints = result.keypoints
+            poses.append(PoseResult(image, result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(),
+                                    keypoints.data.cpu().numpy(), keypoints.has_visible, result))
+        return poses
+
+
+class ExportedBackend:
+    """
+    Base of the exported-model backends: letterbox -> run(blob) -> decode_pose.
+    A model exported with a fixed input size ignores the requested size (square inputs
+    only), and a model with a fixed batch of 1 runs the images one by one.
+    """
+    def __init__(self, input_shape):
+        batch, _, height, width = [dim if isinstance(dim, int) and dim > 0 else None for dim in input_shape]
+        if height != width:
+            raise ValueError(f"Only square model inputs are supported (model input {input_shape}).")
+        self.single_batch = batch == 1
+        self.fixed_size = height
+
+    def input_size(self, requested):
+        return self.fixed_size or round_input_size(requested)
+
+    def run(self, blob):
+        raise NotImplementedError
+
+    def infer(self, images, input_size=MODEL_INPUT_SIZE):
+        size = self.input_size(input_size)
+        letterboxed = [letterbox(image, size) for image in images]
+        blob = to_blob([padded for padded, _, _ in letterboxed])
+        if self.single_batch:
+            outputs = np.concatenate([self.run(blob[i:i + 1]) for i in range(len(blob))])
+        else:
+            outputs = self.run(blob)
+        return [PoseResult(image, *decode_pose(output, gain, pad, image.shape))
+                for image, (_, gain, pad), output in zip(images, letterboxed, outputs)]
+
+
+class OnnxBackend(ExportedBackend):
+    """Exported ONNX model (float or INT8 QDQ) on ONNX Runtime's CPU provider."""
+    name = "onnx"
+
+    def __init__(self, model_path, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1    # 연산자는 순서대로 실행하고 연산자 안에서 병렬 처리
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        super().__init__(model_input.shape)
+
+    def run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    """Exported OpenVINO IR (directory or .xml) or ONNX model on the OpenVINO CPU plugin."""
+    name = "openvino"
+
+    def __init__(self, model_path, threads=None):
+        import openvino as ov
+        if os.path.isdir(model_path):
+            xml_files = sorted(glob.glob(os.path.join(model_path, "*.xml")))
+            if not xml_files:
+                raise FileNotFoundError(f"No OpenVINO model (.xml) in {model_path}")
+            model_path = xml_files[0]
+        core = ov.Core()
+        model = core.read_model(model_path)
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+        super().__init__([dim.get_length() if dim.is_static else None for dim in model.input(0).get_partial_shape()])
+
+    def run(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+BACKENDS = {backend.name: backend for backend in (UltralyticsBackend, OnnxBackend, OpenVinoBackend)}
+
+def load_backend(name, model_path=None, threads=None):
+    """
+    name: "ultralytics", "onnx" or "openvino", model_path: None이면 DEFAULT_MODELS[name],
+    threads: 추론 스레드 수 (None이면 라이브러리 기본값).
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {name!r} (choose from {', '.join(BACKENDS)})")
+    model_path = model_path or DEFAULT_MODELS[name]
+    backend = BACKENDS[name](model_path, threads)
+    backend.model_path = model_path
+    log.info("Inference backend %s: %s (threads: %s)", name, model_path, threads or "default")
+    return backend
+
+
+########################### Export / INT8 ##############################
+def list_images(paths):
+    """파일 또는 폴더(안의 .jpg, .jpeg, .png) 목록 -> 이미지 파일 경로."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(file for pattern in ("*.jpg", "*.jpeg", "*.png") for file in glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    return files
+
+def export_model(weights, fmt, input_size=MODEL_INPUT_SIZE, dynamic=False):
+    """ultralytics export (onnx: <weights>.onnx, openvino: <weights>_openvino_model/). 반환: 생성된 경로."""
+    from ultralytics import YOLO
+    return YOLO(weights).export(format=fmt, imgsz=input_size, dynamic=dynamic)
+
+def quantize_model(model_path, output_path, calibration_images):
+    """
+    Static INT8 quantization (QDQ, per-channel weights) of an exported ONNX model,
+    calibrated on representative camera frames. The result runs on both the onnx and
+    the openvino backends.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    model = onnx.load(model_path)
+    input_name = model.graph.input[0].name
+    size = model.graph.input[0].type.tensor_type.shape.dim[2].dim_value or MODEL_INPUT_SIZE
+    # 마지막 모듈(/model.<N>/, Pose head)은 float 유지: 좌표(0~size)와 확률(0~1)이 한 출력으로 합쳐져 INT8로는 keypoint 좌표가 뭉개짐
+    modules = [int(match.group(1)) for match in (re.match(r"/model\.(\d+)/", node.name) for node in model.graph.node) if match]
+    head = f"/model.{max(modules)}/" if modules else None
+    excluded = [node.name for node in model.graph.node if head and node.name.startswith(head)]
+
+    class CalibrationFrames(CalibrationDataReader):
+        def __init__(self):
+            self.frames = (cv2.imread(path) for path in calibration_images)
+
+        def get_next(self):
+            for image in self.frames:
+                if image is not None:
+                    return {input_name: to_blob([letterbox(image, size)[0]])}
+            return None
+
+    quantize_static(model_path, output_path, CalibrationFrames(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, nodes_to_exclude=excluded)
+    log.info("INT8 model saved to %s (%d calibration image(s), %d head node(s) kept in float)",
+             output_path, len(calibration_images), len(excluded))
+    return output_path
+
+
+############################## 비교 ##################################
+def match_persons(reference, keypoints):
+    """관절 평균 거리가 가까운 순서로 기준 인물과 대상 인물을 짝지음 (greedy). 반환: [(기준 index, 대상 index)]."""
+    if not len(reference) or not len(keypoints):
+        return []
+    distance = np.linalg.norm(reference[:, None, :, :2] - keypoints[None, :, :, :2], axis=-1).mean(axis=-1)
+    pairs, used_reference, used_target = [], set(), set()
+    for i, j in zip(*np.unravel_index(np.argsort(distance, axis=None), distance.shape)):
+        if i not in used_reference and j not in used_target:
+            pairs.append((i, j))
+            used_reference.add(i)
+            used_target.add(j)
+    return pairs
+
+def compare_backends(specs, image_paths, input_size=MODEL_INPUT_SIZE, threads=None, repeat=1):
+    """
+    specs: ["<backend>[:<model>]", ...], 첫 번째가 정확도 기준.
+    반환: backend별 {"latency_p50_ms", "latency_p90_ms", "fps", "same_person_count", "keypoint_error_px_mean", ...}.
+    """
+    images = [image for image in (cv2.imread(path) for path in image_paths) if image is not None]
+    if not images:
+        raise ValueError("No readable images to compare on.")
+    reports, reference = [], None
+    for spec in specs:
+        name, _, model_path = spec.partition(":")
+        backend = load_backend(name, model_path or None, threads)
+        backend.infer(images[:1], input_size)   # 첫 추론(메모리 할당, 커널 선택)은 측정에서 제외
+        latencies, outputs = [], []
+        for image in images:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = backend.infer([image], input_size)[0]
+                latencies.append(time.perf_counter() - start)
+            outputs.append(result.keypoints)
+        reference = reference or outputs
+
+        errors, same_count = [], 0
+        for expected, keypoints in zip(reference, outputs):
+            same_count += len(expected) == len(keypoints)
+            for i, j in match_persons(expected, keypoints):
+                visible = (expected[i, :, 2] > COMPARE_CONFIDENCE) & (keypoints[j, :, 2] > COMPARE_CONFIDENCE)
+                errors += np.linalg.norm(expected[i, visible, :2] - keypoints[j, visible, :2], axis=-1).tolist()
+        latencies_ms = np.array(latencies) * 1000
+        reports.append({
+            "backend": spec, "model": backend.model_path, "input_size": backend.input_size(input_size),
+            "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+            "latency_p90_ms": round(float(np.percentile(latencies_ms, 90)), 2),
+            "fps": round(1000 / float(latencies_ms.mean()), 1),
+            "persons": int(sum(len(keypoints) for keypoints in outputs)),
+            "same_person_count": round(same_count / len(images), 3),
+            "keypoint_error_px_mean": round(float(np.mean(errors)), 2) if errors else None,
+            "keypoint_error_px_p95": round(float(np.percentile(errors, 95)), 2) if errors else None,
+        })
+    return reports
+
+def print_comparison(reports):
+    print(f"{'backend':<40} {'size':>5} {'p50 ms':>8} {'p90 ms':>8} {'fps':>7} {'persons':>8} {'same #':>7} {'kpt err px':>11} {'p95':>7}")
+    for report in reports:
+        error, error_p95 = report["keypoint_error_px_mean"], report["keypoint_error_px_p95"]
+        print(f"{report['backend']:<40} {report['input_size']:>5} {report['latency_p50_ms']:>8.2f} {report['latency_p90_ms']:>8.2f} "
+              f"{report['fps']:>7.1f} {report['persons']:>8} {report['same_person_count']:>7.1%} "
+              f"{'-' if error is None else f'{error:.2f}':>11} {'-' if error_p95 is None else f'{error_p95:.2f}':>7}")
+    print(f"(accuracy relative to {reports[0]['backend']}; keypoint error over joints with confidence > {COMPARE_CONFIDENCE} in both)")
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "HkPose3D_Server"))    # HkPose3D_Log (서버와 공유)
+    from HkPose3D_Log import setup_logging
+    parser = argparse.ArgumentParser(description="Export, quantize and compare HkPose3D_Device inference backends.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="export the PyTorch model with ultralytics")
+    export.add_argument("--weights", default=DEFAULT_MODELS["ultralytics"])
+    export.add_argument("--format", default="onnx", choices=["onnx", "openvino"])
+    export.add_argument("--imgsz", type=int, default=MODEL_INPUT_SIZE, help="input size (fixed unless --dynamic)")
+    export.add_argument("--dynamic", action="store_true", help="dynamic batch and input size (follows the server's input_size control)")
+    quantize = commands.add_parser("quantize", help="static INT8 quantization of an ONNX model")
+    quantize.add_argument("model", nargs="?", default=DEFAULT_MODELS["onnx"])
+    quantize.add_argument("--output", help="output path (default: <model>-int8.onnx)")
+    quantize.add_argument("--calibration", nargs="+", default=["warmup.jpg"],
+                          help="calibration frames (files or directories; use ~100 frames from the real cameras)")
+    compare = commands.add_parser("compare", help="accuracy/latency of backends on the same images")
+    compare.add_argument("--backends", nargs="+", default=["ultralytics"], help="<backend>[:<model>] (the first one is the accuracy reference)")
+    compare.add_argument("--images", nargs="+", default=["warmup.jpg"], help="image files or directories")
+    compare.add_argument("--imgsz", type=int, default=MODEL_INPUT_SIZE)
+    compare.add_argument("--threads", type=int, help="inference threads per backend (default: library default)")
+    compare.add_argument("--repeat", type=int, default=1, help="timed runs per image")
+    compare.add_argument("--json", help="also save the report as JSON")
+    args = parser.parse_args()
+    setup_logging("INFO")
+
+    if args.command == "export":
+        print(f"Exported: {export_model(args.weights, args.format, args.imgsz, args.dynamic)}")
+    elif args.command == "quantize":
+        output = args.output or f"{os.path.splitext(args.model)[0]}-int8.onnx"
+        quantize_model(args.model, output, list_images(args.calibration))
+    else:
+        reports = compare_backends(args.backends, list_images(args.images), args.imgsz, args.threads, args.repeat)
+        print_comparison(reports)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,238 +1,493 @@
 import json
 import os
+import re
+import logging
 import socket
+import struct
 import threading
 import sys
 import asyncio
 import websockets
 import queue
-from ultralytics import YOLO
-from io import BytesIO
-from PIL import Image
+import time
+import cv2
+import numpy as np
+from functools import partial, lru_cache
+from datetime import datetime
+SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "HkPose3D_Server")    # 서버와 공유하는 모듈 (HkPose3D_Log, HkPose3D_Recorder)
+sys.path.append(SHARED_DIR)
+from HkPose3D_Recorder import SessionRecorder
+from HkPose3D_Log import setup_logging, stop_logging, LogSummary, RateLimitedLog
+from HkPose3D_Backend import load_backend
 
 ############ Parameter Setting #############
 SAVE_KEYPOINT_IMAGE = False     # 2D Pose estimation한 이미지의 저장 여부 (default=False)
 SAVE_KEYPOINTS_DATA = False     # 2D Pose estimation한 결과 데이터 저장 여부 (default=False)
-BASE_DIR = "Result"
+BASE_DIR = "Result"             # 저장 경로 (BASE_DIR/<세션>/에 백그라운드로 기록, HkPose3D_Recorder.load_session으로 로드)
 EXCLUDED_KEYPOINTS = [3, 4]  # Indices of keypoints to exclude
-MAX_QUEUE_SIZE = 5  # 최대 대기열 크기
+MAX_QUEUE_SIZE = 5  # 카메라당 최대 대기열 크기
+MAX_BATCH_SIZE = 8      # 한 번에 YOLO 추론할 최대 이미지 수 (여러 카메라를 처리할 때)
+MAX_BATCH_WAIT = 0.010  # 배치를 채우기 위해 첫 이미지 이후 기다리는 최대 시간 (초)
+MODEL_INPUT_SIZE = 640  # YOLO 입력 크기 (--input-size, JPEG 축소 디코딩 배율 결정에도 사용, 입력 크기가 고정된 export 모델은 모델 크기)
+INFERENCE_BACKEND = "ultralytics"  # 추론 backend (--backend): "ultralytics" (PyTorch), "onnx" (ONNX Runtime), "openvino" (HkPose3D_Backend.py 참고)
+MODEL_PATH = None           # 모델 경로 (--model, None이면 backend별 기본 모델: yolov8n-pose.pt, yolov8n-pose.onnx, yolov8n-pose_openvino_model)
+INFERENCE_THREADS = None    # 추론 스레드 수 (--threads, None이면 라이브러리 기본값)
+JPEG_REDUCED_DECODE = True  # 모델 입력 크기 이상을 유지하는 선에서 JPEG을 1/2, 1/4, 1/8로 축소 디코딩 (default=True)
+WIRE_FORMAT = "binary"  # 서버로 보낼 keypoints 포맷: "binary" (서버와 협상, 실패 시 json) or "json"
+SEND_MIN_CONFIDENCE = 0.0   # confidence가 이 값보다 낮은 관절은 (0, 0, 0)으로 전송 (서버의 삼각측량에서 제외, 0이면 모두 전송)
+STREAM_MAX_WIDTH = None     # WebSocket 뷰어로 보낼 영상의 최대 폭 (None이면 받은 JPEG을 그대로 전달)
+STREAM_JPEG_QUALITY = 70    # 축소 재인코딩 시 JPEG 품질
+FEEDBACK_CONTROL = True     # 서버의 제어 메시지(frame_stride: N 프레임마다 한 번 추론, input_size: 추론 입력 크기)를 따름
+TRACE = True                # 서버가 요청하면 (HkPose3D_Server --trace) 프레임별 단계 시각(perf_counter)을 keypoints와 함께 전송
+LOG_LEVEL = "INFO"          # 로그 레벨 (--log-level, DEBUG: 프레임마다 출력, INFO: 카메라별 초당 요약, WARNING: 운영 환경)
+LOG_FILE = None             # 로그를 함께 기록할 파일 (--log-file)
 
 HOST = '127.0.0.1'
-PORT = 10001
-PORT_WS = 20001
+PORTS = [10001]         # 카메라 포트 (여러 개면 한 프로세스가 여러 카메라를 배치 처리)
+PORTS_WS = [20001]      # 카메라별 WebSocket 포트
 HOST_SERV = '127.0.0.1'
 PORT_SERV = 11111
 
-websocket_client = None  # WebSocket 클라이언트는 1개만 있다고 가정
+stream_viewers = {}     # WebSocket 포트별 영상 뷰어 집합 (포트마다 여러 뷰어 가능)
 edge_socket = None
+edge_socket_lock = threading.Lock()     # 서버 연결은 YOLO 스레드와 카메라 스레드(건너뛴 프레임 알림)가 함께 사용
+wire_format = "json"    # 서버와 협상된 전송 포맷
+server_trace = False    # 서버가 단계 시각을 요청했는지 (hello_ack의 "trace")
+camera_controls = {}    # 카메라별 서버 제어 값 {"frame_stride", "input_size"} (없으면 기본값)
 ws_loop = None
-image_queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)  # YOLO 처리 스레드로 전달할 이미지 대기열
 
-# 명령줄 인자 처리
+log = logging.getLogger("HkPose3D.Device")
+frame_summary = LogSummary(log)     # 카메라별 수신/추론/전송 프레임 수 (초당 한 줄)
+limited_log = RateLimitedLog(log)   # 반복되는 경고 (대기열 초과, 전송 실패)
+
+# 명령줄 인자 처리 (<PORT>, <PORT_WS>는 콤마로 여러 개 지정 가능, --옵션은 위치 인자와 별도)
+for option in ("--log-level", "--log-file", "--backend", "--model", "--threads", "--input-size"):
+    if option in sys.argv:
+        i = sys.argv.index(option)
+        if i + 1 < len(sys.argv):
+            value = sys.argv[i + 1]
+            if option == "--log-level":
+                LOG_LEVEL = value.upper()
+            elif option == "--log-file":
+                LOG_FILE = value
+            elif option == "--backend":
+                INFERENCE_BACKEND = value
+            elif option == "--model":
+                MODEL_PATH = value
+            elif option == "--threads":
+                INFERENCE_THREADS = int(value)
+            else:
+                MODEL_INPUT_SIZE = int(value)
+            sys.argv = sys.argv[:i] + sys.argv[i + 2:]
 if len(sys.argv) == 6:
     HOST = sys.argv[1]       
-    PORT = int(sys.argv[2])  
-    PORT_WS = int(sys.argv[3])
+    PORTS = [int(port) for port in sys.argv[2].split(',')]
+    PORTS_WS = [int(port) for port in sys.argv[3].split(',')]
     HOST_SERV = sys.argv[4] 
     PORT_SERV = int(sys.argv[5])      
-else:
-    print("Usage: python HkPose3D_Device.py <MY_IP> <PORT> <PORT_WS> <SERVER_IP> <SERVER_PORT>")
+if len(sys.argv) != 6 or len(PORTS) != len(PORTS_WS):
+    print("Usage: python HkPose3D_Device.py <MY_IP> <PORT[,PORT...]> <PORT_WS[,PORT_WS...]> <SERVER_IP> <SERVER_PORT> [--backend ultralytics|onnx|openvino] [--model <path>] [--threads <N>] [--input-size <N>] [--log-level DEBUG|INFO|WARNING] [--log-file <file>]")
     print("- Ex1: python HkPose3D_Device.py 127.0.0.1 10001 20001 127.0.0.1 11111 (포트번호는 하나씩 더해줘야)")
     print("- Ex2: python HkPose3D_Device.py 192.168.1.75 10001 20001 192.168.1.72 11111 (포트번호는 하나씩 더해줘야)")
+    print("- Ex3: python HkPose3D_Device.py 127.0.0.1 10001,10002,10003,10004 20001,20002,20003,20004 127.0.0.1 11111 (카메라 4대 배치 처리)")
+    print("- Ex4: python HkPose3D_Device.py 127.0.0.1 10001 20001 127.0.0.1 11111 --log-level WARNING --log-file device.log (콘솔 출력 최소화)")
+    print("- Ex5: python HkPose3D_Device.py 127.0.0.1 10001 20001 127.0.0.1 11111 --backend onnx --model yolov8n-pose-int8.onnx --threads 4 (GPU 없는 장비, HkPose3D_Backend.py로 export/quantize)")
     sys.exit(1)
+setup_logging(LOG_LEVEL, LOG_FILE)
+
+image_queue = queue.Queue(maxsize=MAX_QUEUE_SIZE * len(PORTS))  # YOLO 처리 스레드로 전달할 이미지 대기열 (모든 카메라 공유)
+image_queue_lock = threading.Lock()
+
+# WebSocket 영상 뷰어 (최신 프레임만 유지: 전송이 밀리면 이전 프레임은 버림)
+class StreamViewer:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.latest_frame = None
+        self.frame_ready = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, frame):
+        if self.latest_frame is not None:
+            self.dropped += 1
+        self.latest_frame = frame
+        self.frame_ready.set()
+
+    async def run(self):
+        while True:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+            frame, self.latest_frame = self.latest_frame, None
+            try:
+                await self.websocket.send(frame)
+            except websockets.ConnectionClosed:
+                return
 
 # WebSocket server
-async def websocket_handler(websocket, path):
-    global websocket_client
-    print("New WebSocket client connected.")
-    websocket_client = websocket
+async def websocket_handler(websocket, path, port_ws):
+    viewers = stream_viewers.setdefault(port_ws, set())
+    viewer = StreamViewer(websocket)
+    viewers.add(viewer)
+    sender = asyncio.create_task(viewer.run())
+    log.info("New WebSocket client connected on port %d (%d viewers).", port_ws, len(viewers))
     try:
         async for _ in websocket:
             pass
     except websockets.ConnectionClosed:
-        print("WebSocket client disconnected.")
+        pass
     finally:
-        websocket_client = None
+        viewers.discard(viewer)
+        sender.cancel()
+        log.info("WebSocket client disconnected from port %d (dropped %d frames).", port_ws, viewer.dropped)
 
 async def start_websocket_server():
-    async with websockets.serve(websocket_handler, HOST, PORT_WS):
-        print(f"WebSocket server started on ws://{HOST}:{PORT_WS}")
-        await asyncio.Future()  # 서버가 계속 실행되도록 대기
-
-# WebSocket 전송 처리
-async def send_image_to_websocket(image_data):
-    global websocket_client
-    if websocket_client:
-        try:
-            await websocket_client.send(image_data)  # 비동기적으로 이미지 전송
-            print(f"\033[92mSent image data ({len(image_data)} bytes) to WebSocket client.\033[0m")
-        except websockets.ConnectionClosed:
-            print("WebSocket client connection closed.")
-        except Exception as e:
-            print(f"Failed to send image data: {e}")
+    global ws_loop
+    ws_loop = asyncio.get_running_loop()
+    servers = [await websockets.serve(partial(websocket_handler, port_ws=port_ws), HOST, port_ws) for port_ws in PORTS_WS]
+    for port_ws in PORTS_WS:
+        log.info("WebSocket server started on ws://%s:%d", HOST, port_ws)
+    await asyncio.Future()  # 서버가 계속 실행되도록 대기
+
+# WebSocket 전송 처리 (ws_loop에서 실행: 포트의 모든 뷰어에게 최신 프레임 전달)
+async def broadcast_image(image_data, port_ws):
+    for viewer in stream_viewers.get(port_ws, ()):
+        viewer.offer(image_data)
+
+def has_stream_viewers(port_ws):
+    return ws_loop is not None and bool(stream_viewers.get(port_ws))
+
+# 수신 스레드에서 호출: 필요하면 축소 재인코딩 후 ws_loop로 넘김 (추론과 병행)
+def relay_image(image_data, image, port_ws):
+    if STREAM_MAX_WIDTH and image is not None and image.shape[1] > STREAM_MAX_WIDTH:
+        height = round(image.shape[0] * STREAM_MAX_WIDTH / image.shape[1])
+        resized = cv2.resize(image, (STREAM_MAX_WIDTH, height), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
+        frame = encoded.tobytes() if ok else bytes(image_data)
     else:
-        print("No WebSocket client connected.")
+        frame = bytes(image_data)   # 수신 버퍼는 재사용되므로 복사본을 넘김
+    asyncio.run_coroutine_threadsafe(broadcast_image(frame, port_ws), ws_loop)
 
 # WebSocket 서버 중지
 def stop_websocket_server():
     global ws_loop
-    print("Shutting down WebSocket server...")
+    log.info("Shutting down WebSocket server...")
     if ws_loop:
         for task in asyncio.all_tasks(ws_loop):
             task.cancel()  # asyncio에서 실행 중인 모든 작업 취소
         ws_loop.stop()
-    print("WebSocket server shut down.")
+    log.info("WebSocket server shut down.")
 
 
 # Helper functions
-def create_directory(camera_name):
-    directory = os.path.join(BASE_DIR, camera_name)
-    os.makedirs(directory, exist_ok=True)
-    return directory
+# 결과 저장 (파일 쓰기와 이미지 인코딩은 recorder 스레드에서 처리하여 YOLO 스레드를 막지 않음)
+def encode_keypoint_image(record):
+    _, jpeg = cv2.imencode('.jpg', record.pop("result").plot())
+    record["jpeg"] = jpeg.reshape(-1)
+    return record
+
+record_session = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")   # keypoints와 이미지를 같은 세션 폴더에 기록
+keypoints_recorder = SessionRecorder(BASE_DIR, "keypoints", session=record_session) if SAVE_KEYPOINTS_DATA else None
+image_recorder = SessionRecorder(BASE_DIR, "images", session=record_session, max_pending=MAX_QUEUE_SIZE * len(PORTS),
+                                 prepare=encode_keypoint_image) if SAVE_KEYPOINT_IMAGE else None
 
 def save_keypoint_image(result, camera_name, timestamp):
-    directory = create_directory(camera_name)
-    filepath = os.path.join(directory, f"{camera_name}_{timestamp}.jpg")
-    result.save(filename=filepath)
-    print(f"Keypoint image saved as {filepath}")
-
-def save_keypoints_data(keypoints, camera_name, timestamp):
-    directory = create_directory(camera_name)
-    filepath = os.path.join(directory, f"{camera_name}_{timestamp}.txt")
-    with open(filepath, "w") as f:
-        for i, kp in enumerate(keypoints.data[0]):
-            if i not in EXCLUDED_KEYPOINTS:
-                x, y, z = kp.tolist()
-                f.write(f"{x}, {y}, {z}\n")
-    print(f"Keypoints data saved as {filepath}")
-
-def send_keypoints_data(keypoints, camera_name, slotted_timestamp, exact_timestamp):
-    global edge_socket
+    image_recorder.write({"camera": camera_name, "slot": timestamp, "result": result})
+
+def save_keypoints_data(keypoints_array, camera_name, timestamp, exact_timestamp):
+    keypoints = np.delete(keypoints_array, EXCLUDED_KEYPOINTS, axis=1).astype(np.float32)   # 인물당 15개 관절
+    keypoints_recorder.write({"camera": camera_name, "slot": timestamp, "exact_timestamp": exact_timestamp, "keypoints": keypoints})
+
+# Binary v1: header(28 bytes, little-endian) + float32 keypoints (num_persons x num_joints x (x, y, conf))
+BINARY_MAGIC = b'HKP3'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sBBHHHqq')  # magic, version, flags, camera_id, num_persons, num_joints, exact_us, slotted_us
+BINARY_FLAG_TRACE = 0x01                     # keypoints 뒤에 TRACE_BLOCK이 있음
+TRACE_MARKS = ["device_receive", "decoded", "inference_start", "inference_end", "send"]     # 프레임별 단계 시각 (perf_counter)
+TRACE_BLOCK = struct.Struct('<q' + 'q' * len(TRACE_MARKS))  # clock_offset_us, TRACE_MARKS 순서의 us (없으면 -1)
+
+def timestamp_to_us(timestamp):
+    """Unity timestamp string ('%Y-%m-%d_%H-%M-%S.%f') -> int64 microseconds."""
+    t = datetime.strptime(timestamp, '%Y-%m-%d_%H-%M-%S.%f')
+    return int(t.replace(microsecond=0).timestamp()) * 1_000_000 + t.microsecond
+
+def negotiate_wire_format(sock, camera_name):
+    """서버에 지원 포맷(과 제어 메시지 수신 여부)을 알리고 서버가 선택한 포맷과 trace 요청 여부를 받음 (응답이 없으면 json)."""
+    global server_trace
+    server_trace = False
+    if WIRE_FORMAT != "binary" and not FEEDBACK_CONTROL and not TRACE:
+        return "json"
+    formats = ["binary", "json"] if WIRE_FORMAT == "binary" else ["json"]
+    try:
+        hello = json.dumps({"type": "hello", "camera_name": camera_name, "formats": formats, "control": FEEDBACK_CONTROL}).encode('utf-8')
+        sock.sendall(len(hello).to_bytes(4, byteorder='big') + hello)
+        reply_length = int.from_bytes(recv_exactly(sock, 4), byteorder='big')
+        reply = json.loads(recv_exactly(sock, reply_length).decode('utf-8'))
+        server_trace = TRACE and bool(reply.get("trace"))
+        return reply.get("format", "json")
+    except (socket.timeout, ConnectionError, ValueError) as e:
+        log.warning("Wire format negotiation failed (%s). Using JSON.", e)
+        return "json"
+
+@lru_cache(maxsize=256)
+def binary_camera_id(camera_name):
+    """Binary 헤더의 camera_id: "Camera<N>" (0 <= N <= 65535)의 N, 그 밖의 이름은 None (서버가 이름을 복원할 수 없으므로 JSON으로 전송)."""
+    match = re.fullmatch(r"Camera(\d+)", camera_name or "")
+    if match and int(match.group(1)) <= 0xFFFF and f"Camera{int(match.group(1))}" == camera_name:
+        return int(match.group(1))
+    log.info("Camera name %r has no numeric id for the binary format. Sending it as JSON.", camera_name)
+    return None
+
+def encode_keypoints_binary(keypoints_array, camera_name, slotted_timestamp, exact_timestamp, trace=None):
+    """keypoints (인물 수, 관절 수, 3) -> Binary v1 메시지 (trace가 있으면 TRACE_BLOCK을 뒤에 붙임)."""
+    keypoints_array = np.ascontiguousarray(keypoints_array, dtype='<f4')
+    num_persons, num_joints, _ = keypoints_array.shape
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_FLAG_TRACE if trace else 0, binary_camera_id(camera_name),
+                                num_persons, num_joints, timestamp_to_us(exact_timestamp), timestamp_to_us(slotted_timestamp))
+    if not trace:
+        return header + keypoints_array.tobytes()
+    return header + keypoints_array.tobytes() + TRACE_BLOCK.pack(trace["clock_offset_us"], *(trace.get(name, -1) for name in TRACE_MARKS))
+
+def trace_block(marks):
+    """perf_counter 시각(초) -> 전송할 단계 시각 (us, 서버가 자기 시계로 옮길 수 있도록 wall clock과의 차이 포함)."""
+    marks = dict(marks, send=time.perf_counter())
+    return {"clock_offset_us": int((time.time() - time.perf_counter()) * 1e6),
+            **{name: int(seconds * 1e6) for name, seconds in marks.items()}}
+
+def drop_low_confidence_joints(keypoints_array, min_confidence=SEND_MIN_CONFIDENCE):
+    """confidence가 min_confidence보다 낮은 관절을 (0, 0, 0)으로 바꾸고, 남은 관절이 없는 인물은 제외."""
+    keypoints_array = np.where(keypoints_array[..., 2:3] >= min_confidence, keypoints_array, 0)
+    return keypoints_array[np.any(keypoints_array[..., 2] > 0, axis=1)]
+
+def control_frame_size(camera_name):
+    control = camera_controls.get(camera_name)
+    frame_stride, input_size = (control["frame_stride"], control["input_size"]) if control else (1, MODEL_INPUT_SIZE)
+    return frame_stride, model.input_size(input_size)   # 입력 크기가 고정된 export 모델은 서버가 정한 크기 대신 모델 크기
+
+def control_receiver_thread(sock):
+    """서버가 같은 연결로 보내는 제어 메시지(4바이트 길이 + JSON)를 수신해 적용 (연결이 끊기면 종료)."""
+    buffer = b""
+    while True:
+        try:
+            chunk = sock.recv(4096)
+        except socket.timeout:
+            continue
+        except OSError:
+            return
+        if not chunk:
+            return
+        buffer += chunk
+        while len(buffer) >= 4 and len(buffer) >= 4 + int.from_bytes(buffer[:4], byteorder='big'):
+            length = int.from_bytes(buffer[:4], byteorder='big')
+            try:
+                message = json.loads(buffer[4:4 + length].decode('utf-8'))
+            except ValueError as e:
+                log.warning("Invalid control message: %s", e)
+                message = {}
+            buffer = buffer[4 + length:]
+            if message.get("type") == "control":
+                control = {"frame_stride": max(1, int(message.get("frame_stride", 1))),
+                           "input_size": int(message.get("input_size", MODEL_INPUT_SIZE))}
+                camera_controls[message["camera"]] = control
+                log.info("Control %s: frame_stride %d, input_size %d (%s)", message["camera"],
+                         control["frame_stride"], control["input_size"], message.get("reason", ""))
+
+def send_keypoints_data(keypoints_array, camera_name, slotted_timestamp, exact_timestamp, marks=None):
+    """keypoints_array: (인물 수, 17, 3) 원본 해상도 기준 (x, y, conf). 건너뛴 프레임은 인물 0명으로 알림.
+    marks: 이 프레임의 단계 시각 {TRACE_MARKS 이름: perf_counter} (서버가 trace를 요청했을 때만 전송)."""
+    with edge_socket_lock:
+        _send_keypoints_data(keypoints_array, camera_name, slotted_timestamp, exact_timestamp, marks)
+
+def _send_keypoints_data(keypoints_array, camera_name, slotted_timestamp, exact_timestamp, marks=None):
+    global edge_socket, wire_format
     try:
         if edge_socket is None:
             edge_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             edge_socket.settimeout(5)  # 5초 타임아웃
             edge_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # 소켓 재사용 설정
             edge_socket.connect((HOST_SERV, PORT_SERV))
-            print(f"Connected to keypoints data server at {HOST_SERV}:{PORT_SERV}")
+            wire_format = negotiate_wire_format(edge_socket, camera_name)
+            log.info("Connected to keypoints data server at %s:%d (%s)", HOST_SERV, PORT_SERV, wire_format)
+            camera_controls.clear()     # 새 연결은 기본 설정에서 시작 (서버도 연결별로 제어 상태를 초기화)
+            if FEEDBACK_CONTROL:
+                threading.Thread(target=control_receiver_thread, args=(edge_socket,), daemon=True).start()
+
+        if SEND_MIN_CONFIDENCE > 0:
+            keypoints_array = drop_low_confidence_joints(keypoints_array)
+        trace = trace_block(marks) if server_trace and marks is not None else None
+        if wire_format == "binary" and binary_camera_id(camera_name) is not None:
+            keypoints_array = np.delete(keypoints_array, EXCLUDED_KEYPOINTS, axis=1)
+            data_bytes = encode_keypoints_binary(keypoints_array, camera_name, slotted_timestamp, exact_timestamp, trace)
+        else:
+            keypoints_filtered = [
+                round(float(coord), 3) for person in keypoints_array for i, kp in enumerate(person) if i not in EXCLUDED_KEYPOINTS for coord in kp
+            ]
+
+            data_json = {
+                "camera_name": camera_name,
+                "exact_timestamp": exact_timestamp,
+                "slotted_timestamp": slotted_timestamp,
+                "num_persons": len(keypoints_array),
+                "keypoints": keypoints_filtered     # 인물 순서대로 15 x (x, y, conf)
+            }
+            if trace:
+                data_json["trace"] = trace
+            data_bytes = json.dumps(data_json).encode('utf-8')
 
-        keypoints_array = keypoints.data[0].cpu().numpy()
-        keypoints_filtered = [
-            round(float(coord), 3) for i, kp in enumerate(keypoints_array) if i not in EXCLUDED_KEYPOINTS for coord in kp
-        ]
-
-        data_json = {
-            "camera_name": camera_name,
-            "exact_timestamp": exact_timestamp,
-            "slotted_timestamp": slotted_timestamp,
-            "keypoints": keypoints_filtered
-        }
-
-        data_bytes = json.dumps(data_json).encode('utf-8')
         data_length = len(data_bytes)
         data_to_send = data_length.to_bytes(4, byteorder='big') + data_bytes
 
         edge_socket.sendall(data_to_send)
-        print(f"\033[91mSent 2D pos data ({len(data_bytes)} bytes) to {HOST_SERV}:{PORT_SERV}.\033[0m")
+        log.debug("Sent 2D pos data of %s (%d bytes) to %s:%d.", camera_name, len(data_bytes), HOST_SERV, PORT_SERV)
+        frame_summary.add(camera_name, sent=1, bytes=len(data_bytes))
 
     except socket.timeout:
-        print("Socket timeout occurred. Retrying connection...")
+        limited_log.warning("send", "Socket timeout occurred. Retrying connection...")
         edge_socket.close()
         edge_socket = None  # 소켓 재연결 준비
 
     except (ConnectionResetError, ConnectionAbortedError):
-        print("Connection reset by peer or aborted. Resetting socket...")
+        limited_log.warning("send", "Connection reset by peer or aborted. Resetting socket...")
         edge_socket.close()
         edge_socket = None  # 소켓 재연결 준비
 
     except Exception as e:
-        print(f"Failed to send 2D pos data: {e}")
+        limited_log.warning("send", "Failed to send 2D pos data: %s", e)
         if edge_socket:
             edge_socket.close()
             edge_socket = None  # 소켓 재연결 준비
 
 
+# 대기열에서 마이크로 배치 수집 (첫 이미지 이후 최대 MAX_BATCH_WAIT초, 최대 카메라 수만큼)
+def collect_batch():
+    batch = [image_queue.get()]
+    max_batch_size = min(MAX_BATCH_SIZE, len(PORTS))
+    deadline = time.monotonic() + MAX_BATCH_WAIT
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(image_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
 # YOLO 처리 스레드 (하나의 스레드만 실행됨)
 def yolo_processing_thread():
     while True:
-        # 이미지 대기열에서 이미지 가져오기 (대기)
-        image_data, camera_name, slotted_timestamp, exact_timestamp = image_queue.get()
-        print(f"Processing image. Queue size: {image_queue.qsize()}")
-
-        image = Image.open(BytesIO(image_data))
-        results = model(image)
-        print(f"YOLO processing complete for {camera_name}.")
-
-        for result in results:
-            keypoints = result.keypoints
+        # 이미지 대기열에서 배치 가져오기 (대기)
+        batch = collect_batch()
+        log.debug("Processing batch of %d image(s). Queue size: %d", len(batch), image_queue.qsize())
+
+        # 이미 디코딩된 BGR 배열을 그대로 모델에 전달 (PIL 변환 없음)
+        images = [image for image, _, _, _, _, _ in batch]
+        input_sizes = [control_frame_size(camera_name)[1] for _, _, camera_name, _, _, _ in batch]
+        results = [None] * len(batch)
+        for shape, input_size in {(image.shape, input_size) for image, input_size in zip(images, input_sizes)}:
+            # 해상도와 (서버가 정한) 추론 입력 크기가 같은 이미지끼리 배치 추론
+            indices = [i for i, image in enumerate(images) if image.shape == shape and input_sizes[i] == input_size]
+            inference_start = time.perf_counter()
+            for i, result in zip(indices, model.infer([images[i] for i in indices], input_size)):
+                results[i] = result
+            inference_end = time.perf_counter()
+            for i in indices:
+                batch[i][5].update(inference_start=inference_start, inference_end=inference_end)
+
+        for (_, scale, camera_name, slotted_timestamp, exact_timestamp, marks), result in zip(batch, results):
+            log.debug("YOLO processing complete for %s.", camera_name)
+            frame_summary.add(camera_name, inferred=1, max_inference_ms=(marks["inference_end"] - marks["inference_start"]) * 1000)
+            keypoints_array = result.keypoints  # (인물 수, 17, 3)
+            if scale != 1:
+                keypoints_array = keypoints_array.copy()    # result는 plot()에 축소 디코딩한 좌표 그대로 사용
+                keypoints_array[..., :2] *= scale   # 축소 디코딩한 좌표를 원본 해상도로 복원
             if SAVE_KEYPOINT_IMAGE:
                 save_keypoint_image(result, camera_name, slotted_timestamp)
             if SAVE_KEYPOINTS_DATA:
-                save_keypoints_data(keypoints, camera_name, slotted_timestamp)
-            if keypoints.has_visible:   # has_visible이 True로 검출된 경우만 전송
-                send_keypoints_data(keypoints, camera_name, slotted_timestamp, exact_timestamp)
-
-def process_in_thread(image_data, camera_name, slotted_timestamp, exact_timestamp):
-    # 이미지 대기열에 데이터 추가 (최대 크기 초과 시 대기열 비우고 새로 추가)
-    if image_queue.qsize() >= MAX_QUEUE_SIZE:
-        print("\033[93mQueue full. Clearing queue and adding new image.\033[0m")  # 노란색 출력
-        while not image_queue.empty():
-            image_queue.get()  # 기존 대기열의 모든 항목 제거
-    image_queue.put((image_data, camera_name, slotted_timestamp, exact_timestamp))
-    print(f"Image added to queue. Queue size: {image_queue.qsize()}")
-
+                save_keypoints_data(keypoints_array, camera_name, slotted_timestamp, exact_timestamp)
+            if result.has_visible:   # has_visible이 True로 검출된 경우만 전송
+                send_keypoints_data(keypoints_array, camera_name, slotted_timestamp, exact_timestamp, marks)
+
+def process_in_thread(image, scale, camera_name, slotted_timestamp, exact_timestamp, marks):
+    # 이미지 대기열에 데이터 추가 (최대 크기 초과 시 가장 오래된 이미지 하나만 버림, 지속적인 과부하는 서버의 제어로 줄임)
+    with image_queue_lock:
+        if image_queue.qsize() >= image_queue.maxsize:
+            try:
+                _, _, dropped_camera, dropped_timestamp, _, _ = image_queue.get_nowait()
+                limited_log.warning("queue", "Queue full. Dropped the oldest image (%s, %s).", dropped_camera, dropped_timestamp)
+            except queue.Empty:
+                pass
+        image_queue.put((image, scale, camera_name, slotted_timestamp, exact_timestamp, marks))
+    log.debug("Image added to queue. Queue size: %d", image_queue.qsize())
+
+
+def recv_exactly_into(sock, view):
+    """ view(memoryview)를 정확히 채울 때까지 수신하는 함수 (추가 복사 없음) """
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Connection lost while receiving data.")
+        received += n
+    return view
 
 def recv_exactly(sock, n):
     """ 정확히 n바이트를 수신하는 함수 """
-    data = b''
-    while len(data) < n:
-        chunk = sock.recv(n - len(data))
-        if not chunk:
-            raise ConnectionError("Connection lost while receiving data.")
-        data += chunk
-    return data
+    return bytes(recv_exactly_into(sock, memoryview(bytearray(n))))
 
 
-# Main execution starts here
-if __name__ == "__main__":
-    # YOLO model loading
-    print("YOLO model loading...")
-    model = YOLO("yolov8n-pose.pt") # YOLOv8 pose nano 모델 사용용
-    results = model("warmup.jpg")   # 사전에 임의 이미지로 yolo 준비시킴킴
-    print("YOLO model loaded")
+class FrameBuffer:
+    """카메라별로 재사용하는 수신 버퍼 (ImageDataLength에 맞춰 필요할 때만 확장)."""
+    def __init__(self, capacity=1 << 20):
+        self.buffer = bytearray(capacity)
 
-    # Start WebSocket server in a separate thread
-    websocket_thread = threading.Thread(target=lambda: asyncio.run(start_websocket_server()))
-    websocket_thread.start()
+    def view(self, n):
+        if n > len(self.buffer):
+            self.buffer = bytearray(max(n, 2 * len(self.buffer)))
+        return memoryview(self.buffer)[:n]
+
+def reduced_decode_scale(width, height, input_size=MODEL_INPUT_SIZE):
+    """모델 입력 크기 이상을 유지하는 가장 큰 JPEG 축소 배율 (1, 2, 4, 8)."""
+    scale = 1
+    if JPEG_REDUCED_DECODE:
+        while scale < 8 and max(width, height) / (scale * 2) >= input_size:
+            scale *= 2
+    return scale
+
+REDUCED_DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+def decode_image(image_view, scale):
+    """수신 버퍼의 JPEG을 복사 없이 BGR numpy 배열로 한 번만 디코딩."""
+    return cv2.imdecode(np.frombuffer(image_view, dtype=np.uint8), REDUCED_DECODE_FLAGS[scale])
 
-    # YOLO 처리 스레드 시작 (하나만 생성)
-    yolo_thread = threading.Thread(target=yolo_processing_thread, daemon=True)
-    yolo_thread.start()
 
-    # Start TCP server
+# 카메라 하나의 TCP 수신 루프 (카메라 포트마다 스레드 하나)
+def camera_server_thread(port, port_ws):
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((HOST, PORT))
+    server_socket.bind((HOST, port))
     server_socket.listen(1)
-    print(f"Camera server started at {HOST}:{PORT}")
+    log.info("Camera server started at %s:%d", HOST, port)
 
     client_socket, client_address = server_socket.accept()
-    print(f"Client {client_address} connected.")
+    log.info("Client %s connected.", client_address)
+
+    header_buffer = FrameBuffer(1024)
+    image_buffer = FrameBuffer()    # 이미지 수신 버퍼 (프레임마다 재사용)
+    frame_size = None               # 원본 해상도 (첫 프레임에서 확인, 축소 디코딩 배율 계산에 사용)
+    frame_index = 0
 
     try:
         while True:        
             # 정확히 4바이트를 읽어서 헤더 길이 추출
-            header_length_bytes = recv_exactly(client_socket, 4)
+            header_length_bytes = recv_exactly_into(client_socket, header_buffer.view(4))
             header_length = int.from_bytes(header_length_bytes, byteorder='little')
             
             # 헤더 길이 검증
             if header_length <= 0 or header_length > 1024:
-                print(f"Invalid header length: {header_length}")
+                limited_log.warning(port, "Invalid header length: %d", header_length)
                 continue
 
             # 정확히 header_length 바이트만큼 헤더 수신
-            header_data = recv_exactly(client_socket, header_length)
-            header_json = header_data.decode('utf-8')
-            header = json.loads(header_json)
+            header_data = recv_exactly_into(client_socket, header_buffer.view(header_length))
+            header = json.loads(bytes(header_data))
 
             # 헤더에서 필요한 정보 추출
             camera_name = header.get('CameraName')
@@ -240,27 +495,92 @@ if __name__ == "__main__":
             slotted_timestamp = header.get('SlottedTimeStamp')
             image_data_length = header.get('ImageDataLength')
 
-            # 이미지 데이터 정확히 수신
-            image_data = recv_exactly(client_socket, image_data_length)
-
-            print(f"Received data from {camera_name} with timestamps {exact_timestamp}, {slotted_timestamp}")
+            # 이미지 데이터 정확히 수신 (재사용 버퍼에 직접 수신)
+            image_data = recv_exactly_into(client_socket, image_buffer.view(image_data_length))
+            marks = {"device_receive": time.perf_counter()}    # 프레임별 단계 시각 (서버가 trace를 요청하면 전송)
 
-            if websocket_client:
-                print("WebSocket clients detected. Sending image directly to WebSocket.")                
-                asyncio.run(send_image_to_websocket(image_data))
-            else:
-                process_in_thread(image_data, camera_name, slotted_timestamp, exact_timestamp)
+            log.debug("Received data from %s with timestamps %s, %s", camera_name, exact_timestamp, slotted_timestamp)
+            frame_summary.add(camera_name, received=1, last_queue=image_queue.qsize())
 
             if image_data == b'close_connection':
-                print("Client disconnected.")
+                log.info("Client disconnected.")
                 break
+
+            # 서버가 frame_stride를 정했으면 N 프레임마다 한 번만 추론하고, 건너뛴 프레임은 인물 0명으로 알림
+            # (서버가 이 카메라를 기다리지 않고 슬롯을 바로 처리하도록)
+            frame_stride, input_size = control_frame_size(camera_name)
+            skip = frame_index % frame_stride != 0
+            frame_index += 1
+            if skip:
+                send_keypoints_data(np.zeros((0, 17, 3), dtype=np.float32), camera_name, slotted_timestamp, exact_timestamp)
+                if not has_stream_viewers(port_ws):
+                    continue
+
+            # 수신 스레드에서 한 번만 디코딩 (버퍼는 다음 프레임에 재사용)
+            if frame_size is None:
+                image = decode_image(image_data, 1)
+                if image is not None:
+                    frame_size = (image.shape[1], image.shape[0])
+                    scale = reduced_decode_scale(*frame_size, input_size)
+                    if scale != 1:
+                        image = decode_image(image_data, scale)
+            else:
+                scale = reduced_decode_scale(*frame_size, input_size)
+                image = decode_image(image_data, scale)
+
+            marks["decoded"] = time.perf_counter()
+
+            # WebSocket 뷰어가 있으면 영상도 함께 중계 (추론은 계속 진행)
+            if has_stream_viewers(port_ws):
+                relay_image(image_data, image, port_ws)
+
+            if image is None:
+                limited_log.warning(camera_name, "Failed to decode image from %s.", camera_name)
+                continue
+            if not skip:
+                process_in_thread(image, scale, camera_name, slotted_timestamp, exact_timestamp, marks)
     except Exception as e:
-        print(f"An error occurred: {e}")
+        log.error("An error occurred: %s", e)
+    finally:
+        client_socket.close()
+        server_socket.close()
+        log.info("Camera server %s:%d shut down.", HOST, port)
+
+
+# Main execution starts here
+if __name__ == "__main__":
+    # YOLO model loading (카메라가 여러 대여도 모델은 하나만 로드)
+    log.info("YOLO model loading...")
+    model = load_backend(INFERENCE_BACKEND, MODEL_PATH, INFERENCE_THREADS)    # 기본: YOLOv8 pose nano 모델 (PyTorch)
+    results = model.infer([cv2.imread("warmup.jpg")], MODEL_INPUT_SIZE)      # 사전에 임의 이미지로 yolo 준비시킴
+    log.info("YOLO model loaded")
+
+    # Start WebSocket server in a separate thread
+    websocket_thread = threading.Thread(target=lambda: asyncio.run(start_websocket_server()))
+    websocket_thread.start()
+
+    # YOLO 처리 스레드 시작 (하나만 생성)
+    yolo_thread = threading.Thread(target=yolo_processing_thread, daemon=True)
+    yolo_thread.start()
+
+    # Start TCP servers (카메라 포트마다 하나)
+    camera_threads = [
+        threading.Thread(target=camera_server_thread, args=(port, port_ws))
+        for port, port_ws in zip(PORTS, PORTS_WS)
+    ]
+    for camera_thread in camera_threads:
+        camera_thread.start()
+
+    try:
+        for camera_thread in camera_threads:
+            camera_thread.join()
     finally:
         stop_websocket_server()
         if edge_socket:
             edge_socket.close()
-        client_socket.close()
-        server_socket.close()
-        print("Server shut down.")
+        for recorder in (keypoints_recorder, image_recorder):
+            if recorder:
+                recorder.close()    # 대기 중인 결과를 모두 기록 (os._exit은 atexit을 실행하지 않음)
+        log.info("Server shut down.")
+        stop_logging()  # 대기 중인 로그를 모두 출력 (os._exit은 atexit을 실행하지 않음)
         os._exit(0)  # 강제로 프로그램 종료
@@ -0,0 +1,299 @@
+"""
+Multi-zone aggregator for the HkPose3D server.
+
+Zone workers (HkPose3D_Server.py --zone <config.json>) each own a group of cameras and
+their projection matrices, and send every processed slot here over TCP. The aggregator
+merges the persons of all zones per slot into one WebSocket message in the same formats
+as HkPose3D_Server (binary, delta or JSON, see HkPose3D_Broadcast), so existing clients
+connect to it unchanged.
+
+It keeps no tracking state, only the slots being merged, so it can be restarted at any
+time (workers reconnect by themselves). Person IDs are made unique across zones as
+zone * ZONE_ID_STRIDE + id, and every person carries the name of its zone.
+
+Usage:
+    python HkPose3D_Aggregator.py <IP_ZONES> <PORT_ZONES> <IP_WS> <PORT_WS> [--log-level <LEVEL>] [--spawn <config.json> ...]
+    python HkPose3D_Aggregator.py 0.0.0.0 13333 127.0.0.1 12222            # workers on other machines
+    python HkPose3D_Aggregator.py 127.0.0.1 13333 127.0.0.1 12222 --spawn zones/zone1.json zones/zone2.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import atexit
+import signal
+import asyncio
+import logging
+import subprocess
+import websockets
+from collections import defaultdict
+from HkPose3D_Broadcast import PoseBroadcaster
+from HkPose3D_Log import setup_logging, LogSummary, RateLimitedLog
+
+log = logging.getLogger("HkPose3D.Aggregator")
+sent_summary = LogSummary(log)      # 전송 요약 (LOG_SUMMARY_INTERVAL초마다 한 줄)
+limited_log = RateLimitedLog(log)
+
+################ Parameter Setting #################
+MERGE_DEADLINE = 0.1        # 슬롯의 첫 zone 결과 이후 나머지 zone을 기다리는 최대 시간 (초)
+SLOT_WINDOW = 8             # 동시에 병합 중인 슬롯의 최대 개수 (초과 시 가장 오래된 슬롯부터 전송)
+ZONE_TIMEOUT = 2.0          # 이 시간(초) 동안 결과를 보내지 않은 zone은 기다리지 않음
+ZONE_ID_STRIDE = 100000     # 전역 인물 ID = zone * ZONE_ID_STRIDE + zone 내 ID
+DEFAULT_CAPTURE_TIME = "0000-00-00_00-00-00.000"
+LOG_LEVEL = "INFO"          # 로그 레벨 (--log-level, --spawn으로 실행한 zone worker에도 전달)
+
+IP_ZONES = '127.0.0.1'
+PORT_ZONES = 13333
+IP_WS = '127.0.0.1'
+PORT_WS = 12222
+
+broadcaster = PoseBroadcaster()
+workers = []                # --spawn으로 실행한 zone worker 프로세스
+
+
+def merge_zone_results(results, zone_names):
+    """slot 하나의 zone별 결과 {zone: message}를 HkPose3D_Server와 같은 WebSocket 메시지로 병합 (인물이 없으면 None)."""
+    persons = []
+    rmses = []
+    capture_time = DEFAULT_CAPTURE_TIME
+    for zone in sorted(results):
+        message = results[zone]
+        for person in message.get("persons", []):
+            persons.append(dict(person, id=zone * ZONE_ID_STRIDE + person["id"], zone=zone_names.get(zone, str(zone))))
+        if message.get("rmse"):
+            rmses.append(message["rmse"])
+        if message.get("capture_time", DEFAULT_CAPTURE_TIME) != DEFAULT_CAPTURE_TIME:
+            capture_time = message["capture_time"]
+    if not persons:
+        return None
+    return {
+        "3D_points": persons[0]["3D_points"],
+        "rmse": min(rmses) if rmses else 0,     # GT 아바타는 한 명이므로 가장 가까운 인물을 본 zone의 RMSE
+        "capture_time": capture_time,
+        "event_name": persons[0]["event_name"],
+        "persons": persons
+    }
+
+def valid_person(person):
+    """zone_result의 인물 하나가 병합과 전송에 쓰는 필드 (int id, str event_name, 숫자 x/y/z의 3D_points)를 갖췄는지."""
+    if not isinstance(person, dict) or not isinstance(person.get("event_name"), str):
+        return False
+    if not isinstance(person.get("id"), int) or isinstance(person["id"], bool):
+        return False
+    points = person.get("3D_points")
+    return isinstance(points, list) and all(
+        isinstance(joint, dict) and all(isinstance(joint.get(axis), (int, float)) for axis in "xyz") for joint in points)
+
+def validate_zone_result(message):
+    """
+    병합 전에 zone_result 확인: 형식이 틀린 인물은 빼고 뺀 인물 수를 반환.
+    persons, rmse, capture_time 자체가 틀리면 ValueError (메시지 전체를 버림).
+    """
+    persons = message.get("persons", [])
+    if not isinstance(persons, list):
+        raise ValueError(f"persons must be a list, not {type(persons).__name__}")
+    if not isinstance(message.get("rmse", 0), (int, float)):
+        raise ValueError(f"rmse must be a number, not {type(message['rmse']).__name__}")
+    if not isinstance(message.get("capture_time", DEFAULT_CAPTURE_TIME), str):
+        raise ValueError(f"capture_time must be a string, not {type(message['capture_time']).__name__}")
+    message["persons"] = [person for person in persons if valid_person(person)]
+    return len(persons) - len(message["persons"])
+
+class ZoneMerger:
+    """
+    Per-slot merge buffer. A slot is sent when every active zone reported it or
+    MERGE_DEADLINE seconds after its first result, in slot order; results for a
+    slot that was already sent are counted as late and dropped.
+    """
+    def __init__(self):
+        self.zones = {}                     # zone -> {"name", "cameras", "last_seen"}
+        self.pending = defaultdict(dict)    # slot -> {zone: message}
+        self.deadlines = {}                 # slot -> 전송 마감 시각 (time.monotonic)
+        self.last_slot = None               # 마지막으로 전송한 슬롯
+        self.late = 0
+        self.release_lock = asyncio.Lock()
+
+    def register(self, zone, name, cameras):
+        self.zones[zone] = {"name": name, "cameras": cameras, "last_seen": time.monotonic()}
+        log.info("Zone %d (%s) connected: %d cameras %s", zone, name, len(cameras), cameras)
+
+    def active_zones(self, now):
+        return {zone for zone, info in self.zones.items() if now - info["last_seen"] <= ZONE_TIMEOUT}
+
+    async def add(self, zone, slot, message):
+        now = time.monotonic()
+        if zone in self.zones:
+            self.zones[zone]["last_seen"] = now
+        if self.last_slot is not None and slot <= self.last_slot:
+            self.late += 1
+            limited_log.warning(("late", zone), "Late result from zone %d for %s (late: %d)", zone, slot, self.late)
+            return
+        if slot not in self.deadlines:
+            self.deadlines[slot] = now + MERGE_DEADLINE
+            asyncio.get_running_loop().call_later(MERGE_DEADLINE, lambda: asyncio.ensure_future(self.release()))
+        self.pending[slot][zone] = message
+        await self.release()
+
+    async def release(self):
+        async with self.release_lock:
+            while self.pending:
+                slot = min(self.pending)
+                now = time.monotonic()
+                complete = self.active_zones(now) <= self.pending[slot].keys()
+                if not (complete or now >= self.deadlines[slot] or len(self.pending) > SLOT_WINDOW):
+                    break
+                results = self.pending.pop(slot)
+                del self.deadlines[slot]
+                self.last_slot = slot
+                message = merge_zone_results(results, {zone: info["name"] for zone, info in self.zones.items()})
+                if message is not None:
+                    broadcast(message, slot, len(results))
+
+merger = None
+
+
+######################## Zone worker 연결 ########################
+async def read_frame(reader):
+    """4바이트 길이 + JSON 메시지 하나 (연결이 끊기면 None)."""
+    try:
+        data_length = int.from_bytes(await reader.readexactly(4), byteorder='big')
+        return json.loads((await reader.readexactly(data_length)).decode('utf-8'))
+    except asyncio.IncompleteReadError:
+        return None
+
+async def handle_zone(reader, writer):
+    """zone worker 연결 하나 (zone_hello 이후 zone_result 메시지)."""
+    address = writer.get_extra_info("peername")
+    raw_socket = writer.get_extra_info("socket")
+    if raw_socket:
+        raw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    zone = None
+    try:
+        while True:
+            try:
+                message = await read_frame(reader)
+            except (OSError, json.JSONDecodeError, UnicodeDecodeError) as e:
+                log.warning("Zone %s 데이터 수신 오류: %s", address, e)
+                break
+            if message is None:
+                break
+            if not isinstance(message, dict):
+                limited_log.warning(("invalid", address), "Zone %s 잘못된 메시지 무시: %s", address, type(message).__name__)
+                continue
+            if message.get("type") == "zone_hello":
+                try:
+                    zone = int(message["zone"])
+                except (KeyError, TypeError, ValueError) as e:
+                    log.warning("Zone %s zone_hello 무시 (zone 값 오류): %s: %s", address, type(e).__name__, e)
+                    continue
+                cameras = message.get("cameras", [])
+                merger.register(zone, str(message.get("name", zone)), cameras if isinstance(cameras, list) else [])
+            elif message.get("type") == "zone_result" and zone is not None:
+                if not isinstance(message.get("slot"), str):
+                    limited_log.warning(("invalid_result", zone), "Zone %d zone_result 무시 (slot 값 오류): %r", zone, message.get("slot"))
+                    continue
+                try:
+                    skipped = validate_zone_result(message)
+                except ValueError as e:
+                    limited_log.warning(("invalid_result", zone), "Zone %d zone_result 무시 (%s): %s", zone, message["slot"], e)
+                    continue
+                if skipped:
+                    limited_log.warning(("invalid_person", zone), "Zone %d %s: 형식이 틀린 인물 %d명 제외", zone, message["slot"], skipped)
+                await merger.add(zone, message["slot"], message)
+    except asyncio.CancelledError:
+        pass    # aggregator 종료
+    finally:
+        writer.close()
+        if zone is not None and zone in merger.zones:
+            del merger.zones[zone]      # 끊긴 zone은 더 이상 기다리지 않음
+        log.info("Zone %s (%s) disconnected", zone, address)
+
+
+######################## WebSocket Server ########################
+def broadcast(message, slot, num_zones):
+    """병합한 메시지를 클라이언트별 대기열에 넣음 (전송은 클라이언트별 sender task)."""
+    persons = message["persons"]
+    skeletons = [[[joint["x"], joint["y"], joint["z"]] for joint in person["3D_points"]] for person in persons]
+    frame = broadcaster.publish([person["id"] for person in persons], skeletons, [person["event_name"] for person in persons],
+                                message["rmse"], message["capture_time"], message)
+    if frame is not None:
+        if log.isEnabledFor(logging.DEBUG):
+            sizes = ", ".join(f"{name} {len(payload)} bytes" for name, payload in frame.items() if name != "seq")
+            log.debug("Sent %s: %d person(s) from %d zone(s), %s to %d client(s)", slot, len(persons), num_zones, sizes, len(broadcaster.clients))
+        sent_summary.add("Sent", slots=1, persons=len(persons), last_clients=len(broadcaster.clients))
+
+async def handle_websocket(websocket, path=None):
+    raw_socket = websocket.transport.get_extra_info("socket")
+    if raw_socket:
+        raw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    await broadcaster.serve(websocket, path)
+
+async def run_aggregator():
+    global merger
+    merger = ZoneMerger()
+    zone_server = await asyncio.start_server(handle_zone, IP_ZONES, PORT_ZONES)
+    log.info("Aggregator: waiting for zone workers on %s:%d", IP_ZONES, PORT_ZONES)
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)    # 종료 시 실행한 zone worker도 함께 종료 (atexit)
+    except NotImplementedError:
+        pass    # Windows: Ctrl+C로 종료
+    async with zone_server, websockets.serve(handle_websocket, IP_WS, PORT_WS):
+        log.info("WebSocket server started on ws://%s:%d", IP_WS, PORT_WS)
+        await stop.wait()
+
+
+######################## Zone worker 실행 (--spawn) ########################
+def spawn_workers(config_paths):
+    """같은 머신에서 zone worker를 별도 프로세스로 실행 (HkPose3D_Server.py --zone <config> --headless)."""
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in config_paths:
+        workers.append(subprocess.Popen([sys.executable, os.path.join(server_dir, "HkPose3D_Server.py"),
+                                         "--zone", os.path.abspath(path), "--headless", "--log-level", LOG_LEVEL], cwd=server_dir))
+        log.info("Started zone worker %s (pid %d)", path, workers[-1].pid)
+
+def stop_workers():
+    for worker in workers:
+        if worker.poll() is None:
+            worker.terminate()
+    for worker in workers:
+        try:
+            worker.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+
+def main():
+    global IP_ZONES, PORT_ZONES, IP_WS, PORT_WS, LOG_LEVEL
+    argv = sys.argv
+    if "--log-level" in argv:
+        i = argv.index("--log-level")
+        if i + 1 < len(argv):
+            LOG_LEVEL = argv[i + 1].upper()
+            argv = argv[:i] + argv[i + 2:]
+    setup_logging(LOG_LEVEL)
+    spawn = []
+    if "--spawn" in argv:
+        i = argv.index("--spawn")
+        spawn = argv[i + 1:]
+        argv = argv[:i]
+    if len(argv) == 5:
+        IP_ZONES = argv[1]
+        PORT_ZONES = int(argv[2])
+        IP_WS = argv[3]
+        PORT_WS = int(argv[4])
+    elif len(argv) != 1:
+        print("Usage: python HkPose3D_Aggregator.py <IP_ZONES> <PORT_ZONES> <IP_WS> <PORT_WS> [--log-level <LEVEL>] [--spawn <config.json> ...]")
+        print("- Ex1: python HkPose3D_Aggregator.py 0.0.0.0 13333 127.0.0.1 12222")
+        print("- Ex2: python HkPose3D_Aggregator.py 127.0.0.1 13333 127.0.0.1 12222 --spawn zones/zone1.json zones/zone2.json")
+        sys.exit(1)
+
+    atexit.register(stop_workers)
+    spawn_workers(spawn)
+    try:
+        asyncio.run(run_aggregator())
+    except KeyboardInterrupt:
+        log.info("Aggregator를 종료합니다...")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Offline replay / throughput benchmark for the HkPose3D server pipeline.
+
+Feeds keypoint frames straight into KeypointsData (no Unity, no Device) and reports
+slots/s, per-stage latency percentiles and RMSE against the ground truth.
+
+- Synthetic frames: GT skeletons (BodyPos3dGT, or the calibration body_pos3D_ files if
+  BodyPos3dGT is empty) projected through the Camera#_Pmatrix_*.txt matrices with
+  pixel noise (scaled by 1/confidence, like YOLO keypoints), gross keypoint outliers,
+  joint dropouts and packet dropouts. Cameras beyond the ones on disk are
+  synthesized by rotating the existing cameras around the scene. With --persons > 1 the
+  copies are placed off each other's epipolar lines and the run fails if association
+  does not recover the ground-truth persons.
+- Recorded frames: a Device session (Result/<session>, SAVE_KEYPOINTS_DATA) replayed in
+  slot order, with GT from BodyPos3dGT when available.
+
+Usage (run from HkPose3D_Server like the server):
+    python HkPose3D_Benchmark.py --cameras 8 --rate 0 --slots 2000
+    python HkPose3D_Benchmark.py --rate 2 --noise 3 --dropout 0.1 --persons 3
+    python HkPose3D_Benchmark.py --cameras 6 --outliers 0.05     # 재투영 오차 기반 이상치 제거 확인
+    python HkPose3D_Benchmark.py --persons 3 --ws-format json     # WebSocket 메시지 크기 비교 (binary / delta / json)
+    python HkPose3D_Benchmark.py --recorded ../HkPose3D_Device/Result/2024-09-11_14-38-30
+"""
+import os
+import sys
+import glob
+import time
+import asyncio
+import argparse
+import numpy as np
+from datetime import datetime, timedelta
+from collections import defaultdict
+
+import HkPose3D_Server as server
+from HkPose3D_Recorder import load_session, split_records
+
+################ Parameter Setting #################
+DEFAULT_NOISE = 2.0             # 2D keypoint 가우시안 노이즈 표준편차 (pixel)
+DEFAULT_JOINT_DROPOUT = 0.05    # 관절이 검출되지 않을 확률
+DEFAULT_PACKET_DROPOUT = 0.0    # 카메라의 슬롯 패킷이 누락될 확률
+CONFIDENCE_RANGE = (0.2, 1.0)   # 합성 keypoint confidence 범위 (노이즈 표준편차는 noise / confidence)
+OUTLIER_OFFSET = (50, 300)      # --outliers로 잘못 검출된 관절의 이동 거리 범위 (pixel)
+PERSON_SPACING = 1.5            # --persons > 1일 때 인물 간 최소 간격 (m, 바닥면 x-z)
+PERSON_AREA = 2.25              # 인물 배치 후보 영역의 반경 (m, 원점 중심 정사각형)
+PERSON_GRID = 0.25              # 인물 배치 후보 격자 간격 (m)
+PERSON_MIN_SEPARATION = server.ASSOCIATION_THRESHOLD / 2    # 인물 간 최소 epipolar 거리 (pixel, 모든 카메라 쌍)
+ASSOCIATION_MIN_RATE = 0.9      # 합성 다인물 슬롯 중 GT 인물을 복원해야 하는 최소 비율 (미만이면 실패 종료)
+SLOT_INTERVAL = 0.5             # 합성 슬롯 간격 (초, Unity 슬롯과 동일)
+
+
+########################### 입력 데이터 ##############################
+def load_pose_file(path):
+    """GT 파일 (15줄 관절 + 마지막 줄 captureTime)에서 관절 좌표만 로드."""
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    return np.loadtxt(lines[:server.NUM_JOINTS], delimiter=',')
+
+def load_gt_sequence(gt_dir):
+    """GT 파일을 슬롯 순서대로 로드. gt_dir이 비어 있으면 calibration 폴더의 body_pos3D_ 파일 사용."""
+    files = sorted(glob.glob(os.path.join(gt_dir, "body_pos3D_*.txt")))
+    if not files:
+        files = sorted(glob.glob(os.path.join(server.CAM_DIR, "*", "calibration", "body_pos3D_*.txt")))
+    if not files:
+        sys.exit(f"No GT files found in {gt_dir} or the calibration folders.")
+    return np.stack([load_pose_file(path) for path in files])
+
+def interpolate_sequence(poses, steps):
+    """연속된 GT 자세 사이를 steps개 슬롯으로 선형 보간 (듬성듬성한 GT로 부드러운 움직임 생성)."""
+    if steps <= 1 or len(poses) < 2:
+        return poses
+    alpha = (np.arange(steps) / steps)[None, :, None, None]
+    segments = poses[:-1, None] * (1 - alpha) + poses[1:, None] * alpha
+    return np.concatenate([segments.reshape(-1, *poses.shape[1:]), poses[-1:]])
+
+def load_recorded(session_dir, cameras):
+    """Device가 기록한 keypoints 세션을 {slot: {camera: (num_persons, NUM_JOINTS, 3)}}로 로드."""
+    session = load_session(session_dir, "keypoints")
+    if not session:
+        sys.exit(f"No recorded keypoints found in {session_dir}.")
+    frames = defaultdict(dict)
+    for camera, slot, keypoints in zip(session["camera"], session["slot"], split_records(session, "keypoints")):
+        if camera in cameras:
+            frames[str(slot)].setdefault(str(camera), keypoints)
+    return dict(sorted(frames.items()))
+
+
+########################### 카메라 ##############################
+def rotation_about_y(angle, center):
+    """center를 지나는 수직축(Unity y축) 기준 회전 (4x4 homogeneous)."""
+    c, s = np.cos(angle), np.sin(angle)
+    R = np.array([[c, 0, s, 0], [0, 1, 0, 0], [-s, 0, c, 0], [0, 0, 0, 1]])
+    T = np.eye(4)
+    T[:3, 3] = center
+    T_inv = np.eye(4)
+    T_inv[:3, 3] = -center
+    return T @ R @ T_inv
+
+def build_cameras(num_cameras, center):
+    """디스크의 P matrix (NDC, server.CameraRegistry)로 카메라를 구성하고, 부족하면 기존 카메라를 회전시켜 가상 카메라를 추가."""
+    base = list(server.get_camera_registry().P_ndc)
+    if len(base) < 2:
+        sys.exit("At least two camera matrices are required.")
+    matrices = list(base[:num_cameras])
+    copies = -(-num_cameras // len(base))   # 기존 카메라 하나당 필요한 복제 수 (올림)
+    for i in range(len(matrices), num_cameras):
+        # 기존 카메라 사이를 균등하게 채우도록 회전
+        angle = 2 * np.pi / (len(base) * copies) * (i // len(base))
+        matrices.append(base[i % len(base)] @ rotation_about_y(angle, center))
+    names = [f"Camera{i + 1}" for i in range(num_cameras)]
+    return names, matrices
+
+def project(P, points):
+    """server의 삼각측량과 같은 카메라 모델로 투영 (행 2를 w로 사용, NDC -> pixel 변환)."""
+    homogeneous = np.concatenate([points, np.ones((*points.shape[:-1], 1))], axis=-1)
+    projected = homogeneous @ P.T
+    uv = projected[..., :2] / projected[..., 2:3]
+    uv = np.stack([(uv[..., 0] + 1) * server.image_width / 2,
+                   (1 - uv[..., 1]) * server.image_height / 2], axis=-1)
+    return uv, projected[..., 2]
+
+def person_offsets(num_persons, poses, cameras):
+    """
+    바닥면(x-z)에서 인물 위치 (num_persons, 3) 선택. 한 축으로만 늘어놓으면 그 축과 나란한
+    baseline을 가진 카메라 쌍에서 인물끼리 epipolar 거리가 0이 되어 연관이 모호해지므로,
+    이미 배치한 인물과의 epipolar 거리가 모든 카메라 쌍에서 PERSON_MIN_SEPARATION 이상인
+    후보 중 GT 동작(poses) 동안 화면 안에 가장 많이 보이는 위치를 차례로 고름.
+    반환: (위치, 인물 간 최소 epipolar 거리 (pixel)).
+    """
+    registry = server.get_camera_registry()
+    steps = np.arange(-PERSON_AREA, PERSON_AREA + PERSON_GRID / 2, PERSON_GRID)
+    candidates = np.array([[x, 0.0, z] for x in steps for z in steps])
+    samples = poses[::max(1, len(poses) // 50)]     # 화면 안에 있는지 확인할 자세 (최대 약 50개)
+    visible = np.zeros(len(candidates))             # 후보별 화면 안에 있는 관절 비율 (모든 카메라 평균)
+    views = {}      # camera -> 평균 자세의 후보 위치별 keypoints (candidates, NUM_JOINTS, 3), confidence 1
+    for camera, P in zip(cameras, registry.P_ndc):
+        uv, depth = project(P, samples[:, None] + candidates[None, :, None])
+        in_frame = np.all((uv >= 0) & (uv < [server.image_width, server.image_height]), axis=-1) & (depth > 0)
+        visible += in_frame.mean(axis=(0, 2)) / len(cameras)
+        uv = project(P, poses.mean(axis=0)[None] + candidates[:, None])[0]
+        views[camera] = np.concatenate([uv, np.ones((*uv.shape[:2], 1))], axis=-1)
+
+    chosen = [int(np.argmin(np.linalg.norm(candidates, axis=1)))]     # 첫 인물은 GT 위치 그대로
+    separation = np.inf
+    for _ in range(1, num_persons):
+        distance = np.full(len(candidates), -np.inf)    # 후보와 배치된 인물 간 최소 epipolar 거리 (pixel)
+        for i in range(len(candidates)):
+            if np.min(np.linalg.norm(candidates[chosen] - candidates[i], axis=1)) < PERSON_SPACING:
+                continue
+            distance[i] = min(server.epipolar_cost(views[a][[i]], views[b][chosen], registry.fundamental_matrix(a, b)).min()
+                              for a in cameras for b in cameras if a != b)
+        score = np.where(distance >= PERSON_MIN_SEPARATION, visible, -np.inf)
+        best = int(np.argmax(score))
+        if not np.isfinite(score[best]):
+            sys.exit(f"Cannot place {num_persons} persons {PERSON_SPACING} m apart with an epipolar separation "
+                     f"of {PERSON_MIN_SEPARATION} px; use fewer --persons.")
+        chosen.append(best)
+        separation = min(separation, distance[best])
+    return candidates[chosen], separation
+
+def synthesize_frame(P, skeletons, rng, noise, joint_dropout, outliers=0.0):
+    """인물들의 3D 관절을 한 카메라의 2D keypoints (num_persons, NUM_JOINTS, 3)와 검출된 인물의 GT index로 변환."""
+    uv, depth = project(P, skeletons)
+    confidence = rng.uniform(*CONFIDENCE_RANGE, uv.shape[:-1])
+    uv = uv + rng.normal(0, noise, uv.shape) / confidence[..., None]
+    if outliers > 0:
+        # 잘못 검출된 관절: 임의 방향으로 OUTLIER_OFFSET만큼 이동
+        wrong = rng.random(uv.shape[:-1]) < outliers
+        angle = rng.uniform(0, 2 * np.pi, wrong.shape)
+        offset = rng.uniform(*OUTLIER_OFFSET, wrong.shape)
+        uv = uv + (wrong * offset)[..., None] * np.stack([np.cos(angle), np.sin(angle)], axis=-1)
+    in_view = ((uv[..., 0] >= 0) & (uv[..., 0] < server.image_width) &
+               (uv[..., 1] >= 0) & (uv[..., 1] < server.image_height) & np.isfinite(depth))
+    visible = in_view & (rng.random(in_view.shape) >= joint_dropout)
+    keypoints = np.zeros((*skeletons.shape[:2], 3), dtype=np.float32)
+    keypoints[..., :2] = np.where(visible[..., None], uv, 0)
+    keypoints[..., 2] = np.where(visible, confidence, 0)
+    detected = np.flatnonzero(visible.any(axis=1))  # 관절이 하나도 안 보이는 인물은 검출되지 않은 것으로 처리
+    return keypoints[detected], detected
+
+
+########################### 벤치마크 ##############################
+class NullWebSocket:
+    """전송 비용(인코딩 포함)만 측정하기 위한 가짜 WebSocket 클라이언트."""
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    async def send(self, message):
+        self.messages += 1
+        self.bytes += len(message)
+
+class ReplayKeypointsData(server.KeypointsData):
+    """처리된 슬롯의 결과와 완료 시각을 기록하는 KeypointsData."""
+    def __init__(self):
+        super().__init__()
+        self.stage_times = defaultdict(list)
+        self.stage_listener = lambda stage, seconds: self.stage_times[stage].append(seconds)
+        self.results = {}   # slot -> (num_persons, NUM_JOINTS, 3)
+        self.done = {}      # slot -> 완료 시각 (perf_counter)
+
+    async def send_pos3D_to_clients(self, corrected_pos3D_est, person_ids, rmse, captureTime, event_names):
+        await super().send_pos3D_to_clients(corrected_pos3D_est, person_ids, rmse, captureTime, event_names)
+        self.results[self.current_timestamp] = np.array(corrected_pos3D_est)
+        self.done[self.current_timestamp] = time.perf_counter()
+
+def skeleton_rmse(estimated, ground_truth):
+    """GT 인물마다 가장 가까운 추정 인물과의 RMSE를 구해 평균 (추정이 없으면 None)."""
+    if estimated is None or len(estimated) == 0:
+        return None
+    errors = np.mean((estimated[None, :] - ground_truth[:, None]) ** 2, axis=(2, 3))   # (gt, est)
+    return float(np.mean(np.sqrt(errors.min(axis=1))))
+
+async def replay(manager, frames, rate):
+    """frames: [(slot, {camera: keypoints})]를 rate(slot/s, 0이면 최대 속도)로 KeypointsData에 입력."""
+    sent = {}
+    start = time.perf_counter()
+    for i, (slot, packets) in enumerate(frames):
+        if rate > 0:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        sent[slot] = time.perf_counter()
+        for camera, keypoints in packets.items():
+            await manager.add_data(camera, slot, keypoints)
+        if rate <= 0:
+            await asyncio.sleep(0)   # deadline 콜백이 실행될 기회를 줌
+    # 남은 슬롯은 deadline이 지난 뒤 처리
+    await asyncio.sleep(server.SLOT_DEADLINE)
+    await manager.release_slots()
+    await manager.flush()
+    return sent, time.perf_counter() - start
+
+async def broadcast_replay(manager, frames, args, clients):
+    """NullWebSocket 클라이언트를 broadcaster에 등록하고 replay (sender task는 이벤트 루프 안에서 시작)."""
+    broadcaster = server.pose_broadcaster
+    for websocket in clients:
+        broadcaster.add(websocket, "json" if args.ws_format == "json" else "binary", delta=args.ws_format == "delta")
+    result = await replay(manager, frames, args.rate)
+    await asyncio.sleep(0)      # 대기열에 남은 프레임 전송
+    for websocket in clients:
+        broadcaster.remove(websocket)
+    return result
+
+def percentile_ms(values, q):
+    return np.percentile(values, q) * 1000 if len(values) else float('nan')
+
+def build_frames(args, cameras, matrices, rng):
+    """(slot, packets) 목록, 슬롯별 GT (없으면 None), 합성 슬롯의 {camera: 검출별 GT 인물 index}를 생성."""
+    if args.recorded:
+        recorded = load_recorded(args.recorded, cameras)
+        frames = list(recorded.items())[:args.slots] if args.slots else list(recorded.items())
+        truths = {}
+        for slot, _ in frames:
+            gt_path = os.path.join(args.gt_dir, f"body_pos3D_{slot}.txt")
+            truths[slot] = load_pose_file(gt_path)[None] if os.path.exists(gt_path) else None
+        return frames, truths, {}
+
+    poses = interpolate_sequence(load_gt_sequence(args.gt_dir), args.interpolate)
+    offsets, separation = person_offsets(args.persons, poses, cameras)
+    if args.persons > 1:
+        print(f"Persons at {np.round(offsets[:, [0, 2]], 2).tolist()} (x, z m), min epipolar separation {separation:.1f} px")
+    slot_time = datetime(2024, 1, 1)
+    frames, truths, labels = [], {}, {}
+    for i in range(args.slots or len(poses)):
+        slot = slot_time.strftime("%Y-%m-%d_%H-%M-%S.") + str(slot_time.microsecond // 100000)
+        slot_time += timedelta(seconds=SLOT_INTERVAL)
+        skeletons = np.repeat(poses[i % len(poses)][None], args.persons, axis=0)
+        skeletons += offsets[:, None]
+        packets, labels[slot] = {}, {}
+        for camera, P in zip(cameras, matrices):
+            if rng.random() < args.dropout:
+                continue
+            packets[camera], labels[slot][camera] = synthesize_frame(P, skeletons, rng, args.noise, args.joint_dropout, args.outliers)
+        frames.append((slot, packets))
+        truths[slot] = skeletons
+    return frames, truths, labels
+
+def association_matches(frames, labels):
+    """
+    합성 슬롯마다 server.associate_persons가 GT 인물을 복원했는지 확인: 연관된 인물마다 모든
+    카메라의 검출이 같은 GT 인물이고, GT 인물은 한 인물로만 연관됨. 반환: (일치한 슬롯 수, 확인한 슬롯 수).
+    """
+    matched = checked = 0
+    for slot, packets in frames:
+        cameras = [camera for camera in packets if len(packets[camera])]
+        if slot not in labels or not any(len(packets[camera]) > 1 for camera in cameras):
+            continue
+        detections = [np.where(packets[camera][..., 2:3] >= server.CONFIDENCE_THRESHOLD, packets[camera], 0) for camera in cameras]
+        persons = server.associate_persons(cameras, detections)
+        persons = persons[(persons >= 0).sum(axis=1) > 1]   # 삼각측량에 쓰이는 인물 (2대 이상에서 보임)
+        groups = [{labels[slot][cameras[c]][n] for c, n in enumerate(row) if n >= 0} for row in persons]
+        found = [next(iter(group)) for group in groups if len(group) == 1]
+        checked += 1
+        matched += len(found) == len(groups) and len(set(found)) == len(found)
+    return matched, checked
+
+def report(args, manager, frames, truths, labels, sent, elapsed, clients):
+    processed = [slot for slot, _ in frames if slot in manager.done]
+    latencies = [manager.done[slot] - sent[slot] for slot in processed]
+    rmses = [skeleton_rmse(manager.results[slot], truths[slot]) for slot in processed if truths.get(slot) is not None]
+    rmses = [rmse for rmse in rmses if rmse is not None]
+    packets = sum(len(packet) for _, packet in frames)
+
+    print(f"\n=== HkPose3D server benchmark ({'recorded' if args.recorded else 'synthetic'}) ===")
+    print(f"Cameras: {args.cameras}, persons: {args.persons}, P matrix: {server.CAMERA_P_MATRIX}, "
+          f"filter: {args.filter}, rate: {'max' if args.rate <= 0 else f'{args.rate:g} slot/s'}, workers: {args.workers}")
+    print(f"Slots: {len(processed)}/{len(frames)} processed, {packets} packets in {elapsed:.3f} s "
+          f"-> {len(processed) / elapsed:.1f} slot/s, {packets / elapsed:.1f} packet/s")
+    print(f"{'stage':<14}{'count':>8}{'p50 (ms)':>12}{'p99 (ms)':>12}{'mean (ms)':>12}")
+    for stage, values in manager.stage_times.items():
+        print(f"{stage:<14}{len(values):>8}{percentile_ms(values, 50):>12.3f}{percentile_ms(values, 99):>12.3f}{np.mean(values) * 1000:>12.3f}")
+    print(f"{'slot latency':<14}{len(latencies):>8}{percentile_ms(latencies, 50):>12.3f}{percentile_ms(latencies, 99):>12.3f}"
+          f"{np.mean(latencies) * 1000 if latencies else float('nan'):>12.3f}")
+    if rmses:
+        print(f"RMSE vs GT: mean {np.mean(rmses):.4f} m, p50 {np.percentile(rmses, 50):.4f} m, p99 {np.percentile(rmses, 99):.4f} m ({len(rmses)} slots)")
+    else:
+        print("RMSE vs GT: no ground truth for the processed slots")
+    matched, checked = association_matches(frames, labels)
+    if checked:
+        print(f"Association: {matched}/{checked} multi-person slots recovered the ground-truth persons")
+    messages = sum(websocket.messages for websocket in clients)
+    if messages:
+        print(f"Broadcast: {args.ws_format}, {len(clients)} client(s), {sum(websocket.bytes for websocket in clients) / messages:.0f} bytes/message, "
+              f"{server.pose_broadcaster.dropped} dropped")
+    stats = {camera: dict(counts) for camera, counts in manager.packet_stats.items() if any(counts.values())}
+    if stats:
+        print(f"Late/dropped packets: {stats}")
+    return matched, checked
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay keypoint frames through the HkPose3D server pipeline.")
+    parser.add_argument("--cameras", type=int, default=len(server.CAMERA_NAMES), help="number of cameras (extra cameras are synthesized)")
+    parser.add_argument("--slots", type=int, default=1000, help="number of slots to replay (0: all recorded/GT slots)")
+    parser.add_argument("--rate", type=float, default=0, help="slots per second (0: as fast as possible)")
+    parser.add_argument("--persons", type=int, default=1, help="number of synthetic persons (copies of the GT skeleton)")
+    parser.add_argument("--noise", type=float, default=DEFAULT_NOISE, help="2D keypoint noise std (pixels)")
+    parser.add_argument("--joint-dropout", type=float, default=DEFAULT_JOINT_DROPOUT, help="probability that a joint is not detected")
+    parser.add_argument("--outliers", type=float, default=0.0, help="probability that a detected joint is a gross outlier")
+    parser.add_argument("--dropout", type=float, default=DEFAULT_PACKET_DROPOUT, help="probability that a camera packet is lost")
+    parser.add_argument("--interpolate", type=int, default=1, help="slots interpolated between consecutive GT poses")
+    parser.add_argument("--filter", default=server.TEMPORAL_FILTER or "none", choices=["kalman", "one_euro", "none"], help="temporal filter")
+    parser.add_argument("--workers", type=int, default=server.TRIANGULATION_WORKERS, help="triangulation worker processes (0: in the event loop)")
+    parser.add_argument("--clients", type=int, default=1, help="number of (null) WebSocket clients to broadcast to")
+    parser.add_argument("--ws-format", default="binary", choices=["binary", "delta", "json"], help="WebSocket message format of the clients")
+    parser.add_argument("--gt-dir", default=server.GT_DIR, help="ground truth directory (body_pos3D_<slot>.txt)")
+    parser.add_argument("--recorded", help="replay a recorded Device session directory instead of synthetic frames")
+    parser.add_argument("--trace", help="save a Chrome trace JSON of the server stages of every slot")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the server's per-slot log output (DEBUG)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    center = load_gt_sequence(args.gt_dir).reshape(-1, 3).mean(axis=0) if not args.recorded else np.zeros(3)
+    server.setup_logging("DEBUG" if args.verbose else "ERROR")     # 서버 로그는 --verbose일 때만 (결과는 report로 출력)
+    cameras, matrices = build_cameras(args.cameras, center)
+
+    # 서버 모듈의 카메라 구성을 벤치마크 구성으로 교체
+    server.set_camera_registry(server.CameraRegistry(
+        [server.camera_spec(name, "UNITY", f"<benchmark {name}>") for name in cameras], matrices))
+    server.TEMPORAL_FILTER = None if args.filter == "none" else args.filter
+    clients = [NullWebSocket() for _ in range(args.clients)]
+
+    frames, truths, labels = build_frames(args, cameras, matrices, rng)
+    manager = ReplayKeypointsData()
+    manager.temporal_filter = server.TemporalFilter(server.TEMPORAL_FILTER) if server.TEMPORAL_FILTER else None
+    if args.workers > 0:
+        manager.pool = server.TriangulationPool(args.workers)
+    if args.trace:
+        manager.tracer = server.Tracer(max_slots=len(frames))
+
+    sent, elapsed = asyncio.run(broadcast_replay(manager, frames, args, clients))
+    if manager.pool is not None:
+        manager.pool.close()
+    matched, checked = report(args, manager, frames, truths, labels, sent, elapsed, clients)
+    if manager.tracer is not None:
+        manager.tracer.save(args.trace)
+        print(f"Trace: {len(manager.tracer.slots)} slot(s) saved to {args.trace}")
+    if checked and matched < ASSOCIATION_MIN_RATE * checked:
+        sys.exit(f"Association failed: only {matched}/{checked} multi-person slots recovered the ground-truth persons.")
+
+if __name__ == "__main__":
+    main()
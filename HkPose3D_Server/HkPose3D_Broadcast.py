@@ -0,0 +1,230 @@
+"""
+WebSocket broadcast of 3D poses (HkPose3D_Server and HkPose3D_Aggregator).
+
+Every slot is encoded once per format in use and handed to each client's bounded
+queue; a sender task per client does the actual send, so one slow client only
+delays (and drops frames for) itself. A full queue drops its oldest frame.
+
+Clients choose the format with the query string of the WebSocket URL:
+    ws://<ip>:<port>/                    binary, float32 joints (default)
+    ws://<ip>:<port>/?delta=1            binary, quantized deltas against the previous frame
+    ws://<ip>:<port>/?format=json        JSON (same message as before, one per line)
+
+Binary v1 (little-endian):
+    header  '<4sBBIHHfB'  magic b'HKW3', version, flags, seq, num_persons, num_joints, rmse, len(capture_time)
+            capture_time (ASCII, '%Y-%m-%d_%H-%M-%S.fff')
+    person  '<iBB'        id, event (index in EVENT_NAMES), encoding
+            + num_joints x (x, y, z):  ENCODING_FLOAT32  float32 (m)
+                                       ENCODING_QUANTIZED int32 (DELTA_QUANTUM units)
+                                       ENCODING_DELTA    int16 (DELTA_QUANTUM units, added to the same id in frame seq - 1)
+Frames with FLAG_DELTA may contain ENCODING_DELTA persons and can only be decoded by a
+client that decoded frame seq - 1; a client that missed a frame gets a key frame
+(every person ENCODING_QUANTIZED) instead. Key and delta frames decode to the same
+quantized positions, so deltas never drift.
+"""
+import json
+import struct
+import asyncio
+import logging
+import numpy as np
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+WS_FORMATS = ["binary", "json"]     # 클라이언트가 ?format=으로 선택할 수 있는 포맷
+WS_DEFAULT_FORMAT = "binary"        # format을 지정하지 않은 클라이언트의 포맷
+WS_QUEUE_SIZE = 4                   # 클라이언트별 전송 대기열 크기 (가득 차면 가장 오래된 프레임부터 버림)
+DELTA_QUANTUM = 0.001               # delta 전송의 양자화 단위 (m)
+EVENT_NAMES = ["None", "Fall-down", "Jump"]
+
+WS_MAGIC = b'HKW3'
+WS_VERSION = 1
+WS_HEADER = struct.Struct('<4sBBIHHfB')     # magic, version, flags, seq, num_persons, num_joints, rmse, capture_time 길이
+WS_PERSON = struct.Struct('<iBB')           # id, event, encoding
+FLAG_DELTA = 0x01
+ENCODING_FLOAT32 = 0
+ENCODING_QUANTIZED = 1
+ENCODING_DELTA = 2
+log = logging.getLogger("HkPose3D.Broadcast")
+_EVENT_CODES = {name: code for code, name in enumerate(EVENT_NAMES)}
+_INT16_MAX = np.iinfo(np.int16).max
+
+
+def build_pos3D_message(corrected_pos3D_est, person_ids, rmse, captureTime, event_names):
+    """JSON 클라이언트와 aggregator로 보내는 메시지 (3D_points/event_name은 기존 클라이언트 호환을 위해 첫 번째 인물)."""
+    persons = [
+        {
+            "id": int(person_id),
+            "3D_points": [{"x": round(joint[0], 3), "y": round(joint[1], 3), "z": round(joint[2], 3)} for joint in skeleton],
+            "event_name": event_name
+        }
+        for person_id, skeleton, event_name in zip(person_ids, corrected_pos3D_est, event_names)
+    ]
+    return {
+        "3D_points": persons[0]["3D_points"],
+        "rmse": rmse,
+        "capture_time": captureTime,
+        "event_name": persons[0]["event_name"],
+        "persons": persons
+    }
+
+def client_options(websocket, path=None):
+    """WebSocket URL의 query에서 (format, delta) 선택 (websockets 11은 path 인자, 이후 버전은 websocket.request.path)."""
+    if path is None:
+        request = getattr(websocket, "request", None)
+        path = getattr(request, "path", None) or getattr(websocket, "path", "") or ""
+    query = parse_qs(urlsplit(path).query)
+    wire_format = query.get("format", [WS_DEFAULT_FORMAT])[0]
+    if wire_format not in WS_FORMATS:
+        wire_format = WS_DEFAULT_FORMAT
+    delta = wire_format == "binary" and query.get("delta", ["0"])[0].lower() in ("1", "true", "yes")
+    return wire_format, delta
+
+
+class PoseEncoder:
+    """
+    Encodes one slot into the payloads requested by the connected clients:
+    "json" (str), "binary" (float32) and "key"/"delta" (quantized) for delta clients.
+    The quantized positions of the last frame are kept as the delta reference.
+    """
+    def __init__(self, quantum=DELTA_QUANTUM):
+        self.quantum = quantum
+        self.seq = 0
+        self.reference = {}     # person id -> 이전 프레임의 양자화 좌표 (int32, (num_joints, 3))
+
+    def header(self, flags, num_persons, num_joints, rmse, capture_time):
+        capture_time = capture_time.encode('ascii')[:255]
+        return WS_HEADER.pack(WS_MAGIC, WS_VERSION, flags, self.seq, num_persons, num_joints,
+                              float(rmse or 0.0), len(capture_time)) + capture_time
+
+    def encode(self, encodings, person_ids, skeletons, event_names, rmse, capture_time, message=None):
+        """encodings: {"json", "binary", "delta"}의 부분집합. 반환: {"seq", <payload 이름>: bytes/str}."""
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        skeletons = np.asarray(skeletons, dtype=np.float64).reshape(len(person_ids), -1, 3)
+        num_persons, num_joints = skeletons.shape[:2]
+        person_ids = [int(person_id) for person_id in person_ids]
+        events = [_EVENT_CODES.get(event_name, 0) for event_name in event_names]
+        frame = {"seq": self.seq}
+
+        if "json" in encodings:
+            if message is None:
+                message = build_pos3D_message(skeletons.tolist(), person_ids, rmse, capture_time, event_names)
+            frame["json"] = json.dumps(message) + '\n'
+
+        if "binary" in encodings:
+            parts = [self.header(0, num_persons, num_joints, rmse, capture_time)]
+            for person_id, event, skeleton in zip(person_ids, events, skeletons.astype('<f4')):
+                parts += [WS_PERSON.pack(person_id, event, ENCODING_FLOAT32), skeleton.tobytes()]
+            frame["binary"] = b''.join(parts)
+
+        quantized = np.round(skeletons / self.quantum).astype('<i4')
+        if "delta" in encodings:
+            key = [self.header(0, num_persons, num_joints, rmse, capture_time)]
+            delta = [self.header(FLAG_DELTA, num_persons, num_joints, rmse, capture_time)]
+            for person_id, event, current in zip(person_ids, events, quantized):
+                absolute = WS_PERSON.pack(person_id, event, ENCODING_QUANTIZED) + current.tobytes()
+                key.append(absolute)
+                previous = self.reference.get(person_id)
+                difference = None if previous is None or previous.shape != current.shape else current - previous
+                if difference is not None and np.abs(difference).max() <= _INT16_MAX:
+                    delta.append(WS_PERSON.pack(person_id, event, ENCODING_DELTA) + difference.astype('<i2').tobytes())
+                else:
+                    delta.append(absolute)      # 새 인물이거나 int16 범위를 넘는 이동
+            frame["key"] = b''.join(key)
+            frame["delta"] = b''.join(delta)
+        self.reference = dict(zip(person_ids, quantized))
+        return frame
+
+
+class WebSocketClient:
+    def __init__(self, websocket, wire_format, delta, queue_size):
+        self.websocket = websocket
+        self.format = wire_format
+        self.delta = delta
+        self.queue = deque(maxlen=queue_size)   # 전송 대기 프레임 (가득 차면 append가 가장 오래된 프레임을 버림)
+        self.ready = asyncio.Event()
+        self.last_seq = None                    # 마지막으로 보낸 프레임 번호 (delta 기준)
+        self.sent = 0
+        self.dropped = 0
+        self.task = None
+
+    @property
+    def encoding(self):
+        if self.format == "json":
+            return "json"
+        return "delta" if self.delta else "binary"
+
+    def payload(self, frame):
+        if self.encoding != "delta":
+            return frame[self.encoding]
+        if self.last_seq is not None and frame["seq"] == (self.last_seq + 1) & 0xFFFFFFFF:
+            return frame["delta"]
+        return frame["key"]     # 첫 프레임이거나 앞 프레임을 버렸으면 key 프레임
+
+
+class PoseBroadcaster:
+    """
+    Fan-out of encoded slots to the WebSocket clients. publish() never awaits a client:
+    it encodes once and enqueues; each client's sender task drains its own queue.
+    """
+    def __init__(self, queue_size=WS_QUEUE_SIZE, on_sent=None):
+        self.queue_size = queue_size
+        self.on_sent = on_sent      # 전송한 payload 크기(bytes)를 받는 함수 (예: 서버 지표)
+        self.encoder = PoseEncoder()
+        self.clients = {}           # websocket -> WebSocketClient
+        self.dropped = 0
+
+    def add(self, websocket, wire_format=WS_DEFAULT_FORMAT, delta=False):
+        """클라이언트 등록 및 sender task 시작 (이벤트 루프 안에서 호출)."""
+        client = WebSocketClient(websocket, wire_format, delta, self.queue_size)
+        client.task = asyncio.ensure_future(self._sender(client))
+        self.clients[websocket] = client
+        return client
+
+    def remove(self, websocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            client.task.cancel()
+        return client
+
+    async def serve(self, websocket, path=None):
+        """WebSocket 연결 하나를 연결이 끊길 때까지 등록."""
+        wire_format, delta = client_options(websocket, path)
+        self.add(websocket, wire_format, delta)
+        log.info("New WebSocket client connected: %s (%s%s)", path or '', wire_format, ', delta' if delta else '')
+        try:
+            await websocket.wait_closed()
+        finally:
+            client = self.remove(websocket)
+            log.info("WebSocket client disconnected (sent %d, dropped %d)", client.sent, client.dropped)
+
+    def publish(self, person_ids, skeletons, event_names, rmse, capture_time, message=None):
+        """슬롯 하나를 포맷별로 한 번만 인코딩해 모든 클라이언트 대기열에 넣음 (클라이언트가 없으면 None)."""
+        if not self.clients:
+            return None
+        clients = list(self.clients.values())
+        frame = self.encoder.encode({client.encoding for client in clients},
+                                    person_ids, skeletons, event_names, rmse, capture_time, message)
+        for client in clients:
+            if len(client.queue) == client.queue.maxlen:
+                client.dropped += 1
+                self.dropped += 1
+            client.queue.append(frame)
+            client.ready.set()
+        return frame
+
+    async def _sender(self, client):
+        while True:
+            await client.ready.wait()
+            client.ready.clear()
+            while client.queue:
+                frame = client.queue.popleft()
+                data = client.payload(frame)
+                try:
+                    await client.websocket.send(data)
+                except Exception as e:
+                    log.warning("Error sending data to WebSocket client: %s", e)
+                    return      # 끊긴 연결은 serve()에서 정리
+                client.last_seq = frame["seq"]
+                client.sent += 1
+                if self.on_sent is not None:
+                    self.on_sent(len(data))
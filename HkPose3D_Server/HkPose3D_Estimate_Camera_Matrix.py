@@ -1,142 +1,280 @@
+"""
+Camera projection matrix estimation (DLT) from the Unity calibration captures.
+
+Every camera's Captures/<camera>/calibration/ directory holds file pairs with the same slot:
+    body_pos3D_<slot>.txt              avatar 3D joints (ground truth, first 15 lines)
+    <camera>_yolov8x-pose_<slot>.txt   YOLO keypoints (x, y, conf) of the same frame
+All pairs are loaded in bulk and the DLT system is built in one vectorized step on
+Hartley-normalized coordinates. With --refine the estimate is refined by minimizing the
+reprojection error (scipy.optimize.least_squares). Cameras are calibrated in parallel processes.
+
+Output per camera (in calibration/):
+    <camera>_Pmatrix_Est.txt           3x4 pixel projection matrix (server: CAMERA_P_MATRIX = "EST")
+    <camera>_Pmatrix_Est_report.json   reprojection error statistics (pixels)
+
+Usage:
+    python HkPose3D_Estimate_Camera_Matrix.py                         # every camera with a calibration/ directory
+    python HkPose3D_Estimate_Camera_Matrix.py --refine --workers 8
+    python HkPose3D_Estimate_Camera_Matrix.py --cameras Camera1 Camera3
+"""
 import os
+import re
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 # Define the directory and file prefixes
-CAM_DIR = os.path.join("..", "HkPose3D_Unity", "Captures") 
-CAMERA_NAMES = ["Camera1", "Camera2", "Camera3", "Camera4"]
+CAM_DIR = os.path.join("..", "HkPose3D_Unity", "Captures")
+CAMERA_NAMES = ["Camera1", "Camera2", "Camera3", "Camera4"]   # CAM_DIR에서 calibration/ 폴더를 찾지 못했을 때의 기본 카메라
+NUM_JOINTS = 15             # 파일마다 읽을 관절(줄) 수
+MIN_CONFIDENCE = 0.1        # YOLO keypoint confidence가 이 값보다 낮은 관절은 보정에서 제외 (서버 CONFIDENCE_THRESHOLD와 동일)
+REFINE = False              # True (또는 --refine): DLT 결과를 재투영 오차 최소화(비선형 최소제곱)로 보정
+WORKERS = 0                 # 카메라를 동시에 보정할 프로세스 수 (0이면 min(카메라 수, CPU 수))
+WORST_SLOTS = 5             # report에 남길 재투영 오차가 가장 큰 슬롯 수
 pos3D_prefix_template = "body_pos3D_"
 pos2D_prefix_template = "{}_yolov8x-pose_"
 
-def load_txt_files_sorted_by_time(directory, prefix):
-    # Get all files in the directory with the specified prefix
-    files = [f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith(".txt")]
-    
-    # Sort the files by their last modified time
-    files.sort(key=lambda f: os.path.getmtime(os.path.join(directory, f)))
-
-    # Load the first 15 lines of each file into a list of np.arrays
-    data_list = []
-    for file in files:
-        file_path = os.path.join(directory, file)
-        
-        # Open the file and read the first 15 lines
-        with open(file_path, 'r') as f:
-            lines = f.readlines()[:15]  # Read only the first 15 lines
-
-        # Convert the read lines to a numpy array
-        data = np.loadtxt(lines, delimiter=',')
-        data_list.append(data)
-    
-    # Concatenate all arrays into a single np.array
-    combined_data = np.vstack(data_list)
-    
-    return combined_data
-
-def estimate_camera_matrix(object_points, image_points):
-    """
-    Estimate the camera projection matrix using DLT algorithm.
 
-    Parameters:
-    object_points (np.array): 3D object points of shape (N, 3).
-    image_points (np.array): 2D image points of shape (N, 2).
+########################### 데이터 로드 ##############################
+def list_slot_files(directory, prefix):
+    """{slot: path} for the <prefix><slot>.txt files in directory."""
+    return {f[len(prefix):-len(".txt")]: os.path.join(directory, f)
+            for f in os.listdir(directory) if f.startswith(prefix) and f.endswith(".txt")}
+
+def read_head(path, num_rows=NUM_JOINTS):
+    """파일의 앞 num_rows줄 (줄이 모자라면 None)."""
+    with open(path, 'r') as f:
+        rows = list(itertools.islice(f, num_rows))
+    return rows if len(rows) == num_rows else None
+
+def load_calibration_pairs(calibration_dir, camera_name, num_joints=NUM_JOINTS):
+    """
+    Load every GT / keypoint file pair of one camera, matched by slot (not by file time).
 
     Returns:
-    np.array: The 3x4 camera projection matrix.
+    tuple: (slots, pos3D (num_slots, num_joints, 3), pos2D_xyc (num_slots, num_joints, 3))
     """
-    num_points = object_points.shape[0]
-    A = []
+    gt_files = list_slot_files(calibration_dir, pos3D_prefix_template)
+    keypoint_files = list_slot_files(calibration_dir, pos2D_prefix_template.format(camera_name))
+    slots, gt_lines, keypoint_lines = [], [], []
+    for slot in sorted(gt_files.keys() & keypoint_files.keys()):
+        gt_rows = read_head(gt_files[slot], num_joints)
+        keypoint_rows = read_head(keypoint_files[slot], num_joints)
+        if gt_rows is None or keypoint_rows is None:
+            print(f"{camera_name}: skipping {slot} (less than {num_joints} rows)")
+            continue
+        slots.append(slot)
+        gt_lines += gt_rows
+        keypoint_lines += keypoint_rows
+    if not slots:
+        return slots, np.zeros((0, num_joints, 3)), np.zeros((0, num_joints, 3))
 
-    for i in range(num_points):
-        X, Y, Z = object_points[i]
-        u, v = image_points[i]
-        A.append([-X, -Y, -Z, -1, 0, 0, 0, 0, u*X, u*Y, u*Z, u])
-        A.append([0, 0, 0, 0, -X, -Y, -Z, -1, v*X, v*Y, v*Z, v])
+    # 모든 파일의 줄을 한 번에 파싱
+    pos3D = np.loadtxt(gt_lines, delimiter=',', ndmin=2)[:, :3].reshape(len(slots), num_joints, 3)
+    pos2D_xyc = np.loadtxt(keypoint_lines, delimiter=',', ndmin=2)[:, :3].reshape(len(slots), num_joints, 3)
+    return slots, pos3D, pos2D_xyc
 
-    A = np.array(A)
-    U, S, Vt = np.linalg.svd(A)
-    P = Vt[-1].reshape(3, 4)
-    
-    return P
 
-def project_point(P, point_3d):
+########################### DLT ##############################
+def to_homogeneous(points):
+    return np.hstack([points, np.ones((len(points), 1))])
+
+def normalization_matrix(points):
     """
-    Project a 3D point onto the 2D image plane using the camera projection matrix.
+    Hartley normalization: moves the centroid to the origin and scales the points to
+    a mean distance of sqrt(dim) from it.
 
     Parameters:
-    P (np.array): The 3x4 camera projection matrix.
-    point_3d (np.array): The 3D point as a numpy array of shape (3,).
+    points (np.array): Points of shape (N, dim).
 
     Returns:
-    np.array: The 2D point on the image plane as a numpy array of shape (2,).
+    np.array: The (dim + 1) x (dim + 1) similarity transform.
     """
-    # Convert the 3D point to homogeneous coordinates (4D vector)
-    point_3d_homogeneous = np.append(point_3d, 1)
+    dim = points.shape[1]
+    centroid = points.mean(axis=0)
+    mean_distance = np.linalg.norm(points - centroid, axis=1).mean()
+    scale = np.sqrt(dim) / max(mean_distance, 1e-12)
+    T = np.eye(dim + 1)
+    T[:dim, :dim] *= scale
+    T[:dim, dim] = -scale * centroid
+    return T
 
-    # Apply the camera projection matrix to the 3D point
-    point_2d_homogeneous = np.dot(P, point_3d_homogeneous)
+def dlt_matrix(object_points_h, image_points_h):
+    """DLT 선형 시스템 A (2N x 12): 점마다 두 행을 한 번에 구성."""
+    num_points = len(object_points_h)
+    A = np.zeros((num_points, 2, 12))
+    A[:, 0, 0:4] = -object_points_h
+    A[:, 0, 8:12] = image_points_h[:, 0:1] * object_points_h
+    A[:, 1, 4:8] = -object_points_h
+    A[:, 1, 8:12] = image_points_h[:, 1:2] * object_points_h
+    return A.reshape(2 * num_points, 12)
 
-    # Convert from homogeneous coordinates to 2D coordinates
-    u = point_2d_homogeneous[0] / point_2d_homogeneous[2]
-    v = point_2d_homogeneous[1] / point_2d_homogeneous[2]
+def refine_normalized_matrix(P, object_points_h, image_points):
+    """정규화 좌표계에서 재투영 오차를 최소화 (Levenberg-Marquardt, 정규화 변환이 닮음 변환이므로 pixel 오차 최소화와 같음)."""
+    from scipy.optimize import least_squares    # --refine일 때만 import
 
-    return np.array([u, v])
+    def residuals(p):
+        projected = object_points_h @ p.reshape(3, 4).T
+        return (projected[:, :2] / projected[:, 2:3] - image_points).ravel()
 
-# Iterate over all camera names
-for camera_name in CAMERA_NAMES:
-    calibration_dir = os.path.join(CAM_DIR, camera_name, "calibration")
-    pos3D_prefix = pos3D_prefix_template
-    pos2D_prefix = pos2D_prefix_template.format(camera_name)
+    def jacobian(p):
+        # u = (p1 . X) / (p3 . X), v = (p2 . X) / (p3 . X)
+        projected = object_points_h @ p.reshape(3, 4).T
+        w = projected[:, 2:3]
+        uv = projected[:, :2] / w
+        J = np.zeros((len(object_points_h), 2, 12))
+        J[:, 0, 0:4] = object_points_h / w
+        J[:, 1, 4:8] = object_points_h / w
+        J[:, :, 8:12] = -uv[:, :, None] * (object_points_h / w)[:, None, :]
+        return J.reshape(-1, 12)
 
-    # Load and print the combined data for body_pos3D_
-    pos3D_GT = load_txt_files_sorted_by_time(calibration_dir, pos3D_prefix)
-    print(f"Combined body_pos3D_ data for {camera_name}:")
-    print(pos3D_GT)
+    result = least_squares(residuals, P.ravel(), jac=jacobian, method="lm")    # 점 6개 이상 -> 잔차 12개 이상
+    return result.x.reshape(3, 4)
 
-    # Load and print the combined data for Camera_ScreenShot_
-    pos2D_xyc = load_txt_files_sorted_by_time(calibration_dir, pos2D_prefix)
-    print(f"\nCombined {camera_name}_ScreenShot_ data:")
-    print(pos2D_xyc)
+def estimate_camera_matrix(object_points, image_points, normalize=True, refine=False):
+    """
+    Estimate the camera projection matrix using the DLT algorithm.
 
-    # Extract the first and second columns from pos2D_xyc and store it in pos2D_xy
-    pos2D_xy = pos2D_xyc[:, :2]  # Extract the first and second columns
+    Parameters:
+    object_points (np.array): 3D object points of shape (N, 3), N >= 6.
+    image_points (np.array): 2D image points of shape (N, 2).
+    normalize (bool): Solve on Hartley-normalized coordinates.
+    refine (bool): Refine the DLT solution by minimizing the reprojection error.
 
-    # Print the pos2D_xy
-    print(f"\nPose data (first and second columns of {camera_name}_ScreenShot_):")
-    print(pos2D_xy)
+    Returns:
+    np.array: The 3x4 camera projection matrix (unit norm, positive depth).
+    """
+    T3 = normalization_matrix(object_points) if normalize else np.eye(4)
+    T2 = normalization_matrix(image_points) if normalize else np.eye(3)
+    object_points_h = to_homogeneous(object_points) @ T3.T
+    image_points_h = to_homogeneous(image_points) @ T2.T
 
-    P = estimate_camera_matrix(pos3D_GT, pos2D_xy)
-    print(f"Estimated camera projection matrix for {camera_name}:")
-    print(P)
+    _, _, Vt = np.linalg.svd(dlt_matrix(object_points_h, image_points_h), full_matrices=False)
+    P = Vt[-1].reshape(3, 4)
+    if refine:
+        P = refine_normalized_matrix(P, object_points_h, image_points_h[:, :2])
 
-    # Save the matrix P to Camera_Pmatrix.txt
-    output_file = os.path.join(calibration_dir, f"{camera_name}_Pmatrix_Est.txt")
-    np.savetxt(output_file, P, delimiter=',', fmt='%0.6f')
+    # 정규화 해제, 크기 1, 점들이 카메라 앞(깊이 > 0)에 오도록 부호 결정
+    P = np.linalg.inv(T2) @ P @ T3
+    P /= np.linalg.norm(P)
+    if np.median(to_homogeneous(object_points) @ P[2]) < 0:
+        P = -P
+    return P
+
+def project_points(P, points_3d):
+    """
+    Project 3D points onto the 2D image plane using the camera projection matrix.
+
+    Parameters:
+    P (np.array): The 3x4 camera projection matrix.
+    points_3d (np.array): 3D points of shape (N, 3).
+
+    Returns:
+    np.array: The 2D points on the image plane of shape (N, 2).
+    """
+    projected = to_homogeneous(points_3d) @ P.T
+    return projected[:, :2] / projected[:, 2:3]
 
-    # Format and save the P matrix with the specified format
+def project_point(P, point_3d):
+    """Project a single 3D point of shape (3,) (see project_points)."""
+    return project_points(P, np.asarray(point_3d, dtype=np.float64)[None])[0]
+
+
+########################### 보정 및 report ##############################
+def reprojection_statistics(P, object_points, image_points, point_slots, slots):
+    """재투영 오차 통계 (pixel, 점별 유클리드 거리) 및 평균 오차가 가장 큰 슬롯."""
+    errors = np.linalg.norm(project_points(P, object_points) - image_points, axis=1)
+    slot_sum = np.bincount(point_slots, weights=errors, minlength=len(slots))
+    slot_count = np.bincount(point_slots, minlength=len(slots))
+    slot_mean = np.divide(slot_sum, slot_count, out=np.zeros(len(slots)), where=slot_count > 0)
+    worst = np.argsort(slot_mean)[::-1][:WORST_SLOTS]
+    return {
+        "points": int(len(errors)),
+        "mean": float(errors.mean()),
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "median": float(np.median(errors)),
+        "p95": float(np.percentile(errors, 95)),
+        "max": float(errors.max()),
+        "worst_slots": [[slots[i], float(slot_mean[i])] for i in worst if slot_count[i] > 0],
+    }
+
+def save_camera_matrix(output_file, P):
     with open(output_file, "w") as f:
         for row in P:
             f.write(", ".join(f"{value:.8e}" for value in row) + "\n")
 
-    print(f"Camera projection matrix saved to {output_file}")
+def calibrate_camera(camera_name, cam_dir=CAM_DIR, refine=REFINE, min_confidence=MIN_CONFIDENCE):
+    """카메라 하나를 보정해 P matrix와 report를 calibration/에 저장하고 report 반환 (실패 시 "error")."""
+    start = time.perf_counter()
+    calibration_dir = os.path.join(cam_dir, camera_name, "calibration")
+    report = {"camera": camera_name, "refine": refine, "min_confidence": min_confidence}
+    if not os.path.isdir(calibration_dir):
+        return dict(report, error=f"{calibration_dir} not found")
+
+    slots, pos3D, pos2D_xyc = load_calibration_pairs(calibration_dir, camera_name)
+    load_time = time.perf_counter() - start
+    confident = pos2D_xyc[..., 2] >= min_confidence     # YOLO가 검출하지 못한 관절 (0, 0, 낮은 conf) 제외
+    point_slots = np.nonzero(confident)[0]
+    object_points = pos3D[confident]
+    image_points = pos2D_xyc[confident][:, :2]
+    report.update(pairs=len(slots), ignored_points=int((~confident).sum()))
+    if len(object_points) < 6:
+        return dict(report, error=f"{len(object_points)} usable points in {len(slots)} pairs (at least 6 needed)")
+
+    P = estimate_camera_matrix(object_points, image_points, refine=refine)
+    output_file = os.path.join(calibration_dir, f"{camera_name}_Pmatrix_Est.txt")
+    save_camera_matrix(output_file, P)
+
+    report["reprojection_error_px"] = reprojection_statistics(P, object_points, image_points, point_slots, slots)
+    report["load_s"] = load_time
+    report["total_s"] = time.perf_counter() - start
+    report["matrix_file"] = output_file
+    with open(os.path.join(calibration_dir, f"{camera_name}_Pmatrix_Est_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def calibrate_cameras(camera_names, cam_dir=CAM_DIR, refine=REFINE, workers=WORKERS):
+    """카메라별 보정을 병렬 프로세스로 실행 (workers == 1이면 현재 프로세스에서 순서대로)."""
+    workers = workers or min(len(camera_names), os.cpu_count() or 1)
+    if workers <= 1 or len(camera_names) <= 1:
+        return [calibrate_camera(camera_name, cam_dir, refine) for camera_name in camera_names]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(calibrate_camera, camera_names, itertools.repeat(cam_dir), itertools.repeat(refine)))
 
-    ############################################################################
-    ## pos3D_GT를 추정한 P matrix를 이용하여 2D로 projection하여 pos2D_xy와 비교 (MSE, RMSE)
-    # Initialize an array to store the projected 2D points
-    projected_2d_points = []
+def find_cameras(cam_dir):
+    """calibration/ 폴더가 있는 카메라 이름 (Camera2 < Camera10 순서)."""
+    if not os.path.isdir(cam_dir):
+        return []
+    names = [name for name in os.listdir(cam_dir) if os.path.isdir(os.path.join(cam_dir, name, "calibration"))]
+    return sorted(names, key=lambda name: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)])
 
-    # Loop through each 3D point and project it to 2D
-    for point_3d in pos3D_GT:
-        point_2d = project_point(P, point_3d)
-        projected_2d_points.append(point_2d)
+def main():
+    parser = argparse.ArgumentParser(description="Estimate camera projection matrices (DLT) from the Unity calibration captures.")
+    parser.add_argument("--cameras", nargs="+", help="cameras to calibrate (default: every camera with a calibration/ directory)")
+    parser.add_argument("--cam-dir", default=CAM_DIR, help="Unity captures directory")
+    parser.add_argument("--refine", action="store_true", default=REFINE, help="refine the DLT estimate by minimizing the reprojection error")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="parallel processes (0: min(cameras, CPUs))")
+    args = parser.parse_args()
 
-    # Convert the list of projected points to a numpy array (optional)
-    projected_2d_points = np.array(projected_2d_points)
+    camera_names = args.cameras or find_cameras(args.cam_dir) or CAMERA_NAMES
+    start = time.perf_counter()
+    reports = calibrate_cameras(camera_names, args.cam_dir, args.refine, args.workers)
+    elapsed = time.perf_counter() - start
 
-    # Output all 2D coordinates
-    print(f"All projected 2D coordinates for {camera_name}:")
-    print(projected_2d_points)
+    print(f"{'camera':<12}{'pairs':>7}{'points':>8}{'mean':>9}{'rmse':>9}{'median':>9}{'p95':>9}{'max':>9}  (reprojection error, pixels)")
+    for report in reports:
+        if "error" in report:
+            print(f"{report['camera']:<12}  \033[91m{report['error']}\033[0m")
+            continue
+        error = report["reprojection_error_px"]
+        print(f"{report['camera']:<12}{report['pairs']:>7}{error['points']:>8}{error['mean']:>9.3f}{error['rmse']:>9.3f}"
+              f"{error['median']:>9.3f}{error['p95']:>9.3f}{error['max']:>9.3f}")
+    print(f"Calibrated {sum('error' not in report for report in reports)}/{len(reports)} cameras in {elapsed:.2f} s "
+          f"({'DLT + refinement' if args.refine else 'DLT'}); matrices and reports saved in <camera>/calibration/")
 
-    # mse between pos2D_xy and projected_2d_points
-    mse = np.mean(np.square(pos2D_xy - projected_2d_points))
-    rmse = np.sqrt(mse)
-    print(f"\nMSE & RMSE between pos2D_xy and projected_2d_points for {camera_name}: {mse:.6f}, {rmse:.6f} pixels")
+if __name__ == "__main__":
+    main()
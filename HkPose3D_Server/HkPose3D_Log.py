@@ -0,0 +1,192 @@
+"""
+Leveled, non-blocking logging (shared by HkPose3D_Server and HkPose3D_Device; the
+Device scripts import it from ../HkPose3D_Server).
+
+Every module logs to its own logger under "HkPose3D" (e.g. "HkPose3D.Server").
+setup_logging() routes all of them through a bounded queue to a listener thread,
+so the pipeline threads only enqueue a record and never wait for the console or
+a file; when the queue is full the record is dropped and counted.
+
+Per-frame messages are DEBUG. Hot paths report through LogSummary (one INFO line
+per key, e.g. per camera, every LOG_SUMMARY_INTERVAL seconds) and repeated warnings
+through RateLimitedLog. With LOG_LEVEL "WARNING" a production run only pays for
+an isEnabledFor() check per frame.
+
+Usage:
+    log = logging.getLogger("HkPose3D.Server")
+    setup_logging("INFO", "server.log")         # entry point only (once)
+    log.debug("Received %d bytes from %s", size, camera)
+    packets = LogSummary(log)
+    packets.add(camera, packets=1, bytes=size, max_latency_ms=latency)
+    late = RateLimitedLog(log)
+    late.warning(camera, "Late packet from %s for %s", camera, slot)
+"""
+import sys
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+import weakref
+from collections import defaultdict
+
+LOG_LEVEL = "INFO"              # 기본 로그 레벨 (DEBUG: 프레임별 메시지, INFO: 주기 요약, WARNING: 운영 환경)
+LOG_QUEUE_SIZE = 10000          # 출력 스레드로 넘기는 로그 대기열 크기 (가득 차면 새 로그를 버림)
+LOG_SUMMARY_INTERVAL = 1.0      # LogSummary가 키마다 요약을 한 줄 출력하는 주기 (초)
+LOG_RATE_LIMIT_INTERVAL = 1.0   # RateLimitedLog가 키마다 같은 경고를 출력하는 최소 간격 (초)
+LOG_FORMAT = "%(asctime)s.%(msecs)03d %(levelname)-7s %(name)s: %(message)s"
+LOG_DATE_FORMAT = "%H:%M:%S"
+
+_LEVEL_COLORS = {logging.WARNING: "\033[93m", logging.ERROR: "\033[91m", logging.CRITICAL: "\033[91m"}
+_listener = None
+_summaries = weakref.WeakSet()      # stop_logging에서 남은 집계를 출력할 LogSummary
+
+
+class ColorFormatter(logging.Formatter):
+    """콘솔(tty)에서 WARNING 이상을 색으로 구분."""
+    def format(self, record):
+        message = super().format(record)
+        color = _LEVEL_COLORS.get(record.levelno)
+        return f"{color}{message}\033[0m" if color else message
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """대기열이 가득 차면 기다리지 않고 로그를 버리는 QueueHandler."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level=None, log_file=None):
+    """
+    "HkPose3D" 로거를 대기열 -> 출력 스레드(콘솔, log_file)로 연결 (다시 호출하면 레벨과 출력 대상을 교체).
+    level: 로그 레벨 이름 또는 숫자 (None이면 LOG_LEVEL).
+    """
+    global _listener
+    stop_logging()
+    handlers = []
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter((ColorFormatter if sys.stdout.isatty() else logging.Formatter)(LOG_FORMAT, LOG_DATE_FORMAT))
+    handlers.append(console)
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        handlers.append(file_handler)
+
+    root = logging.getLogger("HkPose3D")
+    root.setLevel(level.upper() if isinstance(level, str) else (level or LOG_LEVEL))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE)))
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(root.handlers[0].queue, *handlers)
+    _listener.start()
+    return root
+
+def stop_logging():
+    """LogSummary의 남은 집계와 대기 중인 로그를 모두 출력하고 출력 스레드 종료 (os._exit 전에 호출)."""
+    global _listener
+    for summary in list(_summaries):
+        summary.flush()
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def dropped_records():
+    """대기열이 가득 차 버린 로그 수."""
+    handlers = logging.getLogger("HkPose3D").handlers
+    return sum(getattr(handler, "dropped", 0) for handler in handlers)
+
+atexit.register(stop_logging)
+
+
+class LogSummary:
+    """
+    Aggregates hot-path events per key and logs one line per key every interval seconds.
+    Values are summed, except names starting with "max_" (maximum) and "last_" (latest).
+    Keys that stopped receiving events are logged by the next add() of any key after
+    their interval, and whatever is left by flush() (called from stop_logging()).
+    Thread-safe; costs one isEnabledFor() check when the level is disabled.
+    """
+    def __init__(self, logger, interval=LOG_SUMMARY_INTERVAL, level=logging.INFO):
+        self.logger = logger
+        self.interval = interval
+        self.level = level
+        self.values = defaultdict(dict)     # key -> {이름: 값}
+        self.started = {}                   # key -> 집계 시작 시각 (time.monotonic)
+        self.swept = time.monotonic()       # 마지막으로 멈춘 키를 확인한 시각
+        self.lock = threading.Lock()
+        _summaries.add(self)
+
+    def add(self, key, **values):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        now = time.monotonic()
+        with self.lock:
+            current = self.values[key]
+            for name, value in values.items():
+                if name.startswith("max_"):
+                    current[name] = max(current.get(name, value), value)
+                elif name.startswith("last_"):
+                    current[name] = value
+                else:
+                    current[name] = current.get(name, 0) + value
+            self.started.setdefault(key, now)
+            due = [key] if now - self.started[key] >= self.interval else []
+            if now - self.swept >= self.interval:
+                # 이벤트가 끊긴 키의 마지막 집계 (다른 키의 add에서 주기마다 한 번 확인)
+                self.swept = now
+                due = [other for other, started in self.started.items() if now - started >= self.interval]
+            pending = [(other, self.values.pop(other), self.started.pop(other)) for other in due]
+        self.emit(pending, now)
+
+    def flush(self):
+        """모든 키의 남은 집계를 주기와 관계없이 출력."""
+        now = time.monotonic()
+        with self.lock:
+            pending = [(key, self.values.pop(key), self.started.pop(key)) for key in list(self.started)]
+        self.emit(pending, now)
+
+    def emit(self, pending, now):
+        for key, current, started in pending:
+            fields = ", ".join(f"{name} {value:.1f}" if isinstance(value, float) else f"{name} {value}" for name, value in current.items())
+            self.logger.log(self.level, "%s (%.1f s): %s", key, now - started, fields)
+
+
+class RateLimitedLog:
+    """Logs a message at most once per interval per key and reports how many were suppressed."""
+    def __init__(self, logger, interval=LOG_RATE_LIMIT_INTERVAL):
+        self.logger = logger
+        self.interval = interval
+        self.last = {}                      # key -> 마지막 출력 시각 (time.monotonic)
+        self.suppressed = defaultdict(int)  # key -> 마지막 출력 이후 생략한 수
+        self.lock = threading.Lock()
+
+    def log(self, level, key, message, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last.get(key, -self.interval) < self.interval:
+                self.suppressed[key] += 1
+                return
+            self.last[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            message += f" (+{suppressed} similar in the last {self.interval:g} s)"
+        self.logger.log(level, message, *args)
+
+    def info(self, key, message, *args):
+        self.log(logging.INFO, key, message, *args)
+
+    def warning(self, key, message, *args):
+        self.log(logging.WARNING, key, message, *args)
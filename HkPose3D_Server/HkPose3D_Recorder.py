@@ -0,0 +1,180 @@
+"""
+Background session recorder for keypoint results (shared by HkPose3D_Server and
+HkPose3D_Device; the Device scripts import it from ../HkPose3D_Server).
+
+Records are queued by the live pipeline and written by a writer thread as chunked,
+columnar .npz shards (one .npy per column):
+
+    <directory>/<session>/<stream>_000000.npz, <stream>_000001.npz, ...
+
+Scalar fields (str, int, float) become one column with one value per record.
+Array fields (np.ndarray, first axis = variable length, e.g. persons) are concatenated
+into one column plus "<name>__offsets" so records can be split again.
+
+Usage:
+    recorder = SessionRecorder(EST_DIR, "BodyPos3dEST")
+    recorder.write({"slot": slot, "rmse": rmse, "points": skeletons})   # never blocks with policy="drop"
+    recorder.close()
+
+    session = load_session(os.path.join(EST_DIR, "2024-09-11_14-38-30"), "BodyPos3dEST")
+    per_slot_points = split_records(session, "points")
+
+    python HkPose3D_Recorder.py <session_dir> [<stream>]     # summary of a recorded session
+"""
+import os
+import sys
+import glob
+import time
+import queue
+import atexit
+import logging
+import threading
+import numpy as np
+from datetime import datetime
+
+log = logging.getLogger("HkPose3D.Recorder")
+
+CHUNK_RECORDS = 256         # shard 하나에 모을 최대 레코드 수
+FLUSH_INTERVAL = 2.0        # 레코드가 CHUNK_RECORDS만큼 모이지 않아도 이 시간(초)이 지나면 shard로 기록
+MAX_PENDING_RECORDS = 4096  # writer 스레드가 밀릴 때 대기열에 쌓을 수 있는 최대 레코드 수
+OFFSETS_SUFFIX = "__offsets"
+_FLUSH = object()           # flush_interval 경과 표시
+
+class SessionRecorder:
+    """
+    Bounded queue + writer thread. With policy="drop" a full queue drops the record
+    (the live pipeline never waits for the disk); with policy="block" write() waits up
+    to block_timeout seconds (backpressure) before dropping.
+    """
+    def __init__(self, directory, stream, session=None, policy="drop", block_timeout=1.0,
+                 chunk_records=CHUNK_RECORDS, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING_RECORDS,
+                 prepare=None):
+        self.session_dir = os.path.join(directory, session or datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        self.stream = stream
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.chunk_records = chunk_records
+        self.flush_interval = flush_interval
+        self.prepare = prepare      # writer 스레드에서 레코드를 변환하는 함수 (예: 이미지 JPEG 인코딩)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.chunk_index = 0
+        self.written = 0
+        self.dropped = 0
+        self.closed = False
+        os.makedirs(self.session_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._writer, name=f"recorder-{stream}", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        """record: {name: scalar or np.ndarray}. 기록 대기열에 넣었으면 True, 버렸으면 False."""
+        if self.closed:
+            return False
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                log.warning("Recorder %s: disk is behind, dropped %d record(s)", self.stream, self.dropped)
+            return False
+
+    def close(self):
+        """남은 레코드를 모두 기록하고 writer 스레드 종료."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def _writer(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                record = _FLUSH
+            if record is not None and record is not _FLUSH:
+                try:
+                    pending.append(self.prepare(record) if self.prepare else record)
+                except Exception as e:
+                    log.error("Recorder %s: failed to prepare record: %s", self.stream, e)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if pending and (record is None or record is _FLUSH or len(pending) >= self.chunk_records):
+                try:
+                    self._write_chunk(pending)
+                except Exception as e:
+                    log.error("Recorder %s: failed to write chunk %d: %s", self.stream, self.chunk_index, e)
+                pending = []
+            if not pending:
+                deadline = None
+            if record is None:
+                return
+
+    def _write_chunk(self, records):
+        columns = {}
+        for name, first in records[0].items():
+            values = [record[name] for record in records]
+            if isinstance(first, np.ndarray):
+                lengths = [len(value) for value in values]
+                columns[name] = np.concatenate(values) if values else first[:0]
+                columns[name + OFFSETS_SUFFIX] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            else:
+                columns[name] = np.array(values)
+        path = os.path.join(self.session_dir, f"{self.stream}_{self.chunk_index:06d}.npz")
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(temp_path, path)   # 쓰는 중인 shard는 reader에 보이지 않도록 원자적으로 교체
+        self.chunk_index += 1
+        self.written += len(records)
+
+def load_session(session_dir, stream):
+    """세션의 모든 shard를 열 단위로 이어 붙여 반환 ({name: np.ndarray}, offsets는 전체 기준으로 보정)."""
+    paths = sorted(glob.glob(os.path.join(session_dir, f"{stream}_*.npz")))
+    chunks = []
+    for path in paths:
+        with np.load(path, allow_pickle=False) as data:
+            chunks.append({name: data[name] for name in data.files})
+    if not chunks:
+        return {}
+
+    session = {}
+    for name in chunks[0]:
+        if name.endswith(OFFSETS_SUFFIX):
+            continue
+        offsets_name = name + OFFSETS_SUFFIX
+        session[name] = np.concatenate([chunk[name] for chunk in chunks])
+        if offsets_name in chunks[0]:
+            bases = np.cumsum([0] + [len(chunk[name]) for chunk in chunks[:-1]])
+            session[offsets_name] = np.concatenate(
+                [[0]] + [chunk[offsets_name][1:] + base for chunk, base in zip(chunks, bases)]).astype(np.int64)
+    return session
+
+def split_records(session, name):
+    """배열 열을 레코드별 배열 목록으로 분리 (예: 슬롯별 (num_persons, J, 3))."""
+    return np.split(session[name], session[name + OFFSETS_SUFFIX][1:-1])
+
+def list_streams(session_dir):
+    return sorted({os.path.basename(path).rsplit("_", 1)[0] for path in glob.glob(os.path.join(session_dir, "*_*.npz"))})
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python HkPose3D_Recorder.py <session_dir> [<stream>]")
+        sys.exit(1)
+    session_dir = sys.argv[1]
+    for stream in ([sys.argv[2]] if len(sys.argv) == 3 else list_streams(session_dir)):
+        start = time.perf_counter()
+        session = load_session(session_dir, stream)
+        elapsed = (time.perf_counter() - start) * 1000
+        offsets = [values for name, values in session.items() if name.endswith(OFFSETS_SUFFIX)]
+        num_records = len(offsets[0]) - 1 if offsets else len(next(iter(session.values()), []))
+        print(f"{stream}: {num_records} records loaded in {elapsed:.1f} ms")
+        for name, values in session.items():
+            print(f"  {name}: {values.dtype} {values.shape}")
@@ -1,64 +1,418 @@
+import time
+STARTUP_BEGIN = time.perf_counter()    # 시작 시간 측정 기준 (모듈 import 시작)
 import os
 import socket
 import threading
 import signal
 import sys
+import atexit
+import itertools
 import numpy as np
 import asyncio
 import websockets
 import json
-import time  
+import struct
+import logging
 from datetime import datetime
-from collections import defaultdict
-from sklearn.metrics import mean_squared_error
-from scipy.spatial import distance
-import tkinter as tk
-from tkinter import ttk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from bisect import bisect_left
+from collections import defaultdict, deque, OrderedDict
+from functools import lru_cache
+from HkPose3D_Recorder import SessionRecorder
+from HkPose3D_Broadcast import PoseBroadcaster, build_pos3D_message
+from HkPose3D_Trace import Tracer, SlotTrace, DEVICE_MARKS
+from HkPose3D_Log import setup_logging, dropped_records, LogSummary, RateLimitedLog
+
+log = logging.getLogger("HkPose3D.Server")
+packet_summary = LogSummary(log)    # 카메라별 수신 요약 (LOG_SUMMARY_INTERVAL초마다 한 줄)
+slot_summary = LogSummary(log)      # 슬롯 처리 요약
+limited_log = RateLimitedLog(log)   # 반복되는 경고 (늦은 패킷, 이벤트 등)
 
 ################ Parameter Setting #################
 TIMEOUT_THRESHOLD = 2.0     # 일정 시간이 지나면 값을 0으로 설정하기 위한 상수 (default: 2초)
-SAVE_EST_KEYPOINTS_DATA = False   # 추정한 3D pose 값을 저장할지 여부 (defalut=False)
+SAVE_EST_KEYPOINTS_DATA = False   # 추정한 3D pose 값을 EST_DIR/<세션>/에 백그라운드로 저장할지 여부 (defalut=False)
 CAMERA_P_MATRIX = "UNITY"   # "UNITY" (함수이용 자동추출, default) or "EST" (사진찍어 추정)
 image_width = 1920          # 1920 or 1280
 image_height = 1080         # 1080 or 720
 NUM_JOINTS = 15             # 추정 관절 개수
-CAMERA_NAMES = ["Camera1", "Camera2", "Camera3", "Camera4"]
+MAX_DEVICE_CONNECTIONS = 512      # Device 접속 대기열 크기 (listen backlog)
+WIRE_FORMATS = ["binary", "json"] # Device와 협상 가능한 keypoints 전송 포맷 ("json"만 두면 binary 비활성화)
+REPROJECTION_THRESHOLD = 25.0     # 이 값(pixel)보다 재투영 오차가 큰 시점은 제외하고 다시 삼각측량
+CONFIDENCE_THRESHOLD = 0.1        # YOLO keypoint confidence가 이 값보다 낮은 관절은 검출되지 않은 것으로 처리
+CONFIDENCE_WEIGHTING = True       # 삼각측량(DLT)의 각 시점 행을 keypoint confidence로 가중
+ASSOCIATION_THRESHOLD = 50.0      # 카메라 간 동일 인물로 판단할 최대 epipolar 거리 (pixel)
+TRACK_MAX_DISTANCE = 0.5          # 이전 프레임의 인물과 동일 ID로 판단할 최대 관절 평균 거리 (m)
+TRACK_MAX_MISSED = 30             # 이 슬롯 수 이상 검출되지 않은 인물 ID는 삭제
+SLOT_DEADLINE = 0.2               # 슬롯의 첫 패킷 이후 나머지 카메라를 기다리는 최대 시간 (초)
+SLOT_WINDOW = 8                   # 동시에 조립 중인 슬롯의 최대 개수 (초과 시 가장 오래된 슬롯부터 처리)
+TRIANGULATION_WORKERS = 0         # 연관/삼각측량을 실행할 worker 프로세스 수 (0이면 이벤트 루프에서 처리, --workers N)
+MAX_PERSONS_PER_CAMERA = 32       # worker 공유 메모리 블록에 담을 수 있는 카메라당 최대 검출 인물 수
+POOL_MAX_CAMERAS = 64             # worker 공유 메모리 블록에 담을 수 있는 슬롯당 최대 카메라 수 (실행 중 카메라를 추가해도 되도록 여유, 초과 시 서버 프로세스에서 처리)
+FEEDBACK_CONTROL = True           # 지연 예산을 넘으면 Device에 전송 간격/추론 해상도 제어 메시지 전송 (hello에서 control을 알린 Device만)
+LATENCY_BUDGET_MS = 300.0         # 목표 지연 상한 (p90, ms): 카메라별 캡처 -> 서버 수신, 슬롯별 캡처 -> 삼각측량
+CONTROL_INTERVAL = 1.0            # 제어 판단 주기 (초)
+CONTROL_MAX_LATE = 0.1            # 한 주기 동안 늦게 도착한 패킷 비율이 이 값을 넘는 카메라는 과부하
+CONTROL_RECOVERY_TICKS = 5        # 이 횟수만큼 연속으로 여유가 있으면 (지연 < 예산 * CONTROL_RECOVERY_MARGIN) 한 단계 복구
+CONTROL_RECOVERY_MARGIN = 0.7
+CONTROL_LEVELS = [(1, 640), (1, 480), (2, 480), (2, 320), (3, 320), (4, 320)]  # 단계별 (frame_stride, 추론 입력 크기)
+REDUNDANT_MIN_VIEWS = 3           # 다른 카메라 이 대수 이상이 잘 보는 관절은 중복 관절
+REDUNDANT_CONFIDENCE = 0.5        # 관절을 "잘 본다"고 판단하는 최소 keypoint confidence
+REDUNDANT_RATIO = 0.8             # 보이는 관절의 이 비율 이상이 중복인 카메라는 과부하 시 해상도를 낮추는 대신 프레임을 건너뜀
+REDUNDANT_FRAME_STRIDE = 3        # 중복 카메라의 frame_stride
+TEMPORAL_FILTER = None            # 관절 시간 필터: "kalman" (등속 모델), "one_euro" or None (사용 안 함, default)
+MAX_PREDICT_SLOTS = 3             # 삼각측량되지 않은 관절을 필터 예측값으로 채우는 최대 연속 슬롯 수
+KALMAN_PROCESS_NOISE = 2.0        # Kalman 가속도 노이즈 밀도 (m^2/s^3)
+KALMAN_MEASUREMENT_NOISE = 0.05   # Kalman 측정 노이즈 표준편차 (m)
+ONE_EURO_MIN_CUTOFF = 1.0         # One-Euro 최소 cutoff 주파수 (Hz)
+ONE_EURO_BETA = 0.5               # One-Euro 속도 계수 (클수록 빠른 움직임에 덜 지연)
+HEADLESS = False                  # True (또는 --headless): tkinter/matplotlib 모니터 없이 실행
+METRICS_HOST = '127.0.0.1'        # 지표 HTTP 엔드포인트 주소 (/metrics: Prometheus, /metrics.json: JSON)
+METRICS_PORT = 9100               # 지표 HTTP 엔드포인트 포트 (0이면 비활성화)
+METRICS_LOG_INTERVAL = 10.0       # 지표를 JSON 한 줄로 출력하는 주기 (초, 0이면 비활성화)
+METRICS_WINDOW = 10               # bytes/s, messages/s 등 비율 계산 구간 (초)
+METRICS_RECENT_SAMPLES = 1024     # 백분위수 계산에 사용하는 최근 샘플 수
+CAMERA_NAMES = ["Camera1", "Camera2", "Camera3", "Camera4"]   # 기본 카메라 구성 (CAMERA_CONFIG가 없을 때)
+CAMERA_CONFIG = None              # 카메라 구성 JSON (--cameras <config.json>, 카메라별 P matrix/모델/해상도), None이면 위의 기본값
+CAMERA_RELOAD_INTERVAL = 2.0      # 카메라 구성/P matrix 파일 변경을 확인하는 주기 (초, 0이면 파일 감시 안 함, POST /cameras/reload로도 가능)
 CAM_DIR = os.path.join("..", "HkPose3D_Unity", "Captures")  # 3D pose의 GT값을 가져오거나 EST값을 저장하기 위한 Unity 소스 폴더
 GT_DIR = os.path.join(CAM_DIR, "BodyPos3dGT")       # 저장되있는 3D pose의 GT값을 가져오는 경로
-EST_DIR = os.path.join(CAM_DIR, "BodyPos3dEST")     # 추정한 3D pose 값을 저장하는 경로
-os.makedirs(EST_DIR, exist_ok=True)
-
-if len(sys.argv) == 1:
-    IP = '127.0.0.1'   # 내 IP 주소 ('192.168.1.69' '192.168.1.74') 
-    PORT = 11111
-    IP_WS = '127.0.0.1'
-    PORT_WS = 12222  # WebSocket server port
-elif len(sys.argv) == 5:
-    IP = sys.argv[1]       
-    PORT = int(sys.argv[2])  
-    IP_WS = sys.argv[3] 
-    PORT_WS = int(sys.argv[4])  
-else:
-    print("Usage: python HkPose3D_Server.py <IP> <PORT> <IP_WS> <PORT_WS>")
-    print("- Ex1: python HkPose3D_Server.py 127.0.0.1 11111 127.0.0.1 12222")
-    print("- Ex2: python HkPose3D_Server.py 192.168.1.72 11111 127.0.0.1 12222")
-    sys.exit(1)
-
-
-# Camera data structure to hold bytes received, elapsed time, and last updated time
-camera_data = {
-    "Camera1": {"bytes": 0, "elapsed_time": 0.0, "last_received_time": 0},
-    "Camera2": {"bytes": 0, "elapsed_time": 0.0, "last_received_time": 0},
-    "Camera3": {"bytes": 0, "elapsed_time": 0.0, "last_received_time": 0},
-    "Camera4": {"bytes": 0, "elapsed_time": 0.0, "last_received_time": 0},
-    "Server": {"bytes": 0, "rmse": 0.0, "last_sent_time": 0}  # 서버의 전송 바이트와 RMSE 및 마지막 전송 시간
-}
-
-# Create the Tkinter window and plot
+EVALUATE_GT = True                # GT_DIR의 GT와 비교해 RMSE 계산 (False면 GT 감시 스레드를 만들지 않음)
+GT_CACHE_SIZE = 4096              # 미리 파싱해 메모리에 유지할 GT 슬롯 수 (LRU)
+GT_POLL_INTERVAL = 0.2            # GT_DIR에서 새 GT 파일을 확인하는 주기 (초)
+EST_DIR = os.path.join(CAM_DIR, "BodyPos3dEST")     # 추정한 3D pose 값을 저장하는 경로 (HkPose3D_Recorder.load_session으로 로드)
+ZONE = None                       # zone worker 설정 (--zone <config.json>, HkPose3D_Aggregator와 함께 사용), None이면 단일 서버
+AGGREGATOR_QUEUE_SIZE = 64        # aggregator로 보내지 못한 결과를 쌓아 두는 최대 개수 (초과 시 오래된 결과부터 버림)
+AGGREGATOR_RETRY_INTERVAL = 2.0   # aggregator 연결이 끊겼을 때 재연결 주기 (초)
+LOG_LEVEL = "INFO"                # 로그 레벨 (--log-level, DEBUG: 패킷/슬롯마다 출력, INFO: 초당 요약, WARNING: 운영 환경에서 콘솔 출력 최소화)
+LOG_FILE = None                   # 로그를 함께 기록할 파일 (--log-file)
+TRACE_FILE = None                 # 슬롯별 단계 trace를 저장할 Chrome trace JSON 경로 (--trace <file.json>, 종료 시 저장), None이면 tracing 안 함
+
+# 접속 정보 (기본값, main()에서 명령줄 인자로 변경)
+IP = '127.0.0.1'   # 내 IP 주소 ('192.168.1.69' '192.168.1.74') 
+PORT = 11111
+IP_WS = '127.0.0.1'
+PORT_WS = 12222  # WebSocket server port
+
+def parse_args(argv):
+    """명령줄 인자 처리 (모듈은 인자 없이 import 가능하도록 main()에서 호출)."""
+    global IP, PORT, IP_WS, PORT_WS, HEADLESS, TRIANGULATION_WORKERS, CAMERA_CONFIG, TRACE_FILE, LOG_LEVEL, LOG_FILE
+    for option in ("--log-level", "--log-file"):
+        if option in argv:
+            i = argv.index(option)
+            if i + 1 < len(argv):
+                if option == "--log-level":
+                    LOG_LEVEL = argv[i + 1].upper()
+                else:
+                    LOG_FILE = argv[i + 1]
+                argv = argv[:i] + argv[i + 2:]
+    setup_logging(LOG_LEVEL, LOG_FILE)  # 이후의 설정 로드 메시지도 로그로 출력
+    if "--headless" in argv:
+        HEADLESS = True
+        argv = [arg for arg in argv if arg != "--headless"]
+    if "--workers" in argv:
+        i = argv.index("--workers")
+        if i + 1 < len(argv):
+            TRIANGULATION_WORKERS = int(argv[i + 1])
+            argv = argv[:i] + argv[i + 2:]
+    if "--cameras" in argv:
+        i = argv.index("--cameras")
+        if i + 1 < len(argv):
+            CAMERA_CONFIG = os.path.abspath(argv[i + 1])
+            argv = argv[:i] + argv[i + 2:]
+    if "--trace" in argv:
+        i = argv.index("--trace")
+        if i + 1 < len(argv):
+            TRACE_FILE = argv[i + 1]
+            argv = argv[:i] + argv[i + 2:]
+    if "--zone" in argv:
+        i = argv.index("--zone")
+        if i + 1 < len(argv):
+            load_zone_config(argv[i + 1])   # 명령줄의 접속 정보가 있으면 설정 파일보다 우선
+            argv = argv[:i] + argv[i + 2:]
+    if len(argv) == 5:
+        IP = argv[1]       
+        PORT = int(argv[2])  
+        IP_WS = argv[3] 
+        PORT_WS = int(argv[4])  
+    elif len(argv) != 1:
+        print("Usage: python HkPose3D_Server.py [<IP> <PORT> <IP_WS> <PORT_WS>] [--headless] [--zone <config.json>] [--workers <N>] [--cameras <config.json>] [--trace <file.json>] [--log-level DEBUG|INFO|WARNING] [--log-file <file>]")
+        print("- Ex1: python HkPose3D_Server.py 127.0.0.1 11111 127.0.0.1 12222")
+        print("- Ex2: python HkPose3D_Server.py 192.168.1.72 11111 127.0.0.1 12222")
+        print("- Ex3: python HkPose3D_Server.py 192.168.1.72 11111 0.0.0.0 12222 --headless (GUI 없이 실행, 지표는 http://127.0.0.1:9100/metrics)")
+        print("- Ex4: python HkPose3D_Server.py --zone zones/zone1.json --headless (zone worker, 결과는 HkPose3D_Aggregator로 전송)")
+        print("- Ex5: python HkPose3D_Server.py 0.0.0.0 11111 0.0.0.0 12222 --headless --workers 4 (연관/삼각측량을 4개 프로세스에서 병렬 처리)")
+        print("- Ex6: python HkPose3D_Server.py --headless --cameras cameras.json (카메라별 P matrix/해상도, 파일을 수정하면 재시작 없이 다시 로드)")
+        print("- Ex7: python HkPose3D_Server.py --headless --trace trace.json (Device 수신부터 전송까지 슬롯별 단계 trace, chrome://tracing 또는 ui.perfetto.dev로 열기)")
+        print("- Ex8: python HkPose3D_Server.py 0.0.0.0 11111 0.0.0.0 12222 --headless --log-level WARNING --log-file server.log (콘솔 출력 최소화)")
+        sys.exit(1)
+
+
+######################## Metrics ########################
+class RollingCounter:
+    """누적 합계와 최근 window초의 초당 비율 (1초 단위 버킷 링). 서버 이벤트 루프에서만 갱신하므로 lock 불필요."""
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.buckets = [0.0] * window
+        self.seconds = [-1] * window     # 버킷이 담고 있는 초 (int(time.time()))
+        self.total = 0.0
+
+    def add(self, value, now):
+        second = int(now)
+        i = second % self.window
+        if self.seconds[i] != second:
+            self.seconds[i] = second
+            self.buckets[i] = 0.0
+        self.buckets[i] += value
+        self.total += value
+
+    def rate(self, now):
+        second = int(now)
+        return sum(value for value, s in zip(self.buckets, self.seconds) if 0 <= second - s < self.window) / self.window
+
+class Histogram:
+    """고정 버킷 누적 히스토그램 (Prometheus용)과 최근 샘플 기반 백분위수."""
+    def __init__(self, bounds, recent=METRICS_RECENT_SAMPLES):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # 마지막 버킷은 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=recent)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentiles(self, qs=(50, 90, 99)):
+        samples = list(self.recent)
+        if not samples:
+            return {f"p{q}": None for q in qs}
+        return {f"p{q}": round(float(value), 3) for q, value in zip(qs, np.percentile(samples, qs))}
+
+    def prometheus(self, name, labels=""):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + [float('inf')], self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float('inf') else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+LATENCY_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+RMSE_BOUNDS_M = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+class CameraMetrics:
+    def __init__(self):
+        self.bytes = RollingCounter()
+        self.messages = RollingCounter()
+        self.ingest_latency = Histogram(LATENCY_BOUNDS_MS)   # Device 캡처 시각 -> 서버 수신 (ms)
+
+class ServerMetrics:
+    """
+    Rolling per-camera and pipeline metrics for the GUI, the HTTP endpoint and the JSON log line.
+
+    Every record_* call happens on the server event loop, so updates need no locks;
+    readers on other threads (the Tk GUI) only take snapshots.
+    """
+    def __init__(self):
+        self.cameras = {}                   # camera -> CameraMetrics
+        self.slots = RollingCounter()       # 처리한 슬롯
+        self.triangulated = RollingCounter()    # 1명 이상 삼각측량한 슬롯
+        self.cameras_per_slot = Histogram(list(range(1, len(CAMERA_NAMES) + 1)))
+        self.rmse = Histogram(RMSE_BOUNDS_M)
+        self.last_rmse = None
+        self.sent_bytes = RollingCounter()
+        self.packet_stats = {}              # camera -> {"late", "dropped"} (KeypointsData.packet_stats)
+        self.controls = {}                  # camera -> {"frame_stride", "input_size"} (FeedbackController.controls)
+        self.broadcaster = None             # PoseBroadcaster (WebSocket 클라이언트 수, 버린 프레임 수)
+        self.tracer = None                  # Tracer (--trace일 때 단계별 처리 시간)
+        self.startup = {}                   # 시작 단계 -> STARTUP_BEGIN 이후 경과 시간 (초)
+
+    def record_startup(self, phase):
+        self.startup[phase] = time.perf_counter() - STARTUP_BEGIN
+        log.info("Startup: %s after %.1f ms", phase, self.startup[phase] * 1000)
+
+    def camera(self, camera_name):
+        if camera_name not in self.cameras:
+            self.cameras[camera_name] = CameraMetrics()
+        return self.cameras[camera_name]
+
+    def record_packet(self, camera_name, num_bytes, latency_ms):
+        now = time.time()
+        camera = self.camera(camera_name)
+        camera.bytes.add(num_bytes, now)
+        camera.messages.add(1, now)
+        camera.ingest_latency.observe(latency_ms)
+
+    def record_slot(self, num_cameras):
+        self.slots.add(1, time.time())
+        self.cameras_per_slot.observe(num_cameras)
+
+    def record_triangulated(self):
+        self.triangulated.add(1, time.time())
+
+    def record_rmse(self, rmse):
+        self.rmse.observe(rmse)
+        self.last_rmse = rmse
+
+    def record_sent(self, num_bytes):
+        self.sent_bytes.add(num_bytes, time.time())
+
+    def snapshot(self):
+        """JSON 직렬화 가능한 현재 지표 (GUI, JSON 로그, /metrics.json)."""
+        now = time.time()
+        cameras = {}
+        for camera_name, camera in list(self.cameras.items()):
+            stats = self.packet_stats.get(camera_name, {})
+            cameras[camera_name] = {
+                "bytes_per_s": camera.bytes.rate(now),
+                "messages_per_s": camera.messages.rate(now),
+                "ingest_latency_ms": camera.ingest_latency.percentiles(),
+                "late": stats.get("late", 0),
+                "dropped": stats.get("dropped", 0),
+                **self.controls.get(camera_name, {}),
+            }
+        return {
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "cameras": cameras,
+            "slots_per_s": self.slots.rate(now),
+            "slots_total": int(self.slots.total),
+            "slots_triangulated_total": int(self.triangulated.total),
+            "cameras_per_slot": self.cameras_per_slot.percentiles((50,)).get("p50"),
+            "rmse": self.last_rmse,
+            "rmse_percentiles": self.rmse.percentiles(),
+            "sent_bytes_per_s": self.sent_bytes.rate(now),
+            "websocket_clients": len(self.broadcaster.clients) if self.broadcaster else 0,
+            "websocket_dropped": self.broadcaster.dropped if self.broadcaster else 0,
+            "log_dropped": dropped_records(),
+            "startup_s": dict(self.startup),
+            **({"stage_ms": self.tracer.summary()} if self.tracer else {}),
+        }
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        now = time.time()
+        lines = [
+            "# TYPE hkpose3d_camera_received_bytes_total counter",
+            "# TYPE hkpose3d_camera_messages_total counter",
+            "# TYPE hkpose3d_camera_bytes_per_second gauge",
+            "# TYPE hkpose3d_camera_messages_per_second gauge",
+            "# TYPE hkpose3d_camera_late_packets_total counter",
+            "# TYPE hkpose3d_camera_dropped_packets_total counter",
+            "# TYPE hkpose3d_camera_frame_stride gauge",
+            "# TYPE hkpose3d_camera_input_size gauge",
+        ]
+        for camera_name, camera in list(self.cameras.items()):
+            label = f'camera="{camera_name}"'
+            stats = self.packet_stats.get(camera_name, {})
+            lines += [
+                f"hkpose3d_camera_received_bytes_total{{{label}}} {camera.bytes.total:.0f}",
+                f"hkpose3d_camera_messages_total{{{label}}} {camera.messages.total:.0f}",
+                f"hkpose3d_camera_bytes_per_second{{{label}}} {camera.bytes.rate(now):.3f}",
+                f"hkpose3d_camera_messages_per_second{{{label}}} {camera.messages.rate(now):.3f}",
+                f"hkpose3d_camera_late_packets_total{{{label}}} {stats.get('late', 0)}",
+                f"hkpose3d_camera_dropped_packets_total{{{label}}} {stats.get('dropped', 0)}",
+            ]
+            control = self.controls.get(camera_name)
+            if control:
+                lines += [
+                    f"hkpose3d_camera_frame_stride{{{label}}} {control['frame_stride']}",
+                    f"hkpose3d_camera_input_size{{{label}}} {control['input_size']}",
+                ]
+        lines.append("# TYPE hkpose3d_camera_ingest_latency_ms histogram")
+        for camera_name, camera in list(self.cameras.items()):
+            lines += camera.ingest_latency.prometheus("hkpose3d_camera_ingest_latency_ms", f'camera="{camera_name}"')
+        lines += [
+            "# TYPE hkpose3d_slots_total counter",
+            f"hkpose3d_slots_total {self.slots.total:.0f}",
+            "# TYPE hkpose3d_slots_triangulated_total counter",
+            f"hkpose3d_slots_triangulated_total {self.triangulated.total:.0f}",
+            "# TYPE hkpose3d_slots_per_second gauge",
+            f"hkpose3d_slots_per_second {self.slots.rate(now):.3f}",
+            "# TYPE hkpose3d_cameras_per_slot histogram",
+            *self.cameras_per_slot.prometheus("hkpose3d_cameras_per_slot"),
+            "# TYPE hkpose3d_rmse_meters histogram",
+            *self.rmse.prometheus("hkpose3d_rmse_meters"),
+            "# TYPE hkpose3d_sent_bytes_total counter",
+            f"hkpose3d_sent_bytes_total {self.sent_bytes.total:.0f}",
+            "# TYPE hkpose3d_sent_bytes_per_second gauge",
+            f"hkpose3d_sent_bytes_per_second {self.sent_bytes.rate(now):.3f}",
+            "# TYPE hkpose3d_websocket_clients gauge",
+            f"hkpose3d_websocket_clients {len(self.broadcaster.clients) if self.broadcaster else 0}",
+            "# TYPE hkpose3d_websocket_dropped_frames_total counter",
+            f"hkpose3d_websocket_dropped_frames_total {self.broadcaster.dropped if self.broadcaster else 0}",
+            "# TYPE hkpose3d_startup_seconds gauge",
+            *(f'hkpose3d_startup_seconds{{phase="{phase}"}} {seconds:.6f}' for phase, seconds in self.startup.items()),
+        ]
+        return "\n".join(lines) + "\n"
+
+metrics = ServerMetrics()
+
+async def handle_metrics_request(reader, writer):
+    """
+    GET /metrics (Prometheus text), GET /metrics.json (JSON snapshot),
+    GET /cameras (현재 카메라 구성), POST /cameras/reload (카메라 구성 다시 로드),
+    GET /trace (--trace일 때 최근 슬롯의 Chrome trace JSON).
+    """
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass    # 나머지 요청 헤더는 무시
+        parts = request_line.decode('latin-1').split()
+        method = parts[0] if parts else "GET"
+        path = parts[1] if len(parts) > 1 else "/"
+        if path == "/cameras/reload":
+            if method != "POST":
+                status, content_type, body = "405 Method Not Allowed", "text/plain", "use POST\n"
+            elif reload_camera_registry("POST /cameras/reload") is None:
+                status, content_type, body = "500 Internal Server Error", "text/plain", "reload failed, previous cameras kept\n"
+            else:
+                status, content_type, body = "200 OK", "application/json", json.dumps(get_camera_registry().describe())
+        elif path == "/trace" and metrics.tracer is not None:
+            status, content_type, body = "200 OK", "application/json", json.dumps(metrics.tracer.chrome_trace())
+        elif path == "/cameras":
+            status, content_type, body = "200 OK", "application/json", json.dumps(get_camera_registry().describe())
+        elif path == "/metrics":
+            status, content_type, body = "200 OK", "text/plain; version=0.0.4", metrics.prometheus()
+        elif path in ("/", "/metrics.json"):
+            status, content_type, body = "200 OK", "application/json", json.dumps(metrics.snapshot())
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+        body = body.encode('utf-8')
+        writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server():
+    """지표 HTTP 엔드포인트 (METRICS_PORT가 0이면 비활성화)."""
+    if not METRICS_PORT:
+        return
+    metrics_server = await asyncio.start_server(handle_metrics_request, METRICS_HOST, METRICS_PORT)
+    log.info("Metrics endpoint: http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+    async with metrics_server:
+        await metrics_server.serve_forever()
+
+async def log_metrics():
+    """METRICS_LOG_INTERVAL초마다 지표를 JSON 한 줄로 출력 (0이면 비활성화)."""
+    if not METRICS_LOG_INTERVAL:
+        return
+    while True:
+        await asyncio.sleep(METRICS_LOG_INTERVAL)
+        log.info("%s", json.dumps({"metrics": metrics.snapshot()}))
+
+
+# Tkinter window and plot (GUI 모드에서만 tkinter/matplotlib을 import)
 class CameraDataDisplay:
     def __init__(self, root):
+        from tkinter import ttk
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         self.root = root
         self.root.title("Server Traffic Monitoring")
         
@@ -75,30 +429,17 @@ class CameraDataDisplay:
         self.update_plot()
 
     def update_plot(self):
-        current_time = time.time()  # 현재 시간 (초 단위)
-
-        # 수신 데이터가 일정 시간 동안 없으면 0으로 리셋
-        for camera in camera_data.keys():
-            if camera != "Server":
-                # 마지막 수신 후 경과한 시간 계산
-                elapsed_since_last_received = current_time - camera_data[camera]["last_received_time"]
-                if elapsed_since_last_received > TIMEOUT_THRESHOLD:
-                    camera_data[camera]["bytes"] = 0  # 일정 시간 경과 시 수신 데이터 크기를 0으로
-
-        # 서버에서 일정 시간 동안 전송되지 않으면 0으로 리셋
-        elapsed_since_last_sent = current_time - camera_data["Server"]["last_sent_time"]
-        if elapsed_since_last_sent > TIMEOUT_THRESHOLD:
-            camera_data["Server"]["bytes"] = 0  # 일정 시간 경과 시 전송 데이터 크기를 0으로
-            camera_data["Server"]["rmse"] = 0  # RMSE도 0으로 리셋
-
-        # Update the bar chart with current camera data
-        camera_names = list(camera_data.keys())[:-1]  # Exclude Server from the camera names
-        rx_bytes_received = [camera_data[camera]["bytes"] for camera in camera_names]
-        elapsed_times = [camera_data[camera]["elapsed_time"] for camera in camera_names]
-
-        # Access the server bytes and rmse from the camera_data dictionary
-        server_bytes = camera_data["Server"]["bytes"]
-        server_rmse = camera_data["Server"]["rmse"]
+        snapshot = metrics.snapshot()
+
+        # 카메라별 최근 수신량 (bytes/s)과 수신 지연 중앙값
+        camera_names = list(get_camera_registry().names)
+        cameras = snapshot["cameras"]
+        rx_bytes_received = [cameras[camera]["bytes_per_s"] if camera in cameras else 0 for camera in camera_names]
+        elapsed_times = [(cameras[camera]["ingest_latency_ms"]["p50"] or 0) if camera in cameras else 0 for camera in camera_names]
+
+        # 서버 전송량 (bytes/s)과 마지막 RMSE (전송이 없으면 0)
+        server_bytes = snapshot["sent_bytes_per_s"]
+        server_rmse = (snapshot["rmse"] or 0) if server_bytes > 0 else 0
 
         # Clear the plot and draw new bar chart for both Rx and Server data
         self.ax.clear()
@@ -106,23 +447,22 @@ class CameraDataDisplay:
         # Plot Rx data (received data) in blue
         bar_width = 0.35
         rx_positions = np.arange(len(camera_names))
-        self.ax.bar(rx_positions, rx_bytes_received, width=bar_width, label='Rx Data (bytes)', color='blue')
+        self.ax.bar(rx_positions, rx_bytes_received, width=bar_width, label='Rx Data (bytes/s)', color='blue')
 
         # Plot Server data (bytes) in red, as a single bar on the right of the Rx bars
         server_position = [len(camera_names)]  # Place Server bar to the right of all Rx bars
-        self.ax.bar(server_position, [server_bytes], width=bar_width, label='Server Data (bytes)', color='red')
+        self.ax.bar(server_position, [server_bytes], width=bar_width, label='Server Data (bytes/s)', color='red')
 
-        self.ax.set_ylabel("Traffic (bytes)")
+        self.ax.set_ylabel("Traffic (bytes/s)")
         self.ax.set_title("Edge Server Data Monitor (Rx and Tx)")
         self.ax.set_xticks(list(rx_positions) + server_position)  # Include Server bar in x-axis ticks
         self.ax.set_xticklabels(camera_names + ['Server'])  # Label Server bar as "Server"
         self.ax.legend()
 
         # Display the current time
-        display_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.time_label.config(text=f"Current Time: {display_time}")
+        self.time_label.config(text=f"Current Time: {snapshot['time']}")
 
-        # Add elapsed times as text on the bars (for Rx data)
+        # Add median ingest latency as text on the bars (for Rx data)
         for i, elapsed_time in enumerate(elapsed_times):
             self.ax.text(rx_positions[i], rx_bytes_received[i] + 10, f"{elapsed_time:.2f} ms", ha='center')
 
@@ -135,34 +475,197 @@ class CameraDataDisplay:
         # Schedule the next update after 1000ms (1 second)
         self.root.after(1000, self.update_plot)
 
-# 수신 시 마지막 시간을 기록하는 함수
-def update_camera_data(camera_name, bytes_received, elapsed_time):
-    camera_data[camera_name]["bytes"] = bytes_received
-    camera_data[camera_name]["elapsed_time"] = elapsed_time
-    camera_data[camera_name]["last_received_time"] = time.time()  # 마지막 수신 시간 기록
-
-# 전송 시 마지막 시간을 기록하는 함수
-def update_server_data(bytes_sent, rmse):
-    camera_data["Server"]["bytes"] = bytes_sent
-    camera_data["Server"]["rmse"] = rmse
-    camera_data["Server"]["last_sent_time"] = time.time()  # 마지막 전송 시간 기록
-
 
 ########################### 카메라 P matrix 추출 ##############################
-def load_camera_matrix(camera_name):
+def camera_matrix_path(camera_name, camera_p_matrix=None):
+    """CAM_DIR에 있는 카메라의 P matrix 파일 경로 ("EST": _Pmatrix_Est.txt, "UNITY": _Pmatrix_Unity.txt)."""
+    suffix = "Est" if (camera_p_matrix or CAMERA_P_MATRIX) == "EST" else "Unity"
+    return os.path.join(CAM_DIR, camera_name, "calibration", f"{camera_name}_Pmatrix_{suffix}.txt")
+
+def load_camera_matrix(camera_name, camera_p_matrix=None):
     """Load the camera projection matrix for the given camera."""
-    if CAMERA_P_MATRIX == "EST":
-        file_path = os.path.join(CAM_DIR, camera_name, "calibration", f"{camera_name}_Pmatrix_Est.txt")
-    elif CAMERA_P_MATRIX == "UNITY":
-        file_path = os.path.join(CAM_DIR, camera_name, "calibration", f"{camera_name}_Pmatrix_Unity.txt")
-    
+    file_path = camera_matrix_path(camera_name, camera_p_matrix)
     if os.path.exists(file_path):
         return np.loadtxt(file_path, delimiter=',')
-    print(f"File not found: {file_path}")
+    log.warning("File not found: %s", file_path)
     return None
 
-# Load and store the camera matrices
-P_list = [load_camera_matrix(camera) for camera in CAMERA_NAMES]
+def ndc_to_pixel_matrix(width, height):
+    """NDC (x, y) -> pixel (u, v): u = (x + 1) * W / 2, v = (1 - y) * H / 2."""
+    return np.array([
+        [width / 2, 0, width / 2],
+        [0, -height / 2, height / 2],
+        [0, 0, 1]
+    ])
+
+def camera_spec(name, camera_p_matrix=None, matrix_file=None, width=None, height=None):
+    return {"name": name, "camera_p_matrix": camera_p_matrix or CAMERA_P_MATRIX,
+            "matrix_file": matrix_file or camera_matrix_path(name, camera_p_matrix),
+            "image_width": width or image_width, "image_height": height or image_height}
+
+def camera_specs(config=None, base_dir="."):
+    """
+    Camera set from a config dict (CAMERA_CONFIG or a zone config), module defaults otherwise.
+
+    {
+        "camera_p_matrix": "UNITY", "image_width": 1920, "image_height": 1080,   (선택, 모든 카메라의 기본값)
+        "matrices": {"Camera1": "Camera1_Pmatrix_Unity.txt"},                     (선택, 없는 카메라는 CAM_DIR에서 로드)
+        "cameras": ["Camera1", {"name": "Camera5", "camera_p_matrix": "EST", "matrix": "cam5.txt",
+                                "image_width": 1280, "image_height": 720}]
+    }
+    """
+    config = config or {}
+    matrices = config.get("matrices", {})
+    specs = []
+    for entry in config.get("cameras", CAMERA_NAMES):
+        entry = {"name": entry} if isinstance(entry, str) else entry
+        name = entry["name"]
+        matrix = entry.get("matrix", matrices.get(name))
+        specs.append(camera_spec(name, entry.get("camera_p_matrix", config.get("camera_p_matrix")),
+                                 os.path.join(base_dir, matrix) if matrix else None,
+                                 entry.get("image_width", config.get("image_width")),
+                                 entry.get("image_height", config.get("image_height"))))
+    return specs
+
+class CameraRegistry:
+    """
+    Immutable snapshot of the camera set with precomputed per-camera data.
+
+    Every matrix is kept as a 3x4 NDC matrix ("UNITY" as it is, "EST" pixel matrices
+    converted with the camera's own resolution) next to its pixel matrix and image
+    size, so cameras with different models and resolutions are triangulated in one
+    batch. "EST" cameras are flagged in pixel_dlt so their DLT rows stay in pixel
+    space, as in triangulate_single_point. A reload builds a new registry and swaps it in with one assignment
+    (set_camera_registry); a slot keeps the registry it started with.
+    """
+    _versions = itertools.count(1)
+
+    def __init__(self, specs, matrices):
+        self.version = next(CameraRegistry._versions)
+        self.specs = list(specs)
+        self.names = [spec["name"] for spec in self.specs]
+        self.index = {name: i for i, name in enumerate(self.names)}     # 카메라 이름 -> 인덱스
+        self.width = np.array([spec["image_width"] for spec in self.specs], dtype=np.float64)
+        self.height = np.array([spec["image_height"] for spec in self.specs], dtype=np.float64)
+        P_ndc, P_pixel = [], []
+        for spec, P, width, height in zip(self.specs, matrices, self.width, self.height):
+            ndc_to_pixel = ndc_to_pixel_matrix(width, height)
+            if spec["camera_p_matrix"] == "EST":
+                P_pixel.append(P[:3])
+                P_ndc.append(np.linalg.solve(ndc_to_pixel, P[:3]))
+            else:
+                P_ndc.append(P[:3])
+                P_pixel.append(ndc_to_pixel @ P[:3])
+        self.P_ndc = np.array(P_ndc, dtype=np.float64).reshape(-1, 3, 4)
+        self.P_pixel = np.array(P_pixel, dtype=np.float64).reshape(-1, 3, 4)
+        self.pixel_dlt = np.array([spec["camera_p_matrix"] == "EST" for spec in self.specs], dtype=bool)  # pixel 공간 DLT 카메라
+        self.files = {}         # 감시할 파일 -> 읽었을 때의 수정 시각 (없으면 None)
+        self.F_cache = {}       # (camera_a, camera_b) -> fundamental matrix
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, camera):
+        return camera in self.index
+
+    def stack(self, cameras):
+        """cameras 순서의 (P_stack (C, 3, 4), 너비 (C, 1), 높이 (C, 1), pixel_dlt (C,)): robust_triangulate 인자."""
+        indices = [self.index[camera] for camera in cameras]
+        return self.P_ndc[indices], self.width[indices, None], self.height[indices, None], self.pixel_dlt[indices]
+
+    def fundamental_matrix(self, camera_a, camera_b):
+        """Cached fundamental matrix from camera_a to camera_b."""
+        key = (camera_a, camera_b)
+        if key not in self.F_cache:
+            self.F_cache[key] = fundamental_matrix(self.P_pixel[self.index[camera_a]], self.P_pixel[self.index[camera_b]])
+        return self.F_cache[key]
+
+    def watch(self, paths):
+        self.files = {path: file_mtime(path) for path in paths}
+
+    def file_state(self):
+        """감시 중인 파일들의 현재 수정 시각."""
+        return {path: file_mtime(path) for path in self.files}
+
+    def describe(self):
+        """GET /cameras 응답."""
+        return {"version": self.version,
+                "cameras": [{key: spec[key] for key in ("name", "camera_p_matrix", "image_width", "image_height", "matrix_file")}
+                            for spec in self.specs]}
+
+def file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def build_camera_registry(config_path=None):
+    """카메라 구성 파일 (None이면 모듈 기본값)과 P matrix 파일로 CameraRegistry 생성 (P matrix가 없는 카메라는 제외)."""
+    config, base_dir = {}, "."
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(config_path))
+    specs, matrices = [], []
+    all_specs = camera_specs(config, base_dir)
+    for spec in all_specs:
+        if not os.path.exists(spec["matrix_file"]):
+            log.warning("File not found: %s (%s is not used)", spec['matrix_file'], spec['name'])
+            continue
+        matrices.append(np.loadtxt(spec["matrix_file"], delimiter=','))
+        specs.append(spec)
+    registry = CameraRegistry(specs, matrices)
+    registry.watch(([config_path] if config_path else []) + [spec["matrix_file"] for spec in all_specs])
+    return registry
+
+# 카메라 구성 (import 시가 아니라 처음 사용할 때 로드, 실행 중 교체 가능)
+camera_registry = None
+
+def get_camera_registry():
+    if camera_registry is None:
+        set_camera_registry(build_camera_registry(CAMERA_CONFIG))
+    return camera_registry
+
+def set_camera_registry(registry):
+    """카메라 구성 교체 (한 번의 대입, 처리 중인 슬롯은 이전 구성으로 마무리)."""
+    global camera_registry
+    previous = camera_registry
+    camera_registry = registry
+    if previous is not None:
+        added = [name for name in registry.names if name not in previous]
+        removed = [name for name in previous.names if name not in registry]
+        changed = [name for name in registry.names if name in previous and not (
+            np.allclose(registry.P_ndc[registry.index[name]], previous.P_ndc[previous.index[name]])
+            and registry.width[registry.index[name]] == previous.width[previous.index[name]]
+            and registry.height[registry.index[name]] == previous.height[previous.index[name]])]
+        log.info("Cameras reloaded (v%d): %d cameras, added %s, removed %s, changed %s", registry.version, len(registry), added, removed, changed)
+    if len(metrics.cameras_per_slot.bounds) != len(registry):
+        metrics.cameras_per_slot = Histogram(list(range(1, len(registry) + 1)))
+    if aggregator_uplink is not None:
+        aggregator_uplink.send(aggregator_uplink.hello())  # aggregator의 zone 카메라 목록 갱신
+
+def reload_camera_registry(reason):
+    """디스크에서 카메라 구성을 다시 읽어 교체 (실패하면 기존 구성 유지). 반환: 새 registry 또는 None."""
+    try:
+        registry = build_camera_registry(CAMERA_CONFIG)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log.error("Camera reload (%s) failed: %s. Keeping %d cameras.", reason, e, len(get_camera_registry()))
+        return None
+    log.info("Reloading cameras (%s)", reason)
+    set_camera_registry(registry)
+    return registry
+
+async def watch_camera_files():
+    """CAMERA_RELOAD_INTERVAL초마다 카메라 구성 파일과 P matrix 파일의 수정 시각을 확인해 바뀌면 다시 로드 (0이면 비활성화)."""
+    if not CAMERA_RELOAD_INTERVAL:
+        return
+    failed = None   # 다시 로드에 실패한 파일 상태 (파일이 다시 바뀔 때까지 재시도하지 않음)
+    while True:
+        await asyncio.sleep(CAMERA_RELOAD_INTERVAL)
+        registry = get_camera_registry()
+        state = registry.file_state()
+        if state != registry.files and state != failed:
+            failed = None if reload_camera_registry("file changed") else state
 
 
 ########################### 알고리즘 ##############################
@@ -228,6 +731,68 @@ def triangulate_single_point_pixel2NDC_fast(points_list, P_list, image_width, im
 
     return world_point
 
+# 모든 관절을 한 번에 삼각측량 (관절별 SVD 루프를 배치 SVD 한 번으로 대체)
+def triangulate_joints_batch(pos2D, visible, P_stack, image_width=None, image_height=None, weights=None, pixel_dlt=None):
+    """
+    Triangulate every joint at once from multiple cameras with a single batched SVD.
+
+    Numerically equivalent to calling triangulate_single_point (pixel, "EST") or
+    triangulate_single_point_pixel2NDC_fast (NDC, "UNITY") for each joint with the
+    cameras that see it. With NDC matrices ("EST" converted by CameraRegistry) the
+    "EST" cameras must be flagged in pixel_dlt to keep the pixel-space solution.
+
+    Parameters:
+    pos2D (np.array): 2D image points of shape (num_cameras, num_joints, 2).
+    visible (np.array): Boolean mask of shape (num_cameras, num_joints).
+    P_stack (np.array): Camera projection matrices of shape (num_cameras, 3 or 4, 4).
+    image_width (int or np.array): Width of the image in pixels, or per camera of
+                       shape (num_cameras, 1). If given with image_height, the
+                       points are converted to NDC first ("UNITY" matrices).
+    image_height (int or np.array): Height of the image in pixels.
+    weights (np.array): Optional row weights of shape (num_cameras, num_joints), e.g.
+                        keypoint confidence. Views with a higher weight pull the
+                        solution closer to their ray.
+    pixel_dlt (np.array): Optional boolean mask of shape (num_cameras,). With
+                        image_width/image_height, the rows of these cameras are
+                        scaled back to pixel units (the NDC rows are the pixel rows
+                        times (2 / W, -2 / H)), so they are solved as in pixel space.
+
+    Returns:
+    np.array: Estimated 3D world positions (num_joints x 3). Joints seen by fewer
+              than 2 cameras are set to [0, 0, 0].
+    """
+    pos2D = np.asarray(pos2D, dtype=np.float64)
+    visible = np.asarray(visible, dtype=bool)
+    P_stack = np.asarray(P_stack, dtype=np.float64)
+    num_joints = pos2D.shape[1]
+
+    u = pos2D[..., 0]
+    v = pos2D[..., 1]
+    if image_width is not None and image_height is not None:
+        u = u * (2 / image_width) - 1
+        v = 1 - v * (2 / image_height)
+
+    # A[j] = [u * P[2] - P[0]; v * P[2] - P[1]] for every camera -> (num_joints, 2 * num_cameras, 4)
+    rows_x = u[..., None] * P_stack[:, None, 2, :] - P_stack[:, None, 0, :]
+    rows_y = v[..., None] * P_stack[:, None, 2, :] - P_stack[:, None, 1, :]
+    if pixel_dlt is not None and image_width is not None and image_height is not None:
+        # NDC 행을 pixel 행 크기로 되돌림 (부호는 해에 영향 없음)
+        pixel_dlt = np.asarray(pixel_dlt, dtype=bool)[:, None, None]
+        rows_x = rows_x * np.where(pixel_dlt, np.broadcast_to(image_width, (len(P_stack), 1))[..., None] / 2, 1)
+        rows_y = rows_y * np.where(pixel_dlt, np.broadcast_to(image_height, (len(P_stack), 1))[..., None] / 2, 1)
+    row_weights = visible if weights is None else np.where(visible, weights, 0)
+    A = np.concatenate([rows_x, rows_y], axis=0) * np.concatenate([row_weights, row_weights], axis=0)[..., None]
+    A = A.transpose(1, 0, 2)
+
+    # 보이지 않는 카메라의 행은 0이므로 해(최소 특이벡터)에 영향을 주지 않음
+    solvable = visible.sum(axis=0) > 1
+    pos3D = np.zeros((num_joints, 3))
+    if np.any(solvable):
+        _, _, Vt = np.linalg.svd(A[solvable], full_matrices=False)
+        X = Vt[:, -1, :]
+        pos3D[solvable] = X[:, :3] / X[:, 3:4]
+    return pos3D
+
 
 # 관절 쌍 연결 정보 (추가적인 보정을 위한 인접 관절 정의)
 PAIRS = [
@@ -242,26 +807,145 @@ PAIRS = [
     (11, 13), (12, 14)  # 무릎 - 발목
 ]
 
-# 추정한 관절 값들의 이상치 탐지 및 보정을 위한 mahalanobis 알고리즘
-def mahalanobis_outlier_detection(keypoints_3D, threshold=3.0):
-    # 각 관절의 3D 좌표에 대한 평균과 공분산 계산
-    mean = np.mean(keypoints_3D, axis=0)
-    cov = np.cov(keypoints_3D, rowvar=False)
-    inv_covmat = np.linalg.inv(cov)
-    
-    # Mahalanobis Distance 계산
-    distances = [distance.mahalanobis(point, mean, inv_covmat) for point in keypoints_3D]
-    
-    # 이상치 탐지 및 보정
-    corrected_keypoints_3D = keypoints_3D.copy()
-    for i, dist in enumerate(distances):
-        if dist > threshold:  # threshold가 작을 수록 이상치로 감지되는 관절 수 증가
-            print(f"Outlier detected at joint {i} with Mahalanobis distance {dist:.2f}")
-            # 보정 방법: 인접 관절의 평균 위치로 대체
-            neighbors = [pair[1] if pair[0] == i else pair[0] for pair in PAIRS if i in pair]
-            corrected_keypoints_3D[i] = np.mean(keypoints_3D[neighbors], axis=0)
-    
-    return corrected_keypoints_3D
+# PAIRS 순서대로 허용하는 뼈 길이 (min, max) (m)
+BONE_LENGTH_LIMITS = [
+    (0.02, 0.25), (0.02, 0.25),     # 코 - 눈
+    (0.10, 0.45), (0.10, 0.45),     # 눈 - 어깨
+    (0.15, 0.55),                   # 어깨 - 어깨
+    (0.12, 0.45), (0.12, 0.45),     # 어깨 - 팔꿈치
+    (0.10, 0.40), (0.10, 0.40),     # 팔꿈치 - 손목
+    (0.08, 0.40),                   # 엉덩이 - 엉덩이
+    (0.25, 0.75), (0.25, 0.75),     # 어깨 - 엉덩이
+    (0.20, 0.65), (0.20, 0.65),     # 엉덩이 - 무릎
+    (0.20, 0.60), (0.20, 0.60)      # 무릎 - 발목
+]
+
+def reprojection_residuals(pos3D, pos2D, P_stack, image_width=None, image_height=None):
+    """
+    Pixel distance between every observed 2D point and the reprojection of its 3D joint.
+
+    Uses the same camera model as triangulate_joints_batch (row 2 as w, NDC when
+    image_width/image_height are given). Returns (num_cameras, num_joints).
+    """
+    homogeneous = np.concatenate([pos3D, np.ones((len(pos3D), 1))], axis=1)
+    projected = homogeneous @ P_stack[:, :3].transpose(0, 2, 1)     # (num_cameras, num_joints, 3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = projected[..., 0] / projected[..., 2]
+        v = projected[..., 1] / projected[..., 2]
+    if image_width is not None and image_height is not None:
+        u = (u + 1) * (image_width / 2)
+        v = (1 - v) * (image_height / 2)
+    return np.hypot(u - pos2D[..., 0], v - pos2D[..., 1])
+
+def camera_rays(pos2D, P_stack, image_width=None, image_height=None):
+    """
+    Back-project 2D points to rays with the camera model of triangulate_joints_batch.
+
+    Returns:
+    tuple: centers (num_cameras, 3) camera centers,
+           directions (num_cameras, num_joints, 3) ray directions through each 2D point.
+    """
+    u = pos2D[..., 0]
+    v = pos2D[..., 1]
+    if image_width is not None and image_height is not None:
+        u = u * (2 / image_width) - 1
+        v = 1 - v * (2 / image_height)
+    M_inv = np.linalg.inv(P_stack[:, :3, :3])
+    centers = -np.einsum('cij,cj->ci', M_inv, P_stack[:, :3, 3])
+    directions = np.einsum('cij,cnj->cni', M_inv, np.stack([u, v, np.ones_like(u)], axis=-1))
+    return centers, directions
+
+def robust_triangulate(pos2D, visible, P_stack, image_width=None, image_height=None, threshold=REPROJECTION_THRESHOLD, weights=None,
+                       pixel_dlt=None):
+    """
+    Triangulate every joint and reject inconsistent views by their reprojection error.
+
+    Joints seen by 3 or more cameras whose worst residual exceeds threshold (pixels)
+    are re-estimated RANSAC-style: every camera pair gives a hypothesis (midpoint of
+    the two rays, computed for all pairs and joints at once), the hypothesis with the
+    most inlier views wins and the joint is re-triangulated from those inliers.
+    Joints that end up with fewer than 2 consistent views are rejected.
+
+    weights (num_cameras, num_joints), e.g. keypoint confidence, are passed to
+    triangulate_joints_batch and scale the residuals before they are compared with
+    threshold, so a low-confidence view is allowed a proportionally larger error.
+    pixel_dlt is passed to triangulate_joints_batch (CameraRegistry.stack).
+
+    Returns:
+    tuple: pos3D (num_joints, 3) with rejected / unseen joints set to [0, 0, 0],
+           residual (num_joints,) worst (weighted) pixel residual of the kept views.
+    """
+    scale = np.ones(visible.shape) if weights is None else weights
+    pos3D = triangulate_joints_batch(pos2D, visible, P_stack, image_width, image_height, weights, pixel_dlt)
+    residuals = reprojection_residuals(pos3D, pos2D, P_stack, image_width, image_height) * scale
+    inliers = visible.copy()
+
+    suspect = np.flatnonzero((visible.sum(axis=0) >= 3) & np.any(visible & ~(residuals <= threshold), axis=0))
+    if len(suspect):
+        # 카메라 쌍마다 두 광선의 최근접 중점을 가설로 사용 (num_pairs, 의심 관절, 3)
+        first, second = np.triu_indices(len(P_stack), k=1)
+        centers, directions = camera_rays(pos2D[:, suspect], P_stack, image_width, image_height)
+        d1, d2 = directions[first], directions[second]
+        offset = (centers[first] - centers[second])[:, None, :]
+        a, b, c = (d1 * d1).sum(axis=2), (d1 * d2).sum(axis=2), (d2 * d2).sum(axis=2)
+        d, e = (d1 * offset).sum(axis=2), (d2 * offset).sum(axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = (b * e - c * d) / (a * c - b * b)
+            t = (a * e - b * d) / (a * c - b * b)
+        hypotheses = (centers[first][:, None] + s[..., None] * d1 + centers[second][:, None] + t[..., None] * d2) / 2
+
+        # 가설마다 inlier 시점 수를 세고 (같으면 오차 합이 작은 것) 최선의 가설 선택
+        num_pairs = len(first)
+        hypothesis_residuals = reprojection_residuals(hypotheses.reshape(-1, 3), np.tile(pos2D[:, suspect], (1, num_pairs, 1)),
+                                                      P_stack, image_width, image_height).reshape(len(P_stack), num_pairs, len(suspect)) * scale[:, None, suspect]
+        hypothesis_inliers = visible[:, None, suspect] & (hypothesis_residuals <= threshold)
+        score = hypothesis_inliers.sum(axis=0) - np.where(hypothesis_inliers, hypothesis_residuals, 0).sum(axis=0) / (threshold * len(P_stack) + 1)
+        score[~(visible[first][:, suspect] & visible[second][:, suspect])] = -1
+        best = score.argmax(axis=0)
+
+        inliers[:, suspect] = hypothesis_inliers[:, best, np.arange(len(suspect))]
+        pos3D[suspect] = triangulate_joints_batch(pos2D[:, suspect], inliers[:, suspect], P_stack, image_width, image_height,
+                                                  None if weights is None else weights[:, suspect], pixel_dlt)
+        residuals[:, suspect] = reprojection_residuals(pos3D[suspect], pos2D[:, suspect], P_stack, image_width, image_height) * scale[:, suspect]
+
+    residual = np.where(inliers, np.nan_to_num(residuals, nan=np.inf), 0).max(axis=0)
+    pos3D[(inliers.sum(axis=0) < 2) | (residual > threshold)] = 0
+    return pos3D, residual
+
+_PAIR_A = np.array([a for a, _ in PAIRS])
+_PAIR_B = np.array([b for _, b in PAIRS])
+_BONE_MIN = np.array([low for low, _ in BONE_LENGTH_LIMITS])
+_BONE_MAX = np.array([high for _, high in BONE_LENGTH_LIMITS])
+
+def bone_length_outliers(skeletons, residual):
+    """
+    Joints that make a bone (PAIRS) shorter or longer than BONE_LENGTH_LIMITS.
+
+    For each violating bone the endpoint with the larger reprojection residual is
+    blamed. skeletons: (num_persons, num_joints, 3), residual: (num_persons, num_joints).
+    Returns a boolean mask (num_persons, num_joints).
+    """
+    present = ~np.all(skeletons == 0, axis=2)
+    lengths = np.linalg.norm(skeletons[:, _PAIR_A] - skeletons[:, _PAIR_B], axis=2)
+    bad = present[:, _PAIR_A] & present[:, _PAIR_B] & ((lengths < _BONE_MIN) | (lengths > _BONE_MAX))
+    blamed = np.where(residual[:, _PAIR_A] >= residual[:, _PAIR_B], _PAIR_A, _PAIR_B)
+    outliers = np.zeros(present.shape, dtype=bool)
+    persons, bones = np.nonzero(bad)
+    outliers[persons, blamed[persons, bones]] = True
+    return outliers
+
+_ADJACENCY = np.zeros((NUM_JOINTS, NUM_JOINTS))
+_ADJACENCY[_PAIR_A, _PAIR_B] = _ADJACENCY[_PAIR_B, _PAIR_A] = 1
+
+def fill_missing_joints(skeletons):
+    """누락된 관절 ([0, 0, 0])을 인접 관절 (PAIRS)의 평균 위치로 대체. skeletons: (num_persons, num_joints, 3)."""
+    present = ~np.all(skeletons == 0, axis=2)
+    counts = present @ _ADJACENCY
+    sums = np.einsum('ij,kjd->kid', _ADJACENCY, skeletons * present[..., None])
+    fill = ~present & (counts > 0)
+    filled = skeletons.copy()
+    filled[fill] = sums[fill] / counts[fill][:, None]
+    return filled
 
 # 이벤트 검출 알고리즘
 def is_fall_or_jump(keypoints, fall_threshold=0.2, jump_threshold=2.0):
@@ -301,252 +985,918 @@ def is_fall_or_jump(keypoints, fall_threshold=0.2, jump_threshold=2.0):
     return "None"
 
 
-######### Device로 부터 받은 데이터 저장/처리리 구조체 #########
-class KeypointsData:
-    def __init__(self):
-        self.data = defaultdict(lambda: defaultdict(list))
-        self.current_timestamp = None
+########################### 다중 인물 연관 (Cross-view association) ##############################
+def fundamental_matrix(P1, P2):
+    """Fundamental matrix F (x2^T F x1 = 0) between two 3x4 pixel projection matrices."""
+    _, _, Vt = np.linalg.svd(P1)
+    C1 = Vt[-1]                 # 카메라 1의 중심 (P1의 null space)
+    e2 = P2 @ C1                # 카메라 2 영상에서의 epipole
+    e2_skew = np.array([
+        [0, -e2[2], e2[1]],
+        [e2[2], 0, -e2[0]],
+        [-e2[1], e2[0], 0]
+    ])
+    return e2_skew @ P2 @ np.linalg.pinv(P1)
 
-    def add_data(self, camera_name, timestamp, keypoints):
-        if self.current_timestamp is None:
-            self.current_timestamp = timestamp
+def get_fundamental_matrix(camera_a, camera_b, registry=None):
+    """Cached fundamental matrix from camera_a to camera_b (registry: CameraRegistry, 기본값은 현재 구성)."""
+    return (registry or get_camera_registry()).fundamental_matrix(camera_a, camera_b)
 
-        if timestamp > self.current_timestamp:
-            asyncio.run(self.process_and_reset())
-            self.current_timestamp = timestamp
+def epipolar_cost(keypoints_a, keypoints_b, F, min_common_joints=3):
+    """
+    Pairwise association cost between the detections of two cameras.
 
-        self.data[timestamp][camera_name].extend(keypoints)
+    Parameters:
+    keypoints_a (np.array): Detections of camera a, shape (Na, num_joints, 2 or 3).
+    keypoints_b (np.array): Detections of camera b, shape (Nb, num_joints, 2 or 3).
+    F (np.array): Fundamental matrix from camera a to camera b.
+    min_common_joints (int): Minimum number of joints visible in both detections.
 
-    async def process_and_reset(self):
-        if self.current_timestamp is not None:
-            # keypoints 정보를 가지고 있는 카메라의 수를 계산
-            num_keypoints = len([camera for camera in CAMERA_NAMES if camera in self.data[self.current_timestamp]])
-            print(f"Triangulate with \033[93m{num_keypoints} keypoints\033[0m of {self.current_timestamp}")
+    Returns:
+    np.array: (Na, Nb) mean symmetric epipolar distance in pixels (inf if not comparable).
+    """
+    xa = np.concatenate([keypoints_a[..., :2], np.ones(keypoints_a.shape[:2] + (1,))], axis=2)
+    xb = np.concatenate([keypoints_b[..., :2], np.ones(keypoints_b.shape[:2] + (1,))], axis=2)
+    visible_a = ~np.all(keypoints_a[..., :2] == 0, axis=2)
+    visible_b = ~np.all(keypoints_b[..., :2] == 0, axis=2)
+
+    lines_b = xa @ F.T          # 카메라 b 영상의 epipolar line (Na, J, 3)
+    lines_a = xb @ F            # 카메라 a 영상의 epipolar line (Nb, J, 3)
+    algebraic = np.abs(np.einsum('ajk,bjk->abj', lines_b, xb))
+    norm_b = np.linalg.norm(lines_b[..., :2], axis=2)[:, None, :]
+    norm_a = np.linalg.norm(lines_a[..., :2], axis=2)[None, :, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dist = 0.5 * algebraic * (1 / norm_b + 1 / norm_a)
+
+    common = visible_a[:, None, :] & visible_b[None, :, :]
+    num_common = common.sum(axis=2)
+    cost = np.where(common, dist, 0).sum(axis=2) / np.maximum(num_common, 1)
+    cost[num_common < min_common_joints] = np.inf
+    return cost
+
+def solve_assignment(cost):
+    """Minimum-cost assignment (rows, cols). 한쪽이 한 명이면 NumPy로 풀고, 그 외에만 scipy를 import."""
+    if cost.size == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    if cost.shape[0] == 1:
+        return np.array([0]), np.array([np.argmin(cost[0])])
+    if cost.shape[1] == 1:
+        return np.array([np.argmin(cost[:, 0])]), np.array([0])
+    from scipy.optimize import linear_sum_assignment
+    return linear_sum_assignment(cost)
+
+def associate_persons(cameras, detections, threshold=ASSOCIATION_THRESHOLD, refine_passes=2, registry=None):
+    """
+    Group the detections of every camera into persons (cross-view association).
 
-            if num_keypoints > 1:
-                start_time_est = time.time()
+    Cameras are added one at a time. Each detection of the new camera is matched to
+    an existing person by the mean epipolar distance to the person's detections in
+    the other cameras (Hungarian assignment), or starts a new person. Refinement
+    passes then re-assign each camera against all the others, which resolves the
+    ambiguities of the first camera pairs.
 
-                # 각 카메라의 keypoints를 pos2D_dict에 저장
-                pos2D_dict = {
-                    camera: np.array([
-                        [kp[0], kp[1]]  # (x, y) 좌표만 추출
-                        for kp in self.data[self.current_timestamp][camera]
-                    ])
-                    for camera in CAMERA_NAMES if camera in self.data[self.current_timestamp]
+    Parameters:
+    cameras (list): Camera names, one per entry of detections.
+    detections (list): Per camera np.array of shape (N_c, num_joints, 3).
+    threshold (float): Maximum mean epipolar distance (pixels) for a match.
+    refine_passes (int): Number of re-assignment passes over all cameras.
+    registry (CameraRegistry): Camera set of the slot (default: the current one).
+
+    Returns:
+    np.array: (num_persons, num_cameras) detection index per camera, -1 if not seen.
+    """
+    num_cameras = len(cameras)
+
+    # 카메라 쌍별 검출 간 epipolar 비용 (대칭이므로 한 번만 계산)
+    pair_cost = {}
+    for a in range(num_cameras):
+        for b in range(a + 1, num_cameras):
+            if len(detections[a]) and len(detections[b]):
+                pair_cost[a, b] = epipolar_cost(detections[a], detections[b], get_fundamental_matrix(cameras[a], cameras[b], registry))
+                pair_cost[b, a] = pair_cost[a, b].T
+
+    def assign(persons, c):
+        persons[:, c] = -1
+        num_detections = len(detections[c])
+        matched = np.full(num_detections, -1)
+        if len(persons) > 0:
+            # 인물 k와 검출 n 사이의 비용: 인물 k를 본 다른 모든 카메라에 대한 평균 epipolar 거리
+            cost_sum = np.zeros((len(persons), num_detections))
+            cost_count = np.zeros((len(persons), num_detections))
+            for other in range(num_cameras):
+                members = persons[:, other]
+                seen = members >= 0
+                if other == c or not np.any(seen):
+                    continue
+                member_cost = pair_cost[other, c][members[seen]]
+                finite = np.isfinite(member_cost)
+                cost_sum[seen] += np.where(finite, member_cost, 0)
+                cost_count[seen] += finite
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cost = np.where(cost_count > 0, cost_sum / cost_count, np.inf)
+
+            gated = np.where(cost <= threshold, cost, threshold * 1e3)
+            rows, cols = solve_assignment(gated)
+            for k, n in zip(rows, cols):
+                if cost[k, n] <= threshold:
+                    matched[n] = k
+
+        persons[matched[matched >= 0], c] = np.flatnonzero(matched >= 0)
+        unmatched = np.flatnonzero(matched < 0)
+        new_persons = np.full((len(unmatched), num_cameras), -1)
+        new_persons[:, c] = unmatched
+        return np.vstack([persons, new_persons])
+
+    persons = np.zeros((0, num_cameras), dtype=int)
+    for c in range(num_cameras):
+        if len(detections[c]):
+            persons = assign(persons, c)
+    for _ in range(refine_passes):
+        for c in range(num_cameras):
+            if len(detections[c]):
+                persons = assign(persons, c)
+        persons = persons[np.any(persons >= 0, axis=1)]
+    return persons
+
+class PersonTracker:
+    """Assigns stable IDs to 3D skeletons across slots by nearest-skeleton matching."""
+    def __init__(self, max_distance=TRACK_MAX_DISTANCE, max_missed=TRACK_MAX_MISSED):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.tracks = {}    # id -> {"pos3D": (num_joints, 3), "missed": int}
+        self.next_id = 0
+
+    def update(self, skeletons):
+        """Return one ID per skeleton (num_persons, num_joints, 3)."""
+        track_ids = list(self.tracks.keys())
+        ids = [None] * len(skeletons)
+
+        if track_ids and len(skeletons) > 0:
+            prev = np.stack([self.tracks[tid]["pos3D"] for tid in track_ids])
+            valid = ~np.all(skeletons == 0, axis=2)[None, :, :] & ~np.all(prev == 0, axis=2)[:, None, :]
+            dist = np.linalg.norm(prev[:, None] - skeletons[None, :], axis=3)
+            cost = np.where(valid, dist, 0).sum(axis=2) / np.maximum(valid.sum(axis=2), 1)
+            cost[valid.sum(axis=2) == 0] = np.inf
+
+            gated = np.where(cost <= self.max_distance, cost, self.max_distance * 1e3)
+            rows, cols = solve_assignment(gated)
+            for t, n in zip(rows, cols):
+                if cost[t, n] <= self.max_distance:
+                    ids[n] = track_ids[t]
+
+        for n, skeleton in enumerate(skeletons):
+            if ids[n] is None:
+                ids[n] = self.next_id
+                self.next_id += 1
+            self.tracks[ids[n]] = {"pos3D": skeleton, "missed": 0}
+
+        # 이번 슬롯에서 검출되지 않은 인물은 일정 시간 후 삭제
+        current_ids = set(ids)
+        for tid in track_ids:
+            if tid not in current_ids:
+                self.tracks[tid]["missed"] += 1
+                if self.tracks[tid]["missed"] > self.max_missed:
+                    del self.tracks[tid]
+        return ids
+
+
+########################### 시간 필터 (Temporal filter) ##############################
+@lru_cache(maxsize=256)
+def slot_to_seconds(slotted_timestamp):
+    """Unity slotted timestamp string -> epoch seconds."""
+    return datetime.strptime(slotted_timestamp, '%Y-%m-%d_%H-%M-%S.%f').timestamp()
+
+class KalmanJointFilter:
+    """Constant-velocity Kalman filter for every joint of one person (vectorized over joints and axes)."""
+    def __init__(self, pos3D, process_noise=KALMAN_PROCESS_NOISE, measurement_noise=KALMAN_MEASUREMENT_NOISE):
+        num_joints = len(pos3D)
+        self.q = process_noise
+        self.r = measurement_noise ** 2
+        self.position = pos3D.copy()
+        self.velocity = np.zeros_like(pos3D)
+        # 위치/속도 공분산 (x, y, z 축이 같은 값을 가지므로 관절별로 저장)
+        self.P00 = np.full((num_joints, 1), self.r)
+        self.P01 = np.zeros((num_joints, 1))
+        self.P11 = np.ones((num_joints, 1))
+
+    def step(self, pos3D, observed, dt):
+        """Predict dt seconds ahead and update the observed joints. Returns (num_joints, 3)."""
+        # Predict
+        self.position = self.position + self.velocity * dt
+        self.P00 = self.P00 + 2 * dt * self.P01 + dt ** 2 * self.P11 + self.q * dt ** 3 / 3
+        self.P01 = self.P01 + dt * self.P11 + self.q * dt ** 2 / 2
+        self.P11 = self.P11 + self.q * dt
+
+        # Update (관측된 관절만)
+        mask = observed[:, None]
+        S = self.P00 + self.r
+        K0 = np.where(mask, self.P00 / S, 0)
+        K1 = np.where(mask, self.P01 / S, 0)
+        innovation = np.where(mask, pos3D - self.position, 0)
+        self.position = self.position + K0 * innovation
+        self.velocity = self.velocity + K1 * innovation
+        self.P11 = self.P11 - K1 * self.P01
+        self.P01 = (1 - K0) * self.P01
+        self.P00 = (1 - K0) * self.P00
+        return self.position.copy()
+
+class OneEuroJointFilter:
+    """One-Euro filter for every joint of one person (vectorized over joints and axes)."""
+    def __init__(self, pos3D, min_cutoff=ONE_EURO_MIN_CUTOFF, beta=ONE_EURO_BETA, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.position = pos3D.copy()
+        self.velocity = np.zeros_like(pos3D)
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1 / (2 * np.pi * cutoff)
+        return 1 / (1 + tau / dt)
+
+    def step(self, pos3D, observed, dt):
+        """Filter the observed joints and extrapolate the others. Returns (num_joints, 3)."""
+        mask = observed[:, None]
+        raw_velocity = (pos3D - self.position) / dt
+        velocity = self.velocity + self._alpha(self.d_cutoff, dt) * (raw_velocity - self.velocity)
+        cutoff = self.min_cutoff + self.beta * np.linalg.norm(velocity, axis=1, keepdims=True)
+        filtered = self.position + self._alpha(cutoff, dt) * (pos3D - self.position)
+
+        # 관측되지 않은 관절은 등속 예측
+        self.position = np.where(mask, filtered, self.position + self.velocity * dt)
+        self.velocity = np.where(mask, velocity, self.velocity)
+        return self.position.copy()
+
+class TemporalFilter:
+    """
+    Per-person temporal smoothing stage between triangulation and evaluate_results.
+
+    Joints that were not triangulated in this slot are filled with the filter's
+    constant-velocity prediction for up to max_predict_slots consecutive slots.
+    """
+    FILTERS = {"kalman": KalmanJointFilter, "one_euro": OneEuroJointFilter}
+
+    def __init__(self, method=TEMPORAL_FILTER, max_predict_slots=MAX_PREDICT_SLOTS):
+        self.filter_class = self.FILTERS[method]
+        self.max_predict_slots = max_predict_slots
+        self.filters = {}   # person id -> {"filter", "time", "missed": (num_joints,)}
+
+    def apply(self, person_ids, skeletons, observed, t):
+        """
+        Parameters:
+        person_ids (list): Stable person IDs, one per skeleton.
+        skeletons (np.array): (num_persons, num_joints, 3) outlier-corrected 3D joints.
+        observed (np.array): (num_persons, num_joints) joints triangulated in this slot.
+        t (float): Slot time in seconds.
+
+        Returns:
+        np.array: Filtered skeletons (num_persons, num_joints, 3).
+        """
+        filtered = skeletons.copy()
+        for i, person_id in enumerate(person_ids):
+            state = self.filters.get(person_id)
+            if state is None:
+                self.filters[person_id] = {
+                    "filter": self.filter_class(skeletons[i]),
+                    "time": t,
+                    "missed": np.where(observed[i], 0, self.max_predict_slots + 1)
                 }
+                continue
+
+            dt = max(t - state["time"], 1e-3)
+            estimate = state["filter"].step(skeletons[i], observed[i], dt)
+            state["time"] = t
+            state["missed"] = np.where(observed[i], 0, state["missed"] + 1)
 
-                # 3D point estimation
-                pos3D_est = np.zeros((NUM_JOINTS, 3))
-                for joint_idx in range(NUM_JOINTS):  # 각 관절별로 하나씩
-                    valid_pos2D_list = []
-                    valid_P_list = []
-
-                    for camera in CAMERA_NAMES:
-                        if camera in pos2D_dict and not np.all(pos2D_dict[camera][joint_idx] == 0):
-                            valid_pos2D_list.append(pos2D_dict[camera][joint_idx])
-                            valid_P_list.append(P_list[CAMERA_NAMES.index(camera)])
-
-                    if len(valid_pos2D_list) > 1:
-                        if CAMERA_P_MATRIX == "EST":
-                            pos3D_est[joint_idx] = triangulate_single_point(valid_pos2D_list, valid_P_list)
-                        elif CAMERA_P_MATRIX == "UNITY":
-                            pos3D_est[joint_idx] = triangulate_single_point_pixel2NDC_fast(valid_pos2D_list, valid_P_list, image_width, image_height)
-                    else:
-                        pos3D_est[joint_idx] = [0, 0, 0]
-
-                # 이상치 감지 및 수정 실행
-                corrected_pos3D_est = mahalanobis_outlier_detection(pos3D_est)
-                print(f"- Processing time for 3D pose estimation: {(time.time() - start_time_est) * 1000:.6f} ms")
+            # 관측된 관절 또는 최근까지 관측된 관절은 필터 값 사용 (그 외는 입력 그대로)
+            use_filter = state["missed"] <= self.max_predict_slots
+            filtered[i][use_filter] = estimate[use_filter]
+        return filtered
+
+    def prune(self, active_ids):
+        """Drop the state of persons no longer tracked."""
+        for person_id in list(self.filters):
+            if person_id not in active_ids:
+                del self.filters[person_id]
+
+
+########################### Ground truth (RMSE 평가) ##############################
+GT_PREFIX = "body_pos3D_"
+
+def parse_gt_file(path):
+    """GT 파일 (관절 NUM_JOINTS줄 + captureTime 한 줄) -> ((NUM_JOINTS, 3) array, captureTime 문자열, captureTime epoch초)."""
+    with open(path, 'r') as f:
+        lines = f.read().split('\n')
+    points = np.array(','.join(lines[:NUM_JOINTS]).split(','), dtype=np.float64).reshape(NUM_JOINTS, 3)
+    capture_time = lines[NUM_JOINTS].strip()
+    return points, capture_time, datetime.strptime(capture_time, '%Y-%m-%d_%H-%M-%S.%f').timestamp()
+
+class GroundTruthProvider:
+    """
+    Slot -> GT skeleton index for RMSE evaluation.
+
+    GT_DIR is scanned and then polled by a background thread; new files are parsed
+    ahead of time into a preallocated (capacity, NUM_JOINTS, 3) array with LRU eviction,
+    so evaluate_results only does a dictionary lookup. A slot that is not cached yet
+    (written after the last poll or evicted) is parsed on demand.
+    """
+    def __init__(self, directory, capacity=GT_CACHE_SIZE, poll_interval=GT_POLL_INTERVAL):
+        self.directory = directory
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.points = np.zeros((capacity, NUM_JOINTS, 3))
+        self.capture_times = [None] * capacity      # row -> (captureTime 문자열, epoch초)
+        self.rows = OrderedDict()                   # slot -> row (LRU 순서)
+        self.paths = {}                             # slot -> 파일 경로 (디렉터리의 모든 GT 파일)
+        self.lock = threading.Lock()
+        self.available = False                      # GT_DIR 존재 여부 (없으면 조회 실패 시 파일을 확인하지 않음)
+        self.hits = 0
+        self.misses = 0
+        self.thread = threading.Thread(target=self._poll, name="gt-watcher", daemon=True)
+        self.thread.start()
+
+    def scan(self):
+        """새로 생긴 GT 파일을 색인하고 미리 파싱 (처음에는 최신 capacity개만 파싱)."""
+        try:
+            entries = [entry.name for entry in os.scandir(self.directory)]
+        except FileNotFoundError:
+            self.available = False
+            return
+        self.available = True
+        new_slots = sorted(name[len(GT_PREFIX):-len(".txt")] for name in entries
+                           if name.startswith(GT_PREFIX) and name.endswith(".txt")
+                           and name[len(GT_PREFIX):-len(".txt")] not in self.paths)
+        for slot in new_slots:
+            self.paths[slot] = os.path.join(self.directory, f"{GT_PREFIX}{slot}.txt")
+        for slot in new_slots[-self.capacity:]:
+            self._load(slot)
+
+    def _poll(self):
+        while True:
+            self.scan()     # 처음 스캔도 이 스레드에서 (GT가 많아도 서버 시작을 지연시키지 않음)
+            time.sleep(self.poll_interval)
+
+    def _load(self, slot):
+        try:
+            points, capture_time, capture_seconds = parse_gt_file(self.paths[slot])
+        except (OSError, ValueError, IndexError):
+            return None     # 아직 쓰는 중이거나 잘못된 파일 (다음 조회 때 다시 시도)
+        with self.lock:
+            if slot in self.rows:
+                row = self.rows[slot]
+            elif len(self.rows) < self.capacity:
+                row = len(self.rows)
+            else:
+                _, row = self.rows.popitem(last=False)   # 가장 오래 사용하지 않은 슬롯의 행 재사용
+            self.points[row] = points
+            self.capture_times[row] = (capture_time, capture_seconds)
+            self.rows[slot] = row
+            self.rows.move_to_end(slot)
+            return points.copy(), capture_time, capture_seconds
+
+    def get(self, slot):
+        """(points (NUM_JOINTS, 3), captureTime 문자열, captureTime epoch초) 또는 GT가 없으면 None."""
+        with self.lock:
+            row = self.rows.get(slot)
+            if row is not None:
+                self.rows.move_to_end(slot)
+                self.hits += 1
+                return self.points[row].copy(), *self.capture_times[row]
+        self.misses += 1
+        if slot not in self.paths:
+            if not self.available:
+                return None
+            path = os.path.join(self.directory, f"{GT_PREFIX}{slot}.txt")
+            if not os.path.exists(path):
+                return None
+            self.paths[slot] = path
+        return self._load(slot)
+
+def skeleton_rmse(skeletons, points_gt):
+    """GT와 가장 가까운 인물의 (MSE, RMSE). skeletons: (num_persons, NUM_JOINTS, 3)."""
+    mse = float(np.mean((np.asarray(skeletons) - points_gt) ** 2, axis=(1, 2)).min())
+    return mse, np.sqrt(mse)
+
+
+######### Device로 부터 받은 데이터 저장/처리리 구조체 #########
+def view_coverage(confidence, visible, min_views=REDUNDANT_MIN_VIEWS, min_confidence=REDUNDANT_CONFIDENCE):
+    """카메라별 (잘 보는 관절 수, 다른 카메라 min_views대 이상도 잘 보는 관절 수), shape (num_cameras, 2)."""
+    good = visible & (confidence >= min_confidence)
+    others = good.sum(axis=0) - good
+    return np.stack([good.sum(axis=1), (good & (others >= min_views)).sum(axis=1)], axis=1)
+
+def triangulate_detections(cameras, detections, registry=None):
+    """
+    Numeric stage of one slot: cross-view association and robust triangulation.
+
+    Runs in the event loop or in a TriangulationPool worker process, so it only
+    depends on the camera configuration, never on tracking state.
+
+    Parameters:
+    cameras (list): Camera names, one per entry of detections.
+    detections (list): Per camera np.array of shape (N_c, NUM_JOINTS, 3).
+    registry (CameraRegistry): Camera set of the slot (default: the current one).
+
+    Returns:
+    tuple: pos3D (num_persons, NUM_JOINTS, 3), residual (num_persons, NUM_JOINTS),
+    view coverage (num_cameras, 2) (see view_coverage) and the (association,
+    triangulation) times in seconds.
+    """
+    stage_start = time.perf_counter()
+    registry = registry or get_camera_registry()
+    # confidence가 CONFIDENCE_THRESHOLD보다 낮은 관절은 (0, 0, 0)으로 (연관, 삼각측량 모두에서 제외)
+    detections = [np.where(det[..., 2:3] >= CONFIDENCE_THRESHOLD, det, 0) for det in detections]
+
+    # 카메라 간 동일 인물 연관 (모든 카메라가 1명 이하를 검출한 경우 그대로 한 명으로 처리)
+    if all(len(det) <= 1 for det in detections):
+        persons = np.array([[0 if len(det) else -1 for det in detections]])
+    else:
+        persons = associate_persons(cameras, detections, registry=registry)
+    persons = persons[(persons >= 0).sum(axis=1) > 1]   # 2대 이상의 카메라에서 보인 인물만 삼각측량
+    association_end = time.perf_counter()
+    num_persons = len(persons)
+    if num_persons == 0:
+        return (np.zeros((0, NUM_JOINTS, 3)), np.zeros((0, NUM_JOINTS)), np.zeros((len(cameras), 2), dtype=int),
+                (association_end - stage_start, 0.0))
+
+    # 모든 인물의 keypoints를 (카메라 x (인물*관절) x (x, y, conf)) 텐서로 저장
+    keypoints = np.zeros((len(cameras), num_persons, NUM_JOINTS, 3))
+    for c, det in enumerate(detections):
+        seen = persons[:, c] >= 0
+        keypoints[c, seen] = det[persons[seen, c]]
+    keypoints = keypoints.reshape(len(cameras), num_persons * NUM_JOINTS, 3)
+    pos2D = keypoints[..., :2]
+    visible = ~np.all(pos2D == 0, axis=2)
+    weights = keypoints[..., 2] if CONFIDENCE_WEIGHTING else None
+    P_stack, widths, heights, pixel_dlt = registry.stack(cameras)   # NDC matrix, 카메라별 해상도, pixel 공간 DLT 카메라
+
+    # 3D point estimation (모든 인물, 모든 관절을 한 번에, 재투영 오차가 큰 시점은 제외하고 다시 삼각측량)
+    pos3D_est, residual = robust_triangulate(pos2D, visible, P_stack, widths, heights, weights=weights, pixel_dlt=pixel_dlt)
+    return (pos3D_est.reshape(num_persons, NUM_JOINTS, 3), residual.reshape(num_persons, NUM_JOINTS),
+            view_coverage(keypoints[..., 2], visible), (association_end - stage_start, time.perf_counter() - association_end))
+
+class KeypointsData:
+    """
+    Frame assembler and processing pipeline.
+
+    Packets are collected in a buffer of in-flight slots (self.data). A slot is
+    processed as soon as every expected camera reported or SLOT_DEADLINE seconds
+    after its first packet, whichever comes first. Slots are released in order,
+    so packets may arrive out of order while their slot is still in flight.
+
+    With a TriangulationPool (self.pool), the numeric stage of several slots runs
+    in parallel in worker processes; tracking, evaluation and broadcast still run
+    here, one slot at a time in slot order.
+    """
+    def __init__(self):
+        self.data = defaultdict(dict)       # slotted_timestamp -> {camera: keypoints} (조립 중인 슬롯)
+        self.deadlines = {}                 # slotted_timestamp -> 처리 마감 시각 (time.monotonic)
+        self.released_timestamp = None      # 마지막으로 조립을 마친 슬롯 (이후 도착한 패킷은 늦은 패킷)
+        self.current_timestamp = None       # 마무리(추적, 평가, 전송) 중이거나 마지막으로 마무리한 슬롯
+        self.last_seen = {}                 # camera -> 마지막 수신 시각 (time.monotonic)
+        self.connections = defaultdict(int) # camera -> 열려 있는 Device 연결 수 (연결된 카메라는 조용해도 슬롯이 기다림)
+        self.started = time.monotonic()
+        self.packet_stats = defaultdict(lambda: {"late": 0, "dropped": 0})  # 카메라별 늦은/누락 패킷 수
+        self.release_lock = None
+        self.pool = None                    # TriangulationPool (None이면 이벤트 루프에서 삼각측량)
+        self.in_flight = None               # worker pool에서 처리 중인 슬롯 수 제한 (asyncio.Semaphore)
+        self.last_finish = None             # 마지막으로 디스패치한 슬롯의 마무리 task (슬롯 순서 보장)
+        self.tracker = PersonTracker()
+        self.temporal_filter = TemporalFilter() if TEMPORAL_FILTER else None
+        self.stage_listener = None          # callable(stage, seconds): 단계별 처리 시간 수집 (benchmark 등)
+        self.tracer = None                  # Tracer (None이면 tracing 안 함)
+        self.traces = {}                    # slotted_timestamp -> SlotTrace (조립 중인 슬롯)
+        self.capture_times = {}             # slotted_timestamp -> 가장 먼저 캡처된 패킷의 exact_time (조립 중인 슬롯)
+        self.current_trace = None           # 마무리 중인 슬롯의 SlotTrace
+        self.recorder = SessionRecorder(EST_DIR, "BodyPos3dEST") if SAVE_EST_KEYPOINTS_DATA else None
+        self.ground_truth = GroundTruthProvider(GT_DIR) if EVALUATE_GT else None
+
+    def record_stage(self, stage, start):
+        """start 이후 경과 시간을 stage_listener와 슬롯 trace로 전달하고 다음 단계의 시작 시각(perf_counter)을 반환."""
+        now = time.perf_counter()
+        if self.stage_listener is not None:
+            self.stage_listener(stage, now - start)
+        if self.current_trace is not None:
+            self.current_trace.span(stage, start, now)
+        return now
+
+    def finish_trace(self):
+        """마무리한 슬롯의 trace를 tracer에 넘김."""
+        if self.current_trace is not None:
+            self.tracer.finish(self.current_trace)
+            self.current_trace = None
+
+    def connect(self, camera_name):
+        """Device 연결에서 카메라를 처음 알게 됨 (hello 또는 첫 패킷): 연결이 닫힐 때까지 슬롯이 이 카메라를 기다림."""
+        self.connections[camera_name] += 1
+        self.last_seen[camera_name] = time.monotonic()
+
+    def disconnect(self, camera_name):
+        self.connections[camera_name] -= 1
+        if self.connections[camera_name] <= 0:
+            del self.connections[camera_name]
+
+    def expected_cameras(self, now):
+        """
+        연결이 열려 있거나 최근 TIMEOUT_THRESHOLD초 이내에 데이터를 보낸 등록된 카메라
+        (슬롯 완료 판단 기준, 시작 직후에는 모든 카메라).
+        """
+        registry = get_camera_registry()
+        expected = {camera for camera, last_seen in self.last_seen.items() if now - last_seen <= TIMEOUT_THRESHOLD and camera in registry}
+        expected.update(camera for camera in self.connections if camera in registry)
+        if now - self.started <= TIMEOUT_THRESHOLD:
+            expected.update(registry.names)
+        return expected
+
+    async def add_data(self, camera_name, timestamp, keypoints, trace_marks=None, exact_time=None):
+        """
+        keypoints: np.array of shape (num_persons, NUM_JOINTS, 3). trace_marks: Tracer.device_marks (tracing할 때).
+        exact_time: 패킷의 캡처 시각 (time.time 기준, 슬롯 지연 측정용).
+        """
+        now = time.monotonic()
+        self.last_seen[camera_name] = now
+
+        # 이미 처리된 슬롯의 패킷은 늦은 패킷으로 기록하고 버림
+        if self.released_timestamp is not None and timestamp <= self.released_timestamp:
+            self.packet_stats[camera_name]["late"] += 1
+            limited_log.warning(("late", camera_name), "Late packet from %s for %s (late: %d)", camera_name, timestamp, self.packet_stats[camera_name]['late'])
+            return
+
+        if timestamp not in self.deadlines:
+            self.deadlines[timestamp] = now + SLOT_DEADLINE
+            asyncio.get_running_loop().call_later(SLOT_DEADLINE, lambda: asyncio.ensure_future(self.release_slots()))
+
+        # 같은 슬롯에 같은 카메라의 데이터가 중복되면 처음 것을 사용
+        self.data[timestamp].setdefault(camera_name, keypoints)
+        if exact_time is not None:
+            self.capture_times[timestamp] = min(exact_time, self.capture_times.get(timestamp, exact_time))
+        if self.tracer is not None:
+            trace = self.traces.setdefault(timestamp, SlotTrace(timestamp))
+            if camera_name not in trace.cameras:
+                trace.add_camera(camera_name, trace_marks or {"server_receive": time.perf_counter()})
+        await self.release_slots()
+
+    async def release_slots(self):
+        """가장 오래된 슬롯부터 완료(모든 카메라 도착, deadline 경과, 버퍼 초과)된 슬롯을 순서대로 처리."""
+        if self.release_lock is None:
+            self.release_lock = asyncio.Lock()
+        async with self.release_lock:
+            while self.data:
+                timestamp = min(self.data)
+                now = time.monotonic()
+                expected = self.expected_cameras(now)
+                complete = expected <= self.data[timestamp].keys()
+                if not (complete or now >= self.deadlines[timestamp] or len(self.data) > SLOT_WINDOW):
+                    break
+
+                for camera in expected - self.data[timestamp].keys():
+                    self.packet_stats[camera]["dropped"] += 1
+                # 처리할 슬롯을 버퍼에서 꺼냄
+                self.released_timestamp = timestamp
+                packets = self.data.pop(timestamp)
+                del self.deadlines[timestamp]
+                trace = self.traces.pop(timestamp, None)
+                if trace is not None:
+                    trace.released = time.perf_counter()
+                await self.process_slot(timestamp, packets, trace, self.capture_times.pop(timestamp, None))
+
+    async def process_slot(self, timestamp, packets, trace=None, capture_time=None):
+        """
+        슬롯 하나를 처리 (pool이 있으면 수치 단계를 worker에 맡기고 바로 반환, 마무리는 슬롯 순서대로).
+        capture_time: 슬롯에서 가장 먼저 캡처된 패킷의 exact_time (없으면 슬롯 지연을 측정하지 않음).
+        """
+        # keypoints 정보를 가지고 있는 카메라의 수를 계산
+        registry = get_camera_registry()   # 슬롯은 처리를 시작할 때의 카메라 구성으로 끝까지 처리
+        cameras = [camera for camera in registry.names if camera in packets]
+        detections = [packets[camera] for camera in cameras]
+        metrics.record_slot(len(cameras))
+        log.debug("Triangulate with %d keypoints of %s", len(cameras), timestamp)
+        start_time_est = time.time()
+
+        if self.pool is None:
+            result = triangulate_detections(cameras, detections, registry) if len(cameras) > 1 else None
+            self.current_timestamp = timestamp
+            self.current_trace = trace
+            if trace is not None:
+                trace.numeric_end = time.perf_counter()
+            await self.process_and_reset(cameras, result, start_time_est, capture_time)
+            self.finish_trace()
+            return
+
+        # worker가 모두 바쁘면 대기 (처리 중인 슬롯 수 제한, 밀린 슬롯은 self.data에서 SLOT_WINDOW로 관리)
+        if self.in_flight is None:
+            self.in_flight = asyncio.Semaphore(2 * self.pool.num_workers)
+        await self.in_flight.acquire()
+        numeric = asyncio.ensure_future(self.pool.triangulate(cameras, detections, registry)) if len(cameras) > 1 else None
+        if trace is not None and numeric is not None:
+            numeric.add_done_callback(lambda _: setattr(trace, "numeric_end", time.perf_counter()))    # worker 결과 도착 시각
+        self.last_finish = asyncio.ensure_future(self.finish_in_order(self.last_finish, timestamp, cameras, numeric, start_time_est, trace, capture_time))
+
+    async def finish_in_order(self, previous, timestamp, cameras, numeric, start_time_est, trace=None, capture_time=None):
+        """이전 슬롯의 마무리가 끝난 뒤 이 슬롯의 worker 결과로 추적, 평가, 전송."""
+        try:
+            if previous is not None:
+                await previous
+            result = await numeric if numeric is not None else None
+            self.current_timestamp = timestamp
+            self.current_trace = trace
+            await self.process_and_reset(cameras, result, start_time_est, capture_time)
+            self.finish_trace()
+        except Exception as e:
+            log.exception("Error while processing %s: %s", timestamp, e)
+        finally:
+            self.in_flight.release()
+
+    async def flush(self):
+        """worker pool에서 처리 중인 슬롯의 마무리가 모두 끝날 때까지 대기."""
+        if self.last_finish is not None:
+            await self.last_finish
+
+    async def process_and_reset(self, cameras, result, start_time_est, capture_time=None):
+        """result: cameras의 keypoints로 계산한 triangulate_detections의 결과 (카메라가 2대 미만이면 None)."""
+        if feedback_controller is not None:
+            feedback_controller.record_slot(capture_time, cameras, result[2] if result is not None else None)
+        if result is not None:
+            pos3D_est, residual, _, (association_time, triangulation_time) = result
+            if self.stage_listener is not None:
+                self.stage_listener("association", association_time)
+            trace = self.current_trace
+            if trace is not None and trace.numeric_end is not None:
+                # 연관/삼각측량은 결과가 도착하기 직전에 실행됨 (pool이면 그 앞은 worker 대기 시간)
+                trace.span("numeric", trace.released, trace.numeric_end)
+                trace.span("association", trace.numeric_end - triangulation_time - association_time, trace.numeric_end - triangulation_time)
+                trace.span("triangulation", trace.numeric_end - triangulation_time, trace.numeric_end)
+            num_persons = len(pos3D_est)
+            if num_persons > 0:
+                metrics.record_triangulated()
+                if self.stage_listener is not None:
+                    self.stage_listener("triangulation", triangulation_time)
+                stage_start = time.perf_counter()
+
+                # 뼈 길이가 BONE_LENGTH_LIMITS를 벗어나는 관절 제거 (시간 필터가 있으면 예측 값으로 채워짐)
+                outliers = bone_length_outliers(pos3D_est, residual)
+                if np.any(outliers) and log.isEnabledFor(logging.DEBUG):
+                    log.debug("Outlier joints rejected by bone length: %s", [np.flatnonzero(o).tolist() for o in outliers])
+                corrected_pos3D_est = np.where(outliers[..., None], 0, pos3D_est)
+                stage_start = self.record_stage("outlier", stage_start)
+                person_ids = self.tracker.update(corrected_pos3D_est)
+
+                # 시간 필터 (평활화 및 이번 슬롯에서 삼각측량되지 않은 관절 예측)
+                if self.temporal_filter:
+                    observed = ~np.all(corrected_pos3D_est == 0, axis=2)
+                    corrected_pos3D_est = self.temporal_filter.apply(person_ids, corrected_pos3D_est, observed, slot_to_seconds(self.current_timestamp))
+                    self.temporal_filter.prune(self.tracker.tracks)
+                corrected_pos3D_est = fill_missing_joints(corrected_pos3D_est)   # 필터로도 채우지 못한 관절
+                self.record_stage("tracking", stage_start)
+                processing_ms = (time.time() - start_time_est) * 1000
+                log.debug("Processing time for 3D pose estimation of %d person(s): %.3f ms", num_persons, processing_ms)
+                slot_summary.add("Slots", slots=1, persons=num_persons, outlier_joints=int(np.count_nonzero(outliers)),
+                                 max_processing_ms=processing_ms)
 
                 # 성능 측정 및 결과 계산 함수 호출
-                await self.evaluate_results(corrected_pos3D_est)
+                await self.evaluate_results(corrected_pos3D_est, person_ids)
+                return
 
-        # 데이터 초기화
-        self.data.clear()
+        # 삼각측량한 인물이 없는 슬롯도 aggregator에 알림 (aggregator가 이 zone을 마감 시간까지 기다리지 않도록)
+        if aggregator_uplink is not None:
+            aggregator_uplink.send({"type": "zone_result", "zone": ZONE["zone"], "slot": self.current_timestamp, "persons": []})
 
-    async def evaluate_results(self, corrected_pos3D_est):
-        """MSE, RMSE, Delay 계산 및 WebSocket으로 데이터 전송."""        
+    async def evaluate_results(self, corrected_pos3D_est, person_ids):
+        """MSE, RMSE, Delay 계산 및 WebSocket으로 데이터 전송. corrected_pos3D_est: (num_persons, NUM_JOINTS, 3)"""
         # 기본값 설정 (예: rmse와 captureTime의 기본값)
         rmse = 0  # 기본값
         captureTime = "0000-00-00_00-00-00.000"  # 기본 포맷
-        event_name = "None"  # Default 이벤트 이름
-            
+        event_names = ["None"] * len(corrected_pos3D_est)  # Default 이벤트 이름
+
         start_time_result = time.time()
+        stage_start = time.perf_counter()
 
         # Detect events (fall-down or jump)
-        event_name = is_fall_or_jump(corrected_pos3D_est)
-        if event_name == "Fall-down":
-            print(f"\033[92mFall-down Detected!!\033[0m")
-        elif event_name == "Jump":
-            print(f"\033[93mJump Detected!!\033[0m")
-
-        # 파일 경로 로드
-        load_path = os.path.join(GT_DIR, f"body_pos3D_{self.current_timestamp}.txt")
-        if os.path.exists(load_path):
-            # 텍스트 파일의 모든 줄을 읽어들임
-            with open(load_path, 'r') as f:
-                lines = f.readlines()
-
-            # 마지막 줄의 datetime 정보 추출
-            captureTime = lines[-1].strip()  # 마지막 줄에서 개행 문자 제거
-            e2eDelay = time.time() - datetime.strptime(captureTime, '%Y-%m-%d_%H-%M-%S.%f').timestamp()
-
-            # 나머지 줄을 points_gt로 처리
-            points_gt = np.loadtxt(lines[:-1], delimiter=',')
-
-            # MSE와 RMSE 계산
-            mse = mean_squared_error(corrected_pos3D_est, points_gt)
-            rmse = np.sqrt(mse)
-            print(f"\033[93mMSE: {mse:.6f}, RMSE: {rmse:.6f} meters / Capture time: {captureTime}, Elapsed {e2eDelay:.6f} seconds\033[0m")
+        for i, skeleton in enumerate(corrected_pos3D_est):
+            event_names[i] = is_fall_or_jump(skeleton)
+            if event_names[i] != "None":
+                limited_log.info((event_names[i], person_ids[i]), "%s Detected!! (ID %s)", event_names[i], person_ids[i])
+        stage_start = self.record_stage("event", stage_start)
+
+        # 미리 파싱된 GT 조회 (파일 I/O 없음)
+        ground_truth = self.ground_truth.get(self.current_timestamp) if self.ground_truth else None
+        if ground_truth is not None:
+            points_gt, captureTime, capture_seconds = ground_truth
+            e2eDelay = time.time() - capture_seconds
+
+            # MSE와 RMSE 계산 (GT는 아바타 한 명이므로 가장 가까운 인물과 비교)
+            mse, rmse = skeleton_rmse(corrected_pos3D_est, points_gt)
+            metrics.record_rmse(rmse)
+            log.debug("MSE: %.6f, RMSE: %.6f meters / Capture time: %s, Elapsed %.6f seconds", mse, rmse, captureTime, e2eDelay)
+            slot_summary.add("Slots", last_rmse_m=round(float(rmse), 4), max_e2e_delay_ms=e2eDelay * 1000)
         else:
-            print(f"Warning: File not found at {load_path}. MSE & RMSE cannot be calculated!")
-
-        print(f"- Processing time for result calculation: {(time.time() - start_time_result) * 1000:.6f} ms")
-
-
-        # 3D keypoints 별도 저장 (SAVE_EST_KEYPOINTS_DATA가 True일 때만)
-        if SAVE_EST_KEYPOINTS_DATA:
-            save_path = os.path.join(EST_DIR, f"BodyPos3dEST_{self.current_timestamp}.txt")
-            with open(save_path, 'w') as f:
-                # Corrected 3D keypoints 저장
-                for joint in corrected_pos3D_est:
-                    f.write(f"{joint[0]:.6f}, {joint[1]:.6f}, {joint[2]:.6f}\n")
-                # 추가 정보 저장
-                f.write(f"{captureTime}\n")  # 16번째 행: captureTime
-                f.write(f"{rmse:.6f}\n")     # 17번째 행: RMSE
-                f.write(f"{event_name}\n")   # 18번째 행: Event name
-            print(f"\033[96mCorrected 3D data saved to {save_path}\033[0m")
-            
-        # WebSocket 클라이언트로 3D 데이터 전송
-        await self.send_pos3D_to_clients(corrected_pos3D_est, rmse, captureTime, event_name)
-    
-    async def send_pos3D_to_clients(self, corrected_pos3D_est, rmse, captureTime, event_name):
-        """WebSocket 클라이언트로 3D 포인트 데이터, RMSE, 및 Capture Time을 JSON 형태로 전송."""
-        if connected_websockets:
-            # 3D 포인트 데이터를 JSON으로 생성
-            pos3D_data = [{"x": round(joint[0], 3), "y": round(joint[1], 3), "z": round(joint[2], 3)} for joint in corrected_pos3D_est]
-
-            # 전송할 JSON 메시지 생성
-            message = {
-                "3D_points": pos3D_data,
-                "rmse": rmse,
-                "capture_time": captureTime,
-                "event_name": event_name
-            }
+            limited_log.warning("no ground truth", "No ground truth for %s in %s. MSE & RMSE cannot be calculated!", self.current_timestamp, GT_DIR)
 
-            # JSON 메시지를 문자열로 변환
-            message_json = json.dumps(message)
+        log.debug("Processing time for result calculation: %.3f ms", (time.time() - start_time_result) * 1000)
+        stage_start = self.record_stage("evaluation", stage_start)
 
-            # WebSocket으로 전송
-            for websocket in connected_websockets:
-                try:
-                    await websocket.send(message_json + '\n')
-                    currTime = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                    print(f"\033[91mSent 3D pos data {len(message_json)} bytes to WebSocket client at {currTime}\n\033[0m")
 
-                    # 서버 데이터 업데이트 (전송 바이트 및 RMSE 값)
-                    update_server_data(len(message_json), rmse)
-                except Exception as e:
-                    print(f"Error sending data to WebSocket client: {e}")
+        # 3D keypoints 저장 (SAVE_EST_KEYPOINTS_DATA가 True일 때만, 파일 쓰기는 recorder 스레드에서)
+        if self.recorder is not None:
+            self.recorder.write({
+                "slot": self.current_timestamp,
+                "capture_time": captureTime,
+                "rmse": float(rmse),
+                "person_ids": np.asarray(person_ids, dtype=np.int64),
+                "event_names": np.array(event_names),
+                "points": np.array(corrected_pos3D_est, dtype=np.float32),   # (num_persons, NUM_JOINTS, 3)
+            })
+            stage_start = self.record_stage("save", stage_start)
 
-keypoints_data_manager = KeypointsData()
+        # WebSocket 클라이언트로 3D 데이터 전송
+        await self.send_pos3D_to_clients(corrected_pos3D_est, person_ids, rmse, captureTime, event_names)
+        self.record_stage("broadcast", stage_start)
+
+    async def send_pos3D_to_clients(self, corrected_pos3D_est, person_ids, rmse, captureTime, event_names):
+        """WebSocket 클라이언트로 인물별 3D 포인트 데이터, RMSE, 및 Capture Time 전송 (zone worker는 aggregator로도 전송).
+
+        인코딩은 포맷별로 슬롯당 한 번이고, 실제 전송은 클라이언트별 sender task가 동시에 처리 (HkPose3D_Broadcast).
+        """
+        message = None
+        if aggregator_uplink is not None:
+            message = build_pos3D_message(corrected_pos3D_est, person_ids, rmse, captureTime, event_names)
+            aggregator_uplink.send({"type": "zone_result", "zone": ZONE["zone"], "slot": self.current_timestamp, **message})
+
+        frame = pose_broadcaster.publish(person_ids, corrected_pos3D_est, event_names, rmse, captureTime, message)
+        if frame is not None and log.isEnabledFor(logging.DEBUG):
+            sizes = ", ".join(f"{name} {len(payload)} bytes" for name, payload in frame.items() if name != "seq")
+            log.debug("Queued 3D pos data (%s) for %d WebSocket client(s)", sizes, len(pose_broadcaster.clients))
+
+keypoints_data_manager = None  # KeypointsData (run_servers에서 생성, import 시에는 만들지 않음)
+
+
+############ Device 전송 포맷 (JSON / Binary) #############
+# Binary v1: header(28 bytes, little-endian) + float32 keypoints (num_persons x num_joints x (x, y, conf))
+BINARY_MAGIC = b'HKP3'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sBBHHHqq')  # magic, version, flags, camera_id, num_persons, num_joints, exact_us, slotted_us
+BINARY_FLAG_TRACE = 0x01                     # keypoints 뒤에 TRACE_BLOCK이 있음 (hello_ack의 "trace"가 true일 때 Device가 붙임)
+TRACE_BLOCK = struct.Struct('<q' + 'q' * len(DEVICE_MARKS))  # clock_offset_us, DEVICE_MARKS 순서의 perf_counter us (없으면 -1)
+
+@lru_cache(maxsize=256)
+def slotted_us_to_timestamp(slotted_us):
+    """int64 microseconds -> Unity slotted timestamp string ('%Y-%m-%d_%H-%M-%S.<0 or 5>')."""
+    seconds, microseconds = divmod(slotted_us, 1_000_000)
+    return f"{datetime.fromtimestamp(seconds).strftime('%Y-%m-%d_%H-%M-%S')}.{microseconds // 100_000}"
+
+def decode_binary_keypoints(data):
+    """Binary 메시지 해석 (keypoints는 np.frombuffer로 복사 없이 읽음).
+    Device는 "Camera<N>" 이름만 Binary로 보내고 (camera_id = N), 그 밖의 이름은 JSON으로 보냄."""
+    _, version, _, camera_id, num_persons, num_joints, exact_us, slotted_us = BINARY_HEADER.unpack_from(data)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary version: {version}")
+    keypoints = np.frombuffer(data, dtype='<f4', count=num_persons * num_joints * 3, offset=BINARY_HEADER.size)
+    return f"Camera{camera_id}", exact_us / 1e6, slotted_us_to_timestamp(slotted_us), keypoints.reshape(num_persons, num_joints, 3)
+
+def decode_binary_trace(data):
+    """Binary 메시지의 Device 단계 시각 (BINARY_FLAG_TRACE가 없으면 None)."""
+    _, _, flags, _, num_persons, num_joints, _, _ = BINARY_HEADER.unpack_from(data)
+    if not flags & BINARY_FLAG_TRACE:
+        return None
+    values = TRACE_BLOCK.unpack_from(data, BINARY_HEADER.size + num_persons * num_joints * 12)
+    return dict(zip(["clock_offset_us"] + DEVICE_MARKS, values))
+
+JSON_KEYPOINTS_FIELDS = {"camera_name": str, "exact_timestamp": str, "slotted_timestamp": str, "keypoints": list}
+
+def decode_json_keypoints(received_json):
+    """JSON 메시지 해석 (필수 필드가 없거나 형식이 틀리면 ValueError)."""
+    if not isinstance(received_json, dict):
+        raise ValueError(f"Keypoints message must be a JSON object, not {type(received_json).__name__}")
+    for field, field_type in JSON_KEYPOINTS_FIELDS.items():
+        if not isinstance(received_json.get(field), field_type):
+            raise ValueError(f"Keypoints message field {field!r} is missing or not {field_type.__name__}")
+    camera_name = received_json['camera_name']
+    slotted_timestamp = received_json['slotted_timestamp']
+    exact_time = datetime.strptime(received_json['exact_timestamp'], '%Y-%m-%d_%H-%M-%S.%f').timestamp()
+
+    # keypoints는 1차원 배열이므로, 인물별로 (관절, (x, y, conf))씩 묶어서 처리
+    num_persons = received_json.get('num_persons', 1)
+    if not isinstance(num_persons, int) or num_persons < 0:
+        raise ValueError(f"Invalid num_persons: {num_persons!r}")
+    keypoints = np.array(received_json['keypoints'], dtype=np.float64).reshape(num_persons, NUM_JOINTS, 3)
+    return camera_name, exact_time, slotted_timestamp, keypoints
+
+def negotiate_wire_format(hello_json):
+    """Device가 제안한 포맷 중 서버가 지원하는 첫 번째 포맷 선택 (없으면 json)."""
+    for wire_format in hello_json.get('formats', []):
+        if wire_format in WIRE_FORMATS:
+            return wire_format
+    return "json"
 
 
 ############ Device로 부터 받은 데이터 처리 #############
-def handle_client(client_socket, client_address):
-    """클라이언트의 데이터를 처리하는 함수."""
-    print(f"클라이언트 {client_address} 가 접속했습니다.")
+async def handle_client(reader, writer):
+    """클라이언트의 데이터를 처리하는 코루틴 (연결마다 하나, 스레드 없이 같은 이벤트 루프에서 실행)."""
+    client_address = writer.get_extra_info("peername")
+    raw_socket = writer.get_extra_info("socket")
+    if raw_socket:
+        raw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # TCP_NODELAY 활성화
+    log.info("클라이언트 %s 가 접속했습니다.", client_address)
+    control_writer = None   # Device가 제어 메시지를 지원하면 writer
+    connection_cameras = set()  # 이 연결로 데이터를 보내는 카메라 (연결이 닫히면 슬롯이 더 이상 기다리지 않음)
+
+    def register_camera(camera_name):
+        if isinstance(camera_name, str) and camera_name not in connection_cameras:
+            connection_cameras.add(camera_name)
+            keypoints_data_manager.connect(camera_name)
     try:
         while True:
             try:
-                # data = client_socket.recv(1024)
-
-                # 먼저 데이터 크기(4바이트)를 수신
-                data_length_bytes = client_socket.recv(4)
-                if not data_length_bytes:
-                    print("data_length 수신 실패")
-                    break
+                # 먼저 데이터 크기(4바이트)를 정확히 수신
+                data_length_bytes = await reader.readexactly(4)
                 data_length = int.from_bytes(data_length_bytes, byteorder='big')
 
-                # 그다음 데이터 길이만큼 수신
-                data = b''
-                while len(data) < data_length:
-                    chunk = client_socket.recv(1024)
-                    if not chunk:
-                        break
-                    data += chunk          
-                if not data:
-                    break  # 데이터가 없으면 루프 탈출
-
-                # 수신한 데이터를 처리 (JSON 형식 디코딩)
-                data_str = data.decode('utf-8')
-                try:
-                    # JSON 파싱
-                    received_json = json.loads(data_str)
-                    camera_name = received_json.get('camera_name')
-                    exact_timestamp = received_json.get('exact_timestamp')
-                    slotted_timestamp = received_json.get('slotted_timestamp')
-                    keypoints_data_list = received_json.get('keypoints')
-
-                    elapsed_time = time.time() - datetime.strptime(exact_timestamp, '%Y-%m-%d_%H-%M-%S.%f').timestamp()
-                    print(f"Received {len(data)} bytes from {camera_name} ({slotted_timestamp}, {exact_timestamp}) / Elapsed {elapsed_time*1000:.6f} ms")
-
-                    # 카메라 데이터 업데이트
-                    update_camera_data(camera_name, len(data), elapsed_time * 1000)
-
-                    # keypoints_data_list는 1차원 배열이므로, 3개의 좌표(x, y, z)씩 묶어서 처리
-                    keypoints_data = []
-                    for i in range(0, len(keypoints_data_list), 3):
-                        x, y, z = keypoints_data_list[i:i + 3]
-                        keypoints_data.append((x, y, z))                    
-                    # print(f"Processed keypoints: {keypoints_data}")
-
-                    # keypoints_data 추가 (사용자 정의 처리 함수로 전달)
-                    keypoints_data_manager.add_data(camera_name, slotted_timestamp, keypoints_data)
-                
-                except json.JSONDecodeError as e:
-                    print(f"JSON 디코딩 오류 발생: {e}")
-                    continue
+                # 그다음 데이터 길이만큼 정확히 수신
+                data = await reader.readexactly(data_length)
+                received = time.perf_counter()
+            except asyncio.IncompleteReadError:
+                break  # 연결 종료 (데이터가 없으면 루프 탈출)
             except OSError as e:
-                print(f"데이터 수신 중 오류 발생: {e}")
-                break        
+                log.warning("데이터 수신 중 오류 발생: %s", e)
+                break
+
+            # 수신한 데이터를 처리 (Binary 또는 JSON 형식 디코딩)
+            try:
+                device_trace = None
+                if data[:4] == BINARY_MAGIC:
+                    camera_name, exact_time, slotted_timestamp, keypoints_data = decode_binary_keypoints(data)
+                    if tracer is not None:
+                        device_trace = decode_binary_trace(data)
+                else:
+                    # JSON 파싱
+                    received_json = json.loads(data.decode('utf-8'))
+                    if isinstance(received_json, dict) and received_json.get('type') == 'hello':
+                        # 전송 포맷 협상: 선택한 포맷을 Device로 응답
+                        wire_format = negotiate_wire_format(received_json)
+                        reply = json.dumps({"type": "hello_ack", "format": wire_format, "trace": tracer is not None}).encode('utf-8')
+                        writer.write(len(reply).to_bytes(4, byteorder='big') + reply)
+                        await writer.drain()
+                        control_writer = writer if received_json.get('control') else None
+                        register_camera(received_json.get('camera_name'))
+                        log.info("%s 전송 포맷: %s, 제어: %s", received_json.get('camera_name'), wire_format, control_writer is not None)
+                        continue
+                    camera_name, exact_time, slotted_timestamp, keypoints_data = decode_json_keypoints(received_json)
+                    device_trace = received_json.get('trace')
+                    if not isinstance(device_trace, dict) or "clock_offset_us" not in device_trace:
+                        device_trace = None     # 형식이 틀린 trace는 무시 (keypoints는 그대로 처리)
+
+                register_camera(camera_name)
+                elapsed_time = time.time() - exact_time
+                log.debug("Received %d bytes from %s (%s) / Elapsed %.3f ms", len(data), camera_name, slotted_timestamp, elapsed_time * 1000)
+                packet_summary.add(camera_name, packets=1, bytes=len(data), max_latency_ms=elapsed_time * 1000)
+
+                # 카메라 수신 지표 업데이트
+                metrics.record_packet(camera_name, len(data), elapsed_time * 1000)
+                if feedback_controller is not None:
+                    feedback_controller.record_packet(camera_name, elapsed_time * 1000, len(keypoints_data), control_writer)
+
+                # keypoints_data 추가 (사용자 정의 처리 함수로 전달)
+                trace_marks = tracer.device_marks(exact_time, received, device_trace) if tracer is not None else None
+                await keypoints_data_manager.add_data(camera_name, slotted_timestamp, keypoints_data, trace_marks, exact_time)
+
+            except json.JSONDecodeError as e:
+                limited_log.warning(("decode", client_address), "JSON 디코딩 오류 발생: %s", e)
+                continue
+            except (ValueError, TypeError, KeyError, struct.error) as e:
+                limited_log.warning(("decode", client_address), "데이터 해석 오류 발생: %s: %s", type(e).__name__, e)
+                continue
 
     finally:
-        client_socket.close()
-        print(f"클라이언트 {client_address} 연결이 종료되었습니다.")
+        writer.close()
+        for camera_name in connection_cameras:
+            keypoints_data_manager.disconnect(camera_name)
+        if feedback_controller is not None:
+            feedback_controller.unregister(writer)
+        log.info("클라이언트 %s 연결이 종료되었습니다.", client_address)
 
 
 ######################## Server Socket ######################## 
-server_socket = None
-connected_websockets = set()
+server_socket = None    # asyncio.Server (Device 수신 서버)
+server_loop = None      # Device 수신 서버와 WebSocket 서버가 함께 실행되는 이벤트 루프
 
-def start_server():
-    """서버를 시작하고 클라이언트 연결을 처리하는 함수."""
+async def start_server():
+    """서버를 시작하고 클라이언트 연결을 처리하는 코루틴 (asyncio.start_server)."""
     global server_socket
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((IP, PORT))
-    server_socket.listen(5)
-    print(f"Edge Server: {IP}:{PORT}에서 클라이언트의 접속을 기다리는 중...")
+    server_socket = await asyncio.start_server(handle_client, IP, PORT, backlog=MAX_DEVICE_CONNECTIONS)
+    log.info("Edge Server: %s:%d에서 클라이언트의 접속을 기다리는 중...", IP, PORT)
+    metrics.record_startup("ready")
 
     try:
-        while True:
-            client_socket, client_address = server_socket.accept()
-            client_handler = threading.Thread(
-                target=handle_client,
-                args=(client_socket, client_address)
-            )
-            client_handler.start()
-    except KeyboardInterrupt:
-        print("\n서버가 종료 중입니다...")
+        async with server_socket:
+            await server_socket.serve_forever()
     finally:
-        server_socket.close()
-        print("서버가 완전히 종료되었습니다.")
+        log.info("서버가 완전히 종료되었습니다.")
 
 def signal_handler(sig, frame):
     """Ctrl+C 신호를 처리하는 함수."""
-    print("\nCtrl+C 신호가 감지되었습니다. 서버를 종료합니다...")
-    if server_socket:
-        server_socket.close()
+    log.info("Ctrl+C 신호가 감지되었습니다. 서버를 종료합니다...")
+    if server_socket and server_loop:
+        server_loop.call_soon_threadsafe(server_socket.close)
     sys.exit(0)
 
 # SIGINT 신호에 대한 핸들러 설정
@@ -554,29 +1904,455 @@ signal.signal(signal.SIGINT, signal_handler)
 
 
 ######################## WebSocket Server ########################
-async def handle_websocket(websocket, path):
+pose_broadcaster = PoseBroadcaster(on_sent=metrics.record_sent)    # 포맷(JSON/binary/delta)은 클라이언트가 URL query로 선택
+
+async def handle_websocket(websocket, path=None):
     """Handles new WebSocket connections."""
     # WebSocket의 기본 TCP 소켓 설정
     raw_socket = websocket.transport.get_extra_info("socket")
     if raw_socket:
         raw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # TCP_NODELAY 활성화
-        print("TCP_NODELAY 설정이 완료되었습니다.")
+        log.debug("TCP_NODELAY 설정이 완료되었습니다.")
 
-    connected_websockets.add(websocket)
-    print(f"New WebSocket client connected: {path}")
-    try:
-        await websocket.wait_closed()
-    finally:
-        connected_websockets.remove(websocket)
-        print("WebSocket client disconnected")
+    await pose_broadcaster.serve(websocket, path)
 
 async def start_websocket_server():
     """Starts the WebSocket server."""
     async with websockets.serve(handle_websocket, IP_WS, PORT_WS):
-        print(f"WebSocket server started on ws://{IP_WS}:{PORT_WS}")
+        log.info("WebSocket server started on ws://%s:%d", IP_WS, PORT_WS)
         await asyncio.Future()  # Keep the server running
 
 
+
+######################## Device feedback control ########################
+class FeedbackController:
+    """
+    Closed-loop control of the devices' send rate and inference resolution.
+
+    Every CONTROL_INTERVAL seconds each camera's capture -> server latency (p90) and
+    share of late packets are compared with LATENCY_BUDGET_MS. An overloaded camera
+    whose view is redundant (REDUNDANT_MIN_VIEWS other cameras see its joints well)
+    skips frames; any other overloaded camera moves one step down CONTROL_LEVELS
+    (fewer frames, smaller inference input). When the slots are late but no camera
+    is, the server is the bottleneck and one camera is thinned out per interval.
+    After CONTROL_RECOVERY_TICKS intervals with headroom one step is restored.
+
+    Control messages use the device connection's framing (4-byte length + JSON):
+    {"type": "control", "camera": "Camera1", "frame_stride": 2, "input_size": 480, "reason": "latency"}
+    """
+    def __init__(self, budget_ms=LATENCY_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.writers = {}                   # camera -> 제어 메시지를 보낼 Device 연결 (asyncio.StreamWriter)
+        self.levels = defaultdict(int)      # camera -> CONTROL_LEVELS 인덱스
+        self.redundant = set()              # 중복 시점이라 프레임을 건너뛰는 카메라
+        self.controls = {}                  # camera -> 마지막으로 보낸 제어 값
+        self.latency = defaultdict(list)    # camera -> 이번 주기의 캡처 -> 수신 지연 (ms)
+        self.packets = defaultdict(int)     # camera -> 이번 주기에 받은 패킷 수 (건너뛴 프레임 포함)
+        self.slot_latency = []              # 이번 주기의 슬롯별 캡처 -> 삼각측량 지연 (ms)
+        self.coverage = defaultdict(lambda: np.zeros(2))  # camera -> 이번 주기의 (잘 보는 관절, 중복 관절) 수
+        self.late = {}                      # camera -> 지난 주기까지의 늦은 패킷 수
+        self.healthy_ticks = 0
+
+    def record_packet(self, camera, latency_ms, num_persons, writer):
+        """writer: hello에서 control을 알린 Device 연결 (아니면 None). 건너뛴 프레임(인물 0명)은 지연에 넣지 않음."""
+        self.packets[camera] += 1
+        if num_persons > 0:
+            self.latency[camera].append(latency_ms)
+        if writer is not None:
+            self.writers[camera] = writer
+
+    def record_slot(self, capture_time, cameras, coverage):
+        """
+        capture_time: 슬롯에서 가장 먼저 캡처된 패킷의 exact_time. 슬롯 이름은 0.5초 단위로 내림한
+        시각이라 지연 기준으로 쓰면 최대 500 ms가 더해지므로 실제 캡처 시각을 기준으로 함.
+        """
+        if capture_time is not None:
+            self.slot_latency.append((time.time() - capture_time) * 1000)
+        if coverage is not None:
+            for camera, counts in zip(cameras, coverage):
+                self.coverage[camera] += counts
+
+    def unregister(self, writer):
+        """끊긴 Device 연결의 카메라 제어 상태 삭제 (재연결한 Device는 기본 설정으로 시작)."""
+        for camera in [camera for camera, camera_writer in self.writers.items() if camera_writer is writer]:
+            del self.writers[camera]
+            self.levels.pop(camera, None)
+            self.redundant.discard(camera)
+            self.controls.pop(camera, None)
+
+    def redundancy(self, camera):
+        good, redundant = self.coverage[camera]
+        return redundant / good if good else 0.0
+
+    def degrade(self, camera, reason):
+        """카메라 하나의 부하를 한 단계 낮춤 (중복 시점이면 프레임 건너뛰기가 우선)."""
+        if camera not in self.redundant and self.redundancy(camera) >= REDUNDANT_RATIO:
+            self.redundant.add(camera)
+            return "redundant view"
+        if self.levels[camera] < len(CONTROL_LEVELS) - 1:
+            self.levels[camera] += 1
+        return reason
+
+    def restore(self):
+        """한 단계 복구: 가장 많이 낮춘 카메라부터, 그다음 건너뛰던 중복 시점."""
+        degraded = [camera for camera in self.writers if self.levels[camera] > 0]
+        if degraded:
+            camera = max(degraded, key=lambda camera: self.levels[camera])
+            self.levels[camera] -= 1
+            return {camera: "recovered"}
+        if self.redundant:
+            return {self.redundant.pop(): "recovered"}
+        return {}
+
+    def tick(self, packet_stats):
+        """한 주기의 측정값으로 카메라별 제어 값을 정해 바뀐 카메라에만 전송하고, 측정값을 초기화."""
+        reasons = {}
+        overloaded = False
+        for camera in list(self.writers):
+            late = packet_stats.get(camera, {}).get("late", 0)
+            new_late = late - self.late.get(camera, late)
+            self.late[camera] = late
+            latency = np.percentile(self.latency[camera], 90) if self.latency[camera] else 0.0
+            if latency > self.budget_ms:
+                reasons[camera] = self.degrade(camera, f"latency p90 {latency:.0f} ms")
+            elif new_late > CONTROL_MAX_LATE * max(self.packets[camera], 1):
+                reasons[camera] = self.degrade(camera, f"{new_late} late packets")
+            overloaded |= latency > self.budget_ms * CONTROL_RECOVERY_MARGIN or new_late > 0
+
+        # 카메라는 제때 보내는데 슬롯 처리가 늦으면 서버가 병목: 가장 중복된 (없으면 가장 덜 낮춘) 카메라 하나를 줄임
+        slot_latency = np.percentile(self.slot_latency, 90) if self.slot_latency else 0.0
+        if slot_latency > self.budget_ms and not reasons and self.writers:
+            camera = max(self.writers, key=lambda camera: (self.redundancy(camera) >= REDUNDANT_RATIO and camera not in self.redundant,
+                                                           -self.levels[camera]))
+            reasons[camera] = self.degrade(camera, f"slot latency p90 {slot_latency:.0f} ms")
+        overloaded |= slot_latency > self.budget_ms * CONTROL_RECOVERY_MARGIN
+
+        # 다른 카메라가 가려지는 등으로 더 이상 중복이 아닌 시점은 바로 복구
+        for camera in list(self.redundant):
+            if self.coverage[camera][0] and self.redundancy(camera) < REDUNDANT_RATIO:
+                self.redundant.discard(camera)
+                reasons.setdefault(camera, "view no longer redundant")
+
+        self.healthy_ticks = 0 if overloaded else self.healthy_ticks + 1
+        if self.healthy_ticks >= CONTROL_RECOVERY_TICKS:
+            self.healthy_ticks = 0
+            reasons.update(self.restore())
+
+        for camera in list(self.writers):
+            self.send(camera, reasons.get(camera, "update"))
+        self.latency.clear()
+        self.packets.clear()
+        self.slot_latency = []
+        self.coverage.clear()
+
+    def send(self, camera, reason):
+        frame_stride, input_size = CONTROL_LEVELS[self.levels[camera]]
+        if camera in self.redundant:
+            frame_stride = max(frame_stride, REDUNDANT_FRAME_STRIDE)
+        control = {"frame_stride": frame_stride, "input_size": input_size}
+        if self.controls.get(camera, {"frame_stride": 1, "input_size": CONTROL_LEVELS[0][1]}) == control:
+            return
+        self.controls[camera] = control
+        message = json.dumps({"type": "control", "camera": camera, **control, "reason": reason}).encode('utf-8')
+        try:
+            self.writers[camera].write(len(message).to_bytes(4, byteorder='big') + message)
+            log.info("Control %s: frame_stride %d, input_size %d (%s)", camera, frame_stride, input_size, reason)
+        except (ConnectionError, RuntimeError) as e:
+            log.warning("Failed to send control to %s: %s", camera, e)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(CONTROL_INTERVAL)
+            self.tick(keypoints_data_manager.packet_stats)
+
+feedback_controller = None  # FeedbackController (FEEDBACK_CONTROL이 True일 때 run_servers에서 생성)
+
+
+######################## Triangulation worker pool (multi-core) ########################
+# worker 요청: b'T' + 카메라 수 또는 b'R' + 카메라 구성 (pickle, 바뀌었을 때만) / 응답: 인물 수, 연관 시간, 삼각측량 시간
+# (keypoints와 결과는 공유 메모리로 주고받음)
+POOL_TASK = struct.Struct('<cH')
+POOL_RESULT = struct.Struct('<Hdd')
+
+def slot_block_arrays(buffer, num_cameras, max_persons=MAX_PERSONS_PER_CAMERA):
+    """worker 하나의 공유 메모리 블록을 NumPy 배열로 나눔 (buffer가 None이면 필요한 바이트 수만 계산)."""
+    layout = [
+        ("camera_index", (num_cameras,), np.int32),                                   # CameraRegistry 내 인덱스
+        ("counts", (num_cameras,), np.int32),                                         # 카메라별 검출 인물 수
+        ("detections", (num_cameras, max_persons, NUM_JOINTS, 3), np.float64),       # 입력 keypoints
+        ("pos3D", (num_cameras * max_persons, NUM_JOINTS, 3), np.float64),           # 결과 3D 관절
+        ("residual", (num_cameras * max_persons, NUM_JOINTS), np.float64),           # 결과 재투영 오차
+        ("coverage", (num_cameras, 2), np.int32),                                     # 결과 카메라별 view_coverage
+    ]
+    arrays = {}
+    offset = 0
+    for name, shape, dtype in layout:
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if buffer is not None:
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+        offset += size
+    return arrays if buffer is not None else offset
+
+def triangulation_worker(conn, shm_name, max_cameras, config):
+    """worker 프로세스: 공유 메모리 블록의 슬롯을 triangulate_detections로 처리 (빈 요청을 받으면 종료)."""
+    import pickle
+    from multiprocessing import shared_memory
+    global CONFIDENCE_THRESHOLD, CONFIDENCE_WEIGHTING
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # Ctrl+C는 메인 프로세스가 처리하고 worker를 종료시킴
+    # 실행 중에 바뀔 수 있는 설정 (benchmark)만 전달받음, 나머지 상수는 모듈 import 시의 값과 같음
+    CONFIDENCE_THRESHOLD, CONFIDENCE_WEIGHTING = config
+    registry = None     # 메인 프로세스가 보낸 카메라 구성
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    block = slot_block_arrays(shm.buf, max_cameras)
+    try:
+        conn.send_bytes(b"ready")
+        while True:
+            request = conn.recv_bytes()
+            if not request:
+                break
+            if request[:1] == b'R':
+                registry = pickle.loads(request[1:])
+                continue
+            _, num_cameras = POOL_TASK.unpack(request)
+            cameras = [registry.names[i] for i in block["camera_index"][:num_cameras]]
+            detections = [block["detections"][c, :block["counts"][c]] for c in range(num_cameras)]
+            pos3D_est, residual, coverage, (association_time, triangulation_time) = triangulate_detections(cameras, detections, registry)
+            num_persons = len(pos3D_est)
+            block["pos3D"][:num_persons] = pos3D_est
+            block["residual"][:num_persons] = residual
+            block["coverage"][:num_cameras] = coverage
+            conn.send_bytes(POOL_RESULT.pack(num_persons, association_time, triangulation_time))
+    except (EOFError, OSError):
+        pass    # 메인 프로세스 종료
+    finally:
+        del block
+        shm.close()
+
+class TriangulationPool:
+    """
+    Worker processes for the numeric stage of a slot (triangulate_detections).
+
+    Every worker owns one shared-memory block: the keypoints of a slot are copied
+    into it and the 3D joints are read back from it, and only a few bytes of
+    header travel over the worker's pipe, so nothing is pickled per slot. The
+    camera registry is pickled to a worker only when the slot's registry differs
+    from the one the worker has.
+    """
+    def __init__(self, num_workers, max_persons=MAX_PERSONS_PER_CAMERA):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        context = multiprocessing.get_context("spawn")   # Windows와 같은 방식, 실행 중인 스레드를 복제하지 않음
+        self.num_workers = num_workers
+        self.max_persons = max_persons
+        self.max_cameras = max(POOL_MAX_CAMERAS, len(get_camera_registry()))
+        config = (CONFIDENCE_THRESHOLD, CONFIDENCE_WEIGHTING)
+        block_size = slot_block_arrays(None, self.max_cameras, max_persons)
+        self.workers = []
+        for _ in range(num_workers):
+            shm = shared_memory.SharedMemory(create=True, size=block_size)
+            conn, child_conn = context.Pipe()
+            process = context.Process(target=triangulation_worker, args=(child_conn, shm.name, self.max_cameras, config), daemon=True)
+            process.start()
+            child_conn.close()
+            self.workers.append({"process": process, "conn": conn, "shm": shm, "registry": None,
+                                 "block": slot_block_arrays(shm.buf, self.max_cameras, max_persons)})
+        for worker in self.workers:
+            worker["conn"].recv_bytes()     # 모든 worker가 import를 마칠 때까지 대기 (첫 슬롯이 지연되지 않도록)
+        self.idle = None    # 쉬고 있는 worker (asyncio.Queue, 이벤트 루프에서 생성)
+        self.truncated = 0
+        log.info("Triangulation pool: %d worker process(es), %d bytes of shared memory each", num_workers, block_size)
+
+    async def triangulate(self, cameras, detections, registry=None):
+        """triangulate_detections와 같은 결과를 쉬고 있는 worker에서 계산 (worker가 죽었으면 이 프로세스에서 계산)."""
+        import pickle
+        registry = registry or get_camera_registry()
+        if len(cameras) > self.max_cameras:
+            limited_log.warning("pool cameras", "%d cameras in one slot exceed the pool block (%d, POOL_MAX_CAMERAS), triangulating in the server process",
+                                len(cameras), self.max_cameras)
+            return triangulate_detections(cameras, detections, registry)
+        if self.idle is None:
+            self.idle = asyncio.Queue()
+            for worker in self.workers:
+                self.idle.put_nowait(worker)
+        worker = await self.idle.get()
+        try:
+            if worker["registry"] != registry.version:
+                worker["conn"].send_bytes(b'R' + pickle.dumps(registry))
+                worker["registry"] = registry.version
+            block = worker["block"]
+            for c, (camera, det) in enumerate(zip(cameras, detections)):
+                if len(det) > self.max_persons:
+                    self.truncated += 1
+                    if self.truncated == 1 or self.truncated % 100 == 0:
+                        log.warning("%s: %d persons detected, only %d triangulated (MAX_PERSONS_PER_CAMERA)", camera, len(det), self.max_persons)
+                    det = det[:self.max_persons]
+                block["camera_index"][c] = registry.index[camera]
+                block["counts"][c] = len(det)
+                block["detections"][c, :len(det)] = det
+            worker["conn"].send_bytes(POOL_TASK.pack(b'T', len(cameras)))
+            reply = await asyncio.get_running_loop().run_in_executor(None, worker["conn"].recv_bytes)
+            num_persons, association_time, triangulation_time = POOL_RESULT.unpack(reply)
+            return (block["pos3D"][:num_persons].copy(), block["residual"][:num_persons].copy(),
+                    block["coverage"][:len(cameras)].copy(), (association_time, triangulation_time))
+        except (EOFError, OSError) as e:
+            log.error("Triangulation worker %d failed (%s), triangulating in the server process", worker['process'].pid, e)
+            return triangulate_detections(cameras, detections, registry)
+        finally:
+            self.idle.put_nowait(worker)
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker["conn"].send_bytes(b"")
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker["process"].join(timeout=2)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+            worker["conn"].close()
+            del worker["block"]
+            worker["shm"].close()
+            worker["shm"].unlink()
+        self.workers = []
+
+triangulation_pool = None   # TriangulationPool (TRIANGULATION_WORKERS > 0일 때 run_servers에서 생성)
+
+
+######################## Zone worker (multi-zone 배포) ########################
+def load_zone_config(path):
+    """
+    Configure this server as one zone worker from a JSON config file.
+
+    The zone owns its cameras and projection matrices and streams every processed
+    slot to HkPose3D_Aggregator, which merges the zones into one WebSocket feed.
+    Relative paths in the file are resolved against the file's directory. The file
+    is also the zone's camera config (CAMERA_CONFIG): editing its camera entries or
+    the matrix files reloads the cameras without a restart.
+
+    {
+        "zone": 1, "name": "lobby",
+        "cameras": ["Camera1", "Camera2", "Camera3", "Camera4"],     (카메라별 설정은 camera_specs 참고)
+        "camera_p_matrix": "UNITY",                 (선택, 기본값 CAMERA_P_MATRIX)
+        "matrices": {"Camera1": "Camera1_Pmatrix_Unity.txt"},  (선택, 없는 카메라는 CAM_DIR에서 로드)
+        "image_width": 1920, "image_height": 1080,  (선택)
+        "device": {"host": "0.0.0.0", "port": 11111},
+        "websocket": {"host": "127.0.0.1", "port": 12222},    (선택, null이면 zone 자체 WebSocket 서버 없음)
+        "metrics_port": 9101,                       (선택, 0이면 비활성화)
+        "evaluate_gt": true,                        (선택)
+        "aggregator": {"host": "127.0.0.1", "port": 13333}
+    }
+    """
+    global ZONE, CAMERA_CONFIG, IP, PORT, IP_WS, PORT_WS, METRICS_PORT, EVALUATE_GT
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    ZONE = {"zone": int(config["zone"]), "name": config.get("name", f"zone{config['zone']}"),
+            "websocket": "websocket" not in config or config["websocket"] is not None,
+            "aggregator": config.get("aggregator")}
+    IP = config.get("device", {}).get("host", IP)
+    PORT = config.get("device", {}).get("port", PORT)
+    IP_WS = (config.get("websocket") or {}).get("host", IP_WS)
+    PORT_WS = (config.get("websocket") or {}).get("port", PORT_WS)
+    METRICS_PORT = config.get("metrics_port", METRICS_PORT)
+    EVALUATE_GT = config.get("evaluate_gt", EVALUATE_GT)
+
+    CAMERA_CONFIG = os.path.abspath(path)
+    set_camera_registry(build_camera_registry(CAMERA_CONFIG))
+    registry = get_camera_registry()
+    log.info("Zone %d (%s): %d cameras %s", ZONE['zone'], ZONE['name'], len(registry), registry.names)
+
+class AggregatorUplink:
+    """
+    TCP connection from a zone worker to HkPose3D_Aggregator.
+
+    Messages use the Device framing (4-byte big-endian length + JSON). send() never
+    blocks the pipeline: while the aggregator is unreachable or slow, the oldest
+    pending results are dropped. The connection is re-established automatically.
+    """
+    def __init__(self, host, port, max_pending=AGGREGATOR_QUEUE_SIZE):
+        self.host = host
+        self.port = port
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()     # 가장 오래된 결과를 버림
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                log.warning("Aggregator %s:%d is behind, dropped %d result(s)", self.host, self.port, self.dropped)
+        self.queue.put_nowait(message)
+
+    @staticmethod
+    def hello():
+        """zone 소개 메시지 (연결할 때와 카메라 구성이 바뀔 때 전송)."""
+        return {"type": "zone_hello", "zone": ZONE["zone"], "name": ZONE["name"], "cameras": get_camera_registry().names}
+
+    @staticmethod
+    def frame(message):
+        data = json.dumps(message).encode('utf-8')
+        return len(data).to_bytes(4, byteorder='big') + data
+
+    async def run(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                raw_socket = writer.get_extra_info("socket")
+                if raw_socket:
+                    raw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                writer.write(self.frame(self.hello()))
+                await writer.drain()
+                log.info("Connected to aggregator at %s:%d", self.host, self.port)
+                while True:
+                    message = await self.queue.get()
+                    writer.write(self.frame(message))
+                    await writer.drain()
+                    self.sent += 1
+            except OSError as e:
+                log.warning("Aggregator %s:%d 연결 실패: %s (%s초 후 재시도)", self.host, self.port, e, AGGREGATOR_RETRY_INTERVAL)
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(AGGREGATOR_RETRY_INTERVAL)
+
+aggregator_uplink = None    # AggregatorUplink (zone 설정에 aggregator가 있을 때 run_servers에서 생성)
+tracer = None               # Tracer (TRACE_FILE이 있을 때 run_servers에서 생성)
+
+async def run_servers():
+    """Runs the device (TCP) server, the WebSocket server and the metrics endpoint on the same event loop."""
+    global server_loop, keypoints_data_manager, aggregator_uplink, triangulation_pool, feedback_controller, tracer
+    server_loop = asyncio.get_running_loop()
+    get_camera_registry()
+    if TRIANGULATION_WORKERS > 0 and triangulation_pool is None:
+        triangulation_pool = TriangulationPool(TRIANGULATION_WORKERS)
+        atexit.register(triangulation_pool.close)
+    keypoints_data_manager = KeypointsData()
+    keypoints_data_manager.pool = triangulation_pool
+    if TRACE_FILE and tracer is None:
+        tracer = Tracer()
+        atexit.register(tracer.save, TRACE_FILE)
+        log.info("Tracing slots to %s (on exit, or GET /trace on the metrics endpoint)", TRACE_FILE)
+    keypoints_data_manager.tracer = tracer
+    metrics.tracer = tracer
+    metrics.packet_stats = keypoints_data_manager.packet_stats
+    metrics.broadcaster = pose_broadcaster
+    tasks = [start_server(), start_metrics_server(), log_metrics(), watch_camera_files()]
+    if FEEDBACK_CONTROL:
+        feedback_controller = FeedbackController()
+        metrics.controls = feedback_controller.controls
+        tasks.append(feedback_controller.run())
+    if ZONE is None or ZONE["websocket"]:
+        tasks.append(start_websocket_server())
+    if ZONE is not None and ZONE["aggregator"]:
+        aggregator_uplink = AggregatorUplink(ZONE["aggregator"]["host"], ZONE["aggregator"]["port"])
+        tasks.append(aggregator_uplink.run())
+    await asyncio.gather(*tasks)
+
+
 # # 서버 시작
 # if __name__ == "__main__":
 #     threading.Thread(target=start_gui).start()  # Start the GUI in a separate thread
@@ -591,15 +2367,21 @@ async def start_websocket_server():
 
 # Main function to start the GUI and other servers
 def main():
+    parse_args(sys.argv)
+    metrics.record_startup("import")
+
+    if HEADLESS:
+        # GUI 없이 이벤트 루프를 메인 스레드에서 실행 (지표는 HTTP 엔드포인트와 JSON 로그로 확인)
+        asyncio.run(run_servers())
+        return
+
     # Start the GUI in the main thread
+    import tkinter as tk
     root = tk.Tk()
     app = CameraDataDisplay(root)
 
-    # Start the TCP server in a separate thread
-    threading.Thread(target=start_server, daemon=True).start()
-
-    # Start the WebSocket server in a separate thread
-    threading.Thread(target=lambda: asyncio.run(start_websocket_server()), daemon=True).start()
+    # Start the TCP server and the WebSocket server on one event loop in a separate thread
+    threading.Thread(target=lambda: asyncio.run(run_servers()), daemon=True).start()
 
     # Start the Tkinter mainloop
     root.mainloop()
@@ -0,0 +1,167 @@
+"""
+Per-slot stage tracing across the device and the server (HkPose3D_Server --trace).
+
+Every process stamps its stages with time.perf_counter() (monotonic). The device
+sends its marks with each keypoints message together with its wall-clock offset
+(time.time() - time.perf_counter()), so the server can place them on its own
+clock; the Unity capture time is the wall-clock exact timestamp of the frame.
+Device and server clocks are assumed to be synchronized (same host or NTP); if
+the device's send mark lands after the server's receive mark, the device marks
+are shifted back so the network span is never negative.
+
+One slot, as exported (Chrome trace event format, nestable async events, open in
+chrome://tracing or https://ui.perfetto.dev):
+    <camera> <slot>   capture -> unity_to_device -> decode -> queue -> inference
+                      -> send -> network -> assembly (server receive -> slot release)
+    slot <slot>       assembly -> numeric (association, triangulation) -> outlier
+                      -> tracking -> event -> evaluation -> save -> broadcast
+"""
+import json
+import time
+import logging
+import numpy as np
+from collections import defaultdict, deque
+
+log = logging.getLogger("HkPose3D.Trace")
+
+TRACE_MAX_SLOTS = 3000      # 메모리에 유지하는 최근 슬롯 trace 수 (초과 시 오래된 슬롯부터 버림)
+TRACE_RECENT_SAMPLES = 1024     # 단계별 백분위수 계산에 사용하는 최근 샘플 수
+
+# Device가 보내는 단계 시각 (perf_counter, us), Binary는 이 순서로 TRACE_BLOCK에 담음
+DEVICE_MARKS = ["device_receive", "decoded", "inference_start", "inference_end", "send"]
+# 카메라 프레임의 연속한 시각 사이 구간: (구간 이름, 시작 시각, 끝 시각)
+CAMERA_SPANS = [
+    ("unity_to_device", "capture", "device_receive"),
+    ("decode", "device_receive", "decoded"),
+    ("queue", "decoded", "inference_start"),
+    ("inference", "inference_start", "inference_end"),
+    ("send", "inference_end", "send"),
+    ("network", "send", "server_receive"),
+    ("assembly", "server_receive", "released"),
+]
+
+
+def clock_offset():
+    """wall clock - perf_counter (초): perf_counter 시각을 다른 프로세스의 시각과 맞추는 데 사용."""
+    return time.time() - time.perf_counter()
+
+
+class SlotTrace:
+    """Marks and spans of one slot, in seconds on the server's perf_counter clock."""
+    def __init__(self, slot):
+        self.slot = slot
+        self.cameras = {}           # camera -> {mark 이름: 시각}
+        self.released = None        # 슬롯 조립을 마친 시각
+        self.numeric_end = None     # 연관/삼각측량 결과를 받은 시각
+        self.spans = []             # (단계, 시작, 끝)
+
+    def add_camera(self, camera, marks):
+        self.cameras[camera] = marks
+
+    def span(self, stage, start, end):
+        self.spans.append((stage, start, end))
+
+    def camera_spans(self, camera):
+        marks = dict(self.cameras[camera], released=self.released)
+        return [(name, marks[start], marks[end]) for name, start, end in CAMERA_SPANS
+                if marks.get(start) is not None and marks.get(end) is not None]
+
+    def stage_durations(self):
+        """단계 -> 걸린 시간 (초): 카메라 구간은 카메라 중 가장 오래 걸린 값."""
+        durations = defaultdict(float)
+        for camera in self.cameras:
+            for name, start, end in self.camera_spans(camera):
+                durations[name] = max(durations[name], end - start)
+        for stage, start, end in self.spans:
+            durations[stage] += end - start
+        start, end = self.bounds()
+        if start is not None:
+            durations["end_to_end"] = end - start
+        return durations
+
+    def bounds(self):
+        """(가장 이른 캡처 또는 수신 시각, 마지막 단계의 끝) (기록된 시각이 없으면 (None, None))."""
+        times = [t for marks in self.cameras.values() for t in marks.values() if t is not None]
+        times += [t for _, start, end in self.spans for t in (start, end)]
+        if self.released is not None:
+            times.append(self.released)
+        return (min(times), max(times)) if times else (None, None)
+
+
+class Tracer:
+    """
+    Collects finished SlotTraces (bounded) and exports them as Chrome trace JSON,
+    plus recent per-stage duration percentiles for the metrics endpoint.
+    """
+    def __init__(self, max_slots=TRACE_MAX_SLOTS):
+        self.slots = deque(maxlen=max_slots)
+        self.durations = defaultdict(lambda: deque(maxlen=TRACE_RECENT_SAMPLES))   # 단계 -> 최근 걸린 시간 (초)
+        self.skewed = 0     # device 시각이 서버 수신 시각보다 늦어 보정한 패킷 수 (시계 동기화 확인용)
+
+    def device_marks(self, exact_time, received, device=None):
+        """
+        서버 perf_counter 기준의 카메라 프레임 시각.
+        exact_time: Unity 캡처 시각 (epoch 초), received: 서버 수신 시각 (perf_counter),
+        device: {"clock_offset_us": ..., <DEVICE_MARKS>: perf_counter us} (없으면 캡처/수신 시각만).
+        """
+        offset = clock_offset()
+        marks = {"capture": exact_time - offset, "server_receive": received}
+        if device:
+            shift = device["clock_offset_us"] / 1e6 - offset
+            for name in DEVICE_MARKS:
+                if device.get(name, -1) >= 0:
+                    marks[name] = device[name] / 1e6 + shift
+            if marks.get("send", received) > received:
+                self.skewed += 1
+                correction = marks["send"] - received
+                for name in DEVICE_MARKS:
+                    if name in marks:
+                        marks[name] -= correction
+        return marks
+
+    def finish(self, trace):
+        self.slots.append(trace)
+        for stage, seconds in trace.stage_durations().items():
+            self.durations[stage].append(seconds)
+
+    def summary(self, qs=(50, 90, 99)):
+        """단계 -> {"p50", "p90", "p99"} (ms)."""
+        return {stage: {f"p{q}": round(float(value) * 1000, 3) for q, value in zip(qs, np.percentile(list(values), qs))}
+                for stage, values in list(self.durations.items()) if values}
+
+    def chrome_trace(self):
+        """Chrome trace event format (dict): 카메라 프레임과 슬롯마다 중첩 async 이벤트."""
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "HkPose3D"}}]
+
+        def add(category, trace_id, name, start, end, args=None):
+            common = {"cat": category, "id": trace_id, "pid": 1, "tid": 1, "name": name}
+            events.append({**common, "ph": "b", "ts": round(start * 1e6, 1), "args": args or {}})
+            events.append({**common, "ph": "e", "ts": round(end * 1e6, 1)})
+
+        for trace in list(self.slots):
+            for camera in trace.cameras:
+                spans = trace.camera_spans(camera)
+                if not spans:
+                    continue
+                trace_id = f"{camera} {trace.slot}"
+                add(camera, trace_id, trace_id, spans[0][1], spans[-1][2], {"slot": trace.slot})
+                for name, start, end in spans:
+                    add(camera, trace_id, name, start, end)
+            start, end = trace.bounds()
+            if start is None:
+                continue
+            trace_id = f"slot {trace.slot}"
+            add("slot", trace_id, trace_id, start, end, {"cameras": sorted(trace.cameras)})
+            receives = [marks["server_receive"] for marks in trace.cameras.values() if "server_receive" in marks]
+            if receives and trace.released is not None:
+                add("slot", trace_id, "assembly", min(receives), trace.released)
+            for stage, stage_start, stage_end in sorted(trace.spans, key=lambda span: (span[1], -span[2])):
+                add("slot", trace_id, stage, stage_start, stage_end)
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"clock": "perf_counter (s * 1e6)", "wall_clock_offset_s": clock_offset(),
+                              "slots": len(self.slots), "skewed_packets": self.skewed}}
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        log.info("Trace of %d slot(s) saved to %s", len(self.slots), path)